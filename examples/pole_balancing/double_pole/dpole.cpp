@@ -139,6 +139,8 @@ PyObject* integrate(PyObject* self, PyObject* args) {
     }
 
     /*--- Apply action to the simulated cart-pole ---*/
+    /* no Python objects are used: other threads can run meanwhile */
+    Py_BEGIN_ALLOW_THREADS
     for(int k = 0; k < stepnum; k++) {
         for(int i = 0; i < 2; i++){
             dydx[0] = state[1];
@@ -148,6 +150,7 @@ PyObject* integrate(PyObject* self, PyObject* args) {
             rk4(output, state, dydx);
         }
     }
+    Py_END_ALLOW_THREADS
 
     return vector2list(state);
 }
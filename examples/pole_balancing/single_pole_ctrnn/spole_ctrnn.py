@@ -2,11 +2,18 @@
 # Single pole balancing experiment #
 # ******************************** #
 
-from neat import config, population, chromosome, genome2, visualize
-from neat import ctrnn
+from neat import config, population, chromosome, genome, visualize
+from neat.ctrnn import ctrnn_pure as ctrnn
 import math, random#; random.seed(854)
 import cPickle as pickle
 
+try:
+    # fast path: the whole population is simulated at once
+    import numpy as np
+    from neat.ctrnn import ctrnn_numpy
+except ImportError:
+    ctrnn_numpy = None
+
 rstate = random.getstate()
 
 save = open('rstate','w')
@@ -51,6 +58,83 @@ def cart_pole(net_output, x, x_dot, theta, theta_dot):
       
     return x, x_dot, theta, theta_dot
     
+def cart_pole_batch(net_output, x, x_dot, theta, theta_dot):
+    ''' Same as cart_pole for arrays of cart-poles '''
+
+    GRAVITY = 9.8
+    MASSCART = 1.0
+    MASSPOLE = 0.1
+    TOTAL_MASS = (MASSPOLE + MASSCART)
+    LENGTH = 0.5    # actually half the pole's length
+    POLEMASS_LENGTH = (MASSPOLE * LENGTH)
+    FORCE_MAG = 10.0
+    TAU = 0.02  # seconds between state updates
+    FOURTHIRDS = 1.3333333333333
+
+    force = np.where(net_output > 0.5, FORCE_MAG, -FORCE_MAG)
+
+    costheta = np.cos(theta)
+    sintheta = np.sin(theta)
+
+    temp = (force + POLEMASS_LENGTH * theta_dot * theta_dot * sintheta)/ TOTAL_MASS
+
+    thetaacc = (GRAVITY*sintheta - costheta*temp)\
+               /(LENGTH * (FOURTHIRDS - MASSPOLE * costheta * costheta/TOTAL_MASS))
+
+    xacc  = temp - POLEMASS_LENGTH * thetaacc * costheta / TOTAL_MASS
+
+    #Update the four state variables, using Euler's method
+    x         = x + TAU * x_dot
+    x_dot     = x_dot + TAU * xacc
+    theta     = theta + TAU * theta_dot
+    theta_dot = theta_dot + TAU * thetaacc
+
+    return x, x_dot, theta, theta_dot
+
+def evaluate_population_batch(population):
+    ''' Same as evaluate_population, advancing all networks and
+        cart-poles at once. Failed ones are dropped from the batch. '''
+
+    twelve_degrees = 0.2094384 #radians
+    num_steps = 10**5
+
+    chromosomes = list(population)
+    net = ctrnn_numpy.create_population_phenotype(chromosomes)
+
+    # initial conditions (as used by Stanley), drawn in the same order
+    # as in evaluate_population
+    initial = [((random.randint(0, 2**31)%4800)/1000.0 - 2.4,
+                (random.randint(0, 2**31)%2000)/1000.0 - 1,
+                (random.randint(0, 2**31)%400)/1000.0 - .2,
+                (random.randint(0, 2**31)%3000)/1000.0 - 1.5) for chromo in chromosomes]
+    x, x_dot, theta, theta_dot = np.array(initial).T
+
+    fitness = np.zeros(len(chromosomes), dtype=int)
+    running = np.arange(len(chromosomes)) # still balancing
+    for trials in xrange(num_steps):
+        # maps into [0,1]
+        inputs = np.column_stack(((x + 2.4)/4.8,
+                                  (x_dot + 0.75)/1.5,
+                                  (theta + twelve_degrees)/0.41,
+                                  (theta_dot + 1.0)/2.0))
+
+        action = net.pactivate(inputs)
+
+        # Apply action to the simulated cart-poles
+        x, x_dot, theta, theta_dot = cart_pole_batch(action[:,0], x, x_dot, theta, theta_dot)
+
+        fitness[running] += 1
+        alive = (np.abs(x) < 2.5) & (np.abs(theta) < twelve_degrees)
+        if not alive.all():
+            running = running[alive]
+            if not len(running):
+                break
+            net.keep(alive)
+            x, x_dot, theta, theta_dot = x[alive], x_dot[alive], theta[alive], theta_dot[alive]
+
+    for chromo, f in zip(chromosomes, fitness):
+        chromo.fitness = int(f)
+
 def evaluate_population(population):
     
     twelve_degrees = 0.2094384 #radians
@@ -105,9 +189,12 @@ if __name__ == "__main__":
     config.load('spole_ctrnn_config') 
 
     # Temporary workaround
-    chromosome.node_gene_type = genome2.CTNodeGene
+    chromosome.node_gene_type = genome.CTNodeGene
     
-    population.Population.evaluate = evaluate_population
+    if ctrnn_numpy is not None:
+        population.Population.evaluate = evaluate_population_batch
+    else:
+        population.Population.evaluate = evaluate_population
     pop = population.Population()
     pop.epoch(2000, report=1, save_best=0)
     
@@ -4,6 +4,7 @@ import cPickle as pickle
 from neat import config, population, chromosome, genome, visualize
 from neat.nn import nn_pure as nn
 #from neat.nn import nn_cpp as nn # C++ extension
+#from neat.nn import nn_codegen as nn # generated Python code
 
 config.load('xor2_config')
 
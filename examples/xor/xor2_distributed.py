@@ -0,0 +1,76 @@
+# -*- coding: UTF-8 -*-
+# ----------------------------------------------------------------------#
+# XOR evaluated by workers connected through sockets (neat.distributed) #
+#                                                                       #
+#   python xor2_distributed.py                  coordinator and two     #
+#                                               local workers           #
+#   python xor2_distributed.py worker host:port a worker on another     #
+#                                               machine                 #
+#                                                                       #
+# Workers on other machines need the coordinator to listen on all       #
+# interfaces (HOST = '') and the same NEAT_AUTHKEY environment variable #
+# on both sides. Use it on trusted networks only.                       #
+# ----------------------------------------------------------------------#
+import os
+import sys
+import math
+import multiprocessing
+from neat import config, population, chromosome, genome, distributed
+from neat.nn import nn_pure as nn
+
+config.load('xor2_config')
+
+config.Config.max_fitness_threshold = 0.9
+config.Config.pop_size = 150
+# Temporary workaround
+chromosome.node_gene_type = genome.NodeGene
+
+# XOR-2
+INPUTS = ((0, 0), (0, 1), (1, 0), (1, 1))
+OUTPUTS = (0, 1, 1, 0)
+
+HOST = '127.0.0.1' # only local workers
+PORT = 7777
+# shared with the workers (None: the local workers inherit this process' key)
+AUTHKEY = os.environ.get('NEAT_AUTHKEY')
+
+def eval_fitness(chromo):
+    # This function runs in the workers
+    net = nn.create_ffphenotype(chromo)
+
+    error = 0.0
+    for i, input in enumerate(INPUTS):
+        output = net.sactivate(input) # serial activation
+        error += (output[0] - OUTPUTS[i])**2
+
+    return 1 - math.sqrt(error/len(OUTPUTS))
+
+def run_worker(address):
+    worker = distributed.Worker(address, eval_fitness, authkey = AUTHKEY)
+    print 'Worker evaluated %d chromosomes' % worker.run()
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2 and sys.argv[1] == 'worker':
+        if AUTHKEY is None:
+            sys.exit('Set NEAT_AUTHKEY to the coordinator\'s key')
+        host, port = sys.argv[2].split(':')
+        run_worker((host, int(port)))
+        sys.exit()
+
+    # workers may join at any time (from other machines if HOST is '')
+    coordinator = distributed.Coordinator((HOST, PORT), timeout = 10, chunksize = 10,
+                                          authkey = AUTHKEY)
+    local_workers = [multiprocessing.Process(target=run_worker, args=(('127.0.0.1', PORT),))
+                     for i in xrange(2)]
+    for w in local_workers:
+        w.start()
+    coordinator.wait_for_workers(1)
+
+    population.Population.evaluate = lambda population: coordinator.evaluate(population)
+
+    pop = population.Population()
+    pop.epoch(400, report=1, save_best=False)
+    coordinator.print_stats()
+    coordinator.stop()
+    for w in local_workers:
+        w.join()
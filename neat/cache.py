@@ -0,0 +1,104 @@
+# -*- coding: UTF-8 -*-
+"""
+ A cache of phenotypes shared across generations. Elitism carries the
+ same chromosome into the next generation and many offspring are
+ structural clones of their parents, so rebuilding their networks can
+ be avoided:
+
+    phenotypes = cache.PhenotypeCache(nn.create_ffphenotype)
+
+    def eval_fitness(population):
+        for chromo in population:
+            net = phenotypes(chromo) # a flushed network
+            ...
+
+ Phenotypes which can be copied and updated (see nn_numpy) are also
+ derived from the fittest parent's network when only weights, biases
+ or responses have changed (see Chromosome.changed_genes).
+"""
+from collections import OrderedDict
+
+def phenotype_key(chromo):
+    """ A canonical key for everything that defines a chromosome's phenotype:
+        enabled connections with their weights and all node genes (bias,
+        response, activation type, time constant). Disabled connections
+        and innovation numbers are not part of it.
+    """
+    nodes = tuple((ng.id, ng.type, ng.bias, ng.response, ng.activation_type,
+                   getattr(ng, 'time_constant', None)) for ng in chromo.node_genes)
+    conns = tuple(sorted((cg.innodeid, cg.outnodeid, cg.weight)
+                         for cg in chromo.conn_genes if cg.enabled))
+    # the order of activation matters for feedforward networks
+    order = tuple(getattr(chromo, 'node_order', ()))
+    return (chromo.sensors, nodes, conns, order)
+
+class PhenotypeCache(object):
+    """ Keeps the most recently used phenotypes (LRU) up to maxsize. A hit
+        returns the very same network object, so it is only safe for
+        networks whose state is completely cleared by reset (flush by
+        default) and if two chromosomes with the same key are not
+        evaluated at the same time.
+    """
+    def __init__(self, create_phenotype, maxsize=1000, reset=lambda net: net.flush()):
+        self.__create = create_phenotype
+        self.__reset = reset
+        self.__maxsize = maxsize
+        self.__networks = OrderedDict()
+        self.__by_id = OrderedDict() # networks of recently seen chromosomes
+        self.__hits = 0
+        self.__misses = 0
+        self.__patched = 0
+
+    hits    = property(lambda self: self.__hits)
+    misses  = property(lambda self: self.__misses)
+    patched = property(lambda self: self.__patched, doc = 'Networks derived from a parent')
+
+    def __len__(self):
+        return len(self.__networks)
+
+    def __repr__(self):
+        return 'Phenotype cache: %d networks, %d hits, %d patched and %d misses' \
+                % (len(self), self.__hits, self.__patched, self.__misses)
+
+    def __call__(self, chromo):
+        """ Returns the chromosome's phenotype ready to be used. """
+        key = phenotype_key(chromo)
+        try:
+            # most recently used networks are kept at the end
+            net = self.__networks.pop(key)
+        except KeyError:
+            net = self.__derive(chromo)
+            if net is None:
+                self.__misses += 1
+                net = self.__create(chromo)
+            else:
+                self.__patched += 1
+            if len(self.__networks) >= self.__maxsize:
+                self.__networks.popitem(last=False) # least recently used
+        else:
+            self.__hits += 1
+            self.__reset(net)
+        self.__networks[key] = net
+
+        self.__by_id.pop(chromo.id, None)
+        if len(self.__by_id) >= self.__maxsize:
+            self.__by_id.popitem(last=False)
+        self.__by_id[chromo.id] = net
+        return net
+
+    def __derive(self, chromo):
+        """ Copies the fittest parent's network and patches the genes
+            changed by crossover and mutation. """
+        parent = self.__by_id.get(chromo.origin)
+        if parent is None or not hasattr(parent, 'update'):
+            return None
+        changes = chromo.changed_genes()
+        if changes is None:
+            return None
+        net = parent.copy()
+        net.update(*changes)
+        return net
+
+    def clear(self):
+        self.__networks.clear()
+        self.__by_id.clear()
@@ -1,7 +1,10 @@
 import random
 import math
+import copy
+from array import array
 from config import Config
 import genome
+import genome_array
 
 # Temporary workaround - default settings
 #node_gene_type = genome.NodeGene
@@ -30,11 +33,39 @@ class Chromosome(object):
         self.parent1_id = parent1_id
         self.parent2_id = parent2_id
 
-    conn_genes = property(lambda self: self._connection_genes.values())
+        # changes since the genes were copied from the fittest parent:
+        # its phenotype can be patched instead of building a new one
+        self._origin = None        # the fittest parent's id
+        self._dirty_conns = set()  # keys of connection genes with a different weight
+        self._dirty_nodes = set()  # ids of node genes with a different bias or response
+        self._structural = False   # the topology has changed (the phenotype must be rebuilt)
+
+        # innovation numbers and weights of the connection genes, sorted
+        # by innovation (see distance): rebuilt after any change
+        self._sorted_genes = None
+
+    # in innovation order, as in ArrayChromosome: the phenotypes (and so
+    # the fitness) don't depend on the dictionary's layout, which changes
+    # when a chromosome is pickled or rebuilt elsewhere
+    conn_genes = property(lambda self: sorted(self._connection_genes.values()))
     node_genes = property(lambda self: self._node_genes)
     sensors    = property(lambda self: self._input_nodes)
     actuators  = property(lambda self: self._output_nodes)
     id         = property(lambda self: self._id)
+    origin     = property(lambda self: self._origin)
+
+    def __getstate__(self):
+        # the sorted genes are rebuilt when needed
+        state = self.__dict__.copy()
+        state['_sorted_genes'] = None
+        return state
+
+    def __setstate__(self, state):
+        # chromosomes saved by older versions (e.g. in checkpoints) lack
+        # these: their phenotypes are built from scratch
+        self.__dict__.update(_origin = None, _dirty_conns = set(), _dirty_nodes = set(),
+                             _structural = True, _sorted_genes = None)
+        self.__dict__.update(state)
 
     @classmethod
     def __get_new_id(cls):
@@ -43,6 +74,7 @@ class Chromosome(object):
 
     def mutate(self):
         """ Mutates this chromosome """
+        self._sorted_genes = None
 
         r = random.random
         if r() < Config.prob_addnode:
@@ -53,12 +85,118 @@ class Chromosome(object):
 
         else:
             for cg in self._connection_genes.values():
+                weight, enabled = cg.weight, cg.enabled
                 cg.mutate() # mutate weights
+                if cg.enabled != enabled:
+                    self._structural = True
+                elif cg.weight != weight:
+                    self._dirty_conns.add(cg.key)
             for ng in self._node_genes[self._input_nodes:]:
+                bias, response = ng.bias, ng.response
                 ng.mutate() # mutate bias, response, and etc...
+                if ng.bias != bias or ng.response != response:
+                    self._dirty_nodes.add(ng.id)
 
         return self
 
+    def changed_genes(self):
+        """ Returns the connection and node genes whose weight, bias or
+            response differ from the fittest parent's (see origin), or
+            None if the topology has changed.
+        """
+        if self._origin is None or self._structural:
+            return None
+        return ([self._connection_genes[key] for key in self._dirty_conns],
+                [self._node_genes[id - 1] for id in self._dirty_nodes])
+
+    def delta(self, parent):
+        """ Returns a compact record of this chromosome as a difference from
+            the parent's genes: the node and connection genes which are new
+            or differ, as tuples of numbers. Returns None if some of the
+            parent's genes are missing (see child_from_delta).
+        """
+        nodes = []
+        for i, ng in enumerate(self._node_genes):
+            gene = (ng.id, ng.type, ng.bias, ng.response, ng.activation_type,
+                    getattr(ng, 'time_constant', None))
+            if i >= len(parent._node_genes):
+                nodes.append(gene)
+            else:
+                pg = parent._node_genes[i]
+                if gene != (pg.id, pg.type, pg.bias, pg.response, pg.activation_type,
+                            getattr(pg, 'time_constant', None)):
+                    nodes.append(gene)
+        if len(self._node_genes) < len(parent._node_genes):
+            return None
+
+        conns = []
+        matching = 0
+        for cg in self._connection_genes.values():
+            gene = (cg.innodeid, cg.outnodeid, cg.weight, cg.enabled, cg.innovation)
+            try:
+                pg = parent._connection_genes[cg.key]
+            except KeyError:
+                conns.append(gene)
+            else:
+                matching += 1
+                if gene != (pg.innodeid, pg.outnodeid, pg.weight, pg.enabled, pg.innovation):
+                    conns.append(gene)
+        if matching < len(parent._connection_genes):
+            return None
+
+        return (self.id, self.species_id, self.parent1_id, self.parent2_id,
+                tuple(nodes), tuple(conns))
+
+    def child_from_delta(self, record):
+        """ Rebuilds a chromosome from its record (see delta) and this
+            chromosome, the parent. Unchanged genes are shared with it. """
+        id, species_id, parent1_id, parent2_id, nodes, conns = record[:6]
+        child = copy.copy(self)
+        child._id = id
+        child.species_id = species_id
+        child.parent1_id = parent1_id
+        child.parent2_id = parent2_id
+        child.fitness = None
+        child._origin = None # its phenotype can't be patched
+        child._dirty_conns = set()
+        child._dirty_nodes = set()
+        child._structural = False
+        child._sorted_genes = None
+
+        child._node_genes, child._connection_genes = self._copy_genes()
+        for id, nodetype, bias, response, activation_type, time_constant in nodes:
+            if time_constant is None:
+                ng = self._node_gene_type(id, nodetype, bias, response, activation_type)
+            else:
+                ng = self._node_gene_type(id, nodetype, bias, response, activation_type, time_constant)
+            if id <= len(child._node_genes):
+                child._node_genes[id - 1] = ng
+            else:
+                child._node_genes.append(ng)
+
+        for innodeid, outnodeid, weight, enabled, innovation in conns:
+            cg = self._conn_gene_type(innodeid, outnodeid, weight, enabled, innovation)
+            child._connection_genes[cg.key] = cg
+        return child
+
+    def _copy_genes(self):
+        """ Returns new containers with the same gene objects """
+        return list(self._node_genes), dict(self._connection_genes)
+
+    def _new_genes(self):
+        """ Returns empty node and connection gene containers """
+        return [], {}
+
+    def blank(self):
+        """ Returns a copy of this chromosome with no genes: the delta
+            from it holds all genes (see delta) """
+        blank = copy.copy(self)
+        blank._node_genes, blank._connection_genes = self._new_genes()
+        blank._sorted_genes = None
+        blank.fitness = None
+        blank._origin = None
+        return blank
+
 
     def crossover(self, other):
         """ Crosses over parents' chromosomes and returns a child. """
@@ -89,6 +227,9 @@ class Chromosome(object):
         """ Applies the crossover operator. """
         assert(parent1.fitness >= parent2.fitness)
 
+        # the child has the same topology as the fittest parent
+        child._origin = parent1.id
+
         # Crossover connection genes
         for cg1 in parent1._connection_genes.values():
             try:
@@ -101,6 +242,10 @@ class Chromosome(object):
                     # Homologous gene found
                     new_gene = cg1.get_child(cg2)
                     #new_gene.enable() # avoids disconnected neurons
+                    if new_gene.enabled != cg1.enabled:
+                        child._structural = True
+                    elif new_gene.weight != cg1.weight:
+                        child._dirty_conns.add(new_gene.key)
                 else:
                     new_gene = cg1.copy()
                 child._connection_genes[new_gene.key] = new_gene
@@ -109,13 +254,18 @@ class Chromosome(object):
         for i, ng1 in enumerate(parent1._node_genes):
             try:
                 # matching node genes: randomly selects the neuron's bias and response
-                child._node_genes.append(ng1.get_child(parent2._node_genes[i]))
+                new_gene = ng1.get_child(parent2._node_genes[i])
             except IndexError:
                 # copies extra genes from the fittest parent
-                child._node_genes.append(ng1.copy())
+                new_gene = ng1.copy()
+            if new_gene.bias != ng1.bias or new_gene.response != ng1.response:
+                child._dirty_nodes.add(new_gene.id)
+            child._node_genes.append(new_gene)
 
 
     def _mutate_add_node(self):
+        self._structural = True
+        self._sorted_genes = None
         # Choose a random connection to split
         conn_to_split = random.choice(self._connection_genes.values())
         ng = self._node_gene_type(len(self._node_genes) + 1, 'HIDDEN', activation_type = Config.nn_activation)
@@ -126,26 +276,51 @@ class Chromosome(object):
         return (ng, conn_to_split) # the return is only used in genome_feedforward
 
     def _mutate_add_connection(self):
+        self._structural = True
+        self._sorted_genes = None
         # Only for recurrent networks
-        total_possible_conns = (len(self._node_genes) - self._input_nodes) \
-            * len(self._node_genes)
+        num_nodes = len(self._node_genes)
+        total_possible_conns = (num_nodes - self._input_nodes) * num_nodes
         remaining_conns = total_possible_conns - len(self._connection_genes)
         # Check if new connection can be added:
         if remaining_conns > 0:
-            n = random.randint(0, remaining_conns - 1)
-            count = 0
-            # Count connections
-            for in_node in self._node_genes:
-                for out_node in self._node_genes[self._input_nodes:]:
-                    if (in_node.id, out_node.id) not in self._connection_genes.keys():
-                        # Free connection
-                        if count == n: # Connection to create
-                            weight = random.gauss(0, Config.weight_stdev)
-                            cg = self._conn_gene_type(in_node.id, out_node.id, weight, True)
-                            self._connection_genes[cg.key] = cg
-                            return
-                        else:
-                            count += 1
+            # node ids are their positions in node_genes (plus one)
+            key = self._sample_free_connection(
+                lambda: (random.randint(1, num_nodes),
+                         random.randint(self._input_nodes + 1, num_nodes)),
+                lambda: ((in_id, out_id) for in_id in xrange(1, num_nodes + 1)
+                         for out_id in xrange(self._input_nodes + 1, num_nodes + 1)))
+            if key is not None:
+                weight = random.gauss(0, Config.weight_stdev)
+                cg = self._conn_gene_type(key[0], key[1], weight, True)
+                self._connection_genes[cg.key] = cg
+
+    # random pairs drawn before listing all free connections
+    _sampling_tries = 20
+
+    def _sample_free_connection(self, random_pair, all_pairs):
+        """ Returns a random (in, out) key not in the connection genes,
+            or None. random_pair draws a pair uniformly (None if it isn't
+            valid) and all_pairs iterates over the valid ones. A few draws
+            are usually enough: the pairs are only listed when nearly all
+            of them are already connected. """
+        for i in xrange(self._sampling_tries):
+            key = random_pair()
+            if key is not None and key not in self._connection_genes:
+                return key
+        free = [key for key in all_pairs() if key not in self._connection_genes]
+        if free:
+            return random.choice(free)
+        return None
+
+    def _innovations(self):
+        """ Returns the innovation numbers of the connection genes, sorted,
+            and their weights """
+        if self._sorted_genes is None:
+            genes = sorted(self._connection_genes.values())
+            self._sorted_genes = (array('l', [cg.innovation for cg in genes]),
+                                  array('d', [cg.weight for cg in genes]))
+        return self._sorted_genes
 
     # compatibility function
     def distance(self, other):
@@ -157,27 +332,10 @@ class Chromosome(object):
             chromo1 = other
             chromo2 = self
 
-        weight_diff = 0
-        matching = 0
-        disjoint = 0
-        excess = 0
-
-        max_cg_chromo2 = max(chromo2._connection_genes.values())
-
-        for cg1 in chromo1._connection_genes.values():
-            try:
-                cg2 = chromo2._connection_genes[cg1.key]
-            except KeyError:
-                if cg1 > max_cg_chromo2:
-                    excess += 1
-                else:
-                    disjoint += 1
-            else:
-                # Homologous genes
-                weight_diff += math.fabs(cg1.weight - cg2.weight)
-                matching += 1
-
-        disjoint += len(chromo2._connection_genes) - matching
+        innovations1, weights1 = chromo1._innovations()
+        innovations2, weights2 = chromo2._innovations()
+        matching, disjoint, excess, weight_diff = \
+            genome_array.compare(innovations1, weights1, innovations2, weights2)
 
         #assert(matching > 0) # this can't happen
         distance = Config.excess_coeficient * excess + \
@@ -187,6 +345,22 @@ class Chromosome(object):
 
         return distance
 
+    def distance_lower_bound(self, other):
+        """ Returns a lower bound of the distance to the other chromosome,
+            much cheaper than the distance itself: it only looks at the
+            number and the range of the innovation numbers. """
+        if len(self._connection_genes) > len(other._connection_genes):
+            chromo1 = self
+            chromo2 = other
+        else:
+            chromo1 = other
+            chromo2 = self
+
+        excess, disjoint = genome_array.count_unmatched(chromo1._innovations()[0],
+                                                        chromo2._innovations()[0])
+        return Config.excess_coeficient * excess + \
+               Config.disjoint_coeficient * disjoint
+
     def size(self):
         """ Defines chromosome 'complexity': number of hidden nodes plus
             number of enabled connections (bias is not considered)
@@ -218,6 +392,8 @@ class Chromosome(object):
         return s
 
     def add_hidden_nodes(self, num_hidden):
+        self._structural = True
+        self._sorted_genes = None
         id = len(self._node_genes)+1
         for i in range(num_hidden):
             node_gene = self._node_gene_type(id,
@@ -306,13 +482,31 @@ class FFChromosome(Chromosome):
     def __init__(self, parent1_id, parent2_id, node_gene_type, conn_gene_type):
         super(FFChromosome, self).__init__(parent1_id, parent2_id, node_gene_type, conn_gene_type)
         self.__node_order = [] # hidden node order (for feedforward networks)
+        self.__positions = None # node id -> position in node_order (see __position)
 
     node_order = property(lambda self: self.__node_order)
 
+    def __setstate__(self, state):
+        super(FFChromosome, self).__setstate__(state)
+        self.__dict__.setdefault('_FFChromosome__positions', None)
+
+    def delta(self, parent):
+        record = super(FFChromosome, self).delta(parent)
+        if record is None:
+            return None
+        return record + (tuple(self.__node_order),)
+
+    def child_from_delta(self, record):
+        child = super(FFChromosome, self).child_from_delta(record)
+        child.__node_order = list(record[6])
+        child.__positions = None
+        return child
+
     def _inherit_genes(child, parent1, parent2):
         super(FFChromosome, child)._inherit_genes(parent1, parent2)
 
         child.__node_order = parent1.__node_order[:]
+        child.__positions = None
 
         assert(len(child.__node_order) == len([n for n in child.node_genes if n.type == 'HIDDEN']))
 
@@ -321,20 +515,23 @@ class FFChromosome(Chromosome):
         # Add node to node order list: after the presynaptic node of the split connection
         # and before the postsynaptic node of the split connection
         if self._node_genes[split_conn.innodeid - 1].type == 'HIDDEN':
-            mini = self.__node_order.index(split_conn.innodeid) + 1
+            mini = self.__position(split_conn.innodeid) + 1
         else:
             # Presynaptic node is an input node, not hidden node
             mini = 0
         if self._node_genes[split_conn.outnodeid - 1].type == 'HIDDEN':
-            maxi = self.__node_order.index(split_conn.outnodeid)
+            maxi = self.__position(split_conn.outnodeid)
         else:
             # Postsynaptic node is an output node, not hidden node
             maxi = len(self.__node_order)
         self.__node_order.insert(random.randint(mini, maxi), ng.id)
+        self.__positions = None
         assert(len(self.__node_order) == len([n for n in self.node_genes if n.type == 'HIDDEN']))
         return (ng, split_conn)
 
     def _mutate_add_connection(self):
+        self._structural = True
+        self._sorted_genes = None
         # Only for feedforwad networks
         num_hidden = len(self.__node_order)
         num_output = len(self._node_genes) - self._input_nodes - num_hidden
@@ -345,28 +542,47 @@ class FFChromosome(Chromosome):
         remaining_conns = total_possible_conns - len(self._connection_genes)
         # Check if new connection can be added:
         if remaining_conns > 0:
-            n = random.randint(0, remaining_conns - 1)
-            count = 0
-            # Count connections
-            for in_node in (self._node_genes[:self._input_nodes] + self._node_genes[-num_hidden:]):
-                for out_node in self._node_genes[self._input_nodes:]:
-                    if (in_node.id, out_node.id) not in self._connection_genes.keys() and \
-                        self.__is_connection_feedforward(in_node, out_node):
-                        # Free connection
-                        if count == n: # Connection to create
-                            #weight = random.uniform(-Config.random_range, Config.random_range)
-                            weight = random.gauss(0,1)
-                            cg = self._conn_gene_type(in_node.id, out_node.id, weight, True)
-                            self._connection_genes[cg.key] = cg
-                            return
-                        else:
-                            count += 1
+            # inputs and hidden nodes (in order) connect to hidden nodes
+            # (in order) and outputs: a pair is feedforward unless it
+            # links two hidden nodes backwards
+            num_in = self._input_nodes + num_hidden
+            num_out = num_hidden + num_output
+            def pair(i, j):
+                if i < self._input_nodes:
+                    in_id = i + 1
+                else:
+                    in_id = self.__node_order[i - self._input_nodes]
+                if j >= num_hidden:
+                    out_id = self._input_nodes + j - num_hidden + 1
+                elif i < self._input_nodes or i - self._input_nodes < j:
+                    out_id = self.__node_order[j]
+                else:
+                    return None
+                return (in_id, out_id)
+
+            key = self._sample_free_connection(
+                lambda: pair(random.randrange(num_in), random.randrange(num_out)),
+                lambda: (key for key in (pair(i, j) for i in xrange(num_in)
+                                         for j in xrange(num_out)) if key is not None))
+            if key is not None:
+                #weight = random.uniform(-Config.random_range, Config.random_range)
+                weight = random.gauss(0,1)
+                cg = self._conn_gene_type(key[0], key[1], weight, True)
+                self._connection_genes[cg.key] = cg
+
+    def __position(self, node_id):
+        """ Returns the position of a hidden node in node_order """
+        if self.__positions is None:
+            self.__positions = dict((id, i) for i, id in enumerate(self.__node_order))
+        return self.__positions[node_id]
 
     def __is_connection_feedforward(self, in_node, out_node):
         return in_node.type == 'INPUT' or out_node.type == 'OUTPUT' or \
-            self.__node_order.index(in_node.id) < self.__node_order.index(out_node.id)
+            self.__position(in_node.id) < self.__position(out_node.id)
 
     def add_hidden_nodes(self, num_hidden):
+        self._structural = True
+        self._sorted_genes = None
         id = len(self._node_genes)+1
         for i in range(num_hidden):
             node_gene = self._node_gene_type(id,
@@ -374,6 +590,7 @@ class FFChromosome(Chromosome):
                                           activation_type = Config.nn_activation)
             self._node_genes.append(node_gene)
             self.__node_order.append(node_gene.id)
+            self.__positions = None
             id += 1
             # Connect all input nodes to it
             for pre in self._node_genes[:self._input_nodes]:
@@ -400,6 +617,131 @@ class FFChromosome(Chromosome):
         s += '\nNode order: ' + str(self.__node_order)
         return s
 
+class ArrayChromosome(Chromosome):
+    """ A chromosome whose genes are stored in typed arrays (see
+        genome_array) instead of one object per gene, taking several
+        times less memory. conn_genes and node_genes are views over the
+        arrays, while mutation, crossover and distance work on them directly.
+    """
+    def __init__(self, parent1_id, parent2_id, node_gene_type, conn_gene_type):
+        super(ArrayChromosome, self).__init__(parent1_id, parent2_id, node_gene_type, conn_gene_type)
+        self._connection_genes = genome_array.ConnectionArray()
+        self._node_genes = genome_array.NodeArray(node_gene_type)
+
+    conn_genes = property(lambda self: self._connection_genes.values()) # already sorted
+
+    def _copy_genes(self):
+        return copy.deepcopy(self._node_genes), self._connection_genes.copy()
+
+    def _new_genes(self):
+        return genome_array.NodeArray(self._node_gene_type), genome_array.ConnectionArray()
+
+    def mutate(self):
+        """ Mutates this chromosome """
+        self._sorted_genes = None
+
+        r = random.random
+        if r() < Config.prob_addnode:
+            self._mutate_add_node()
+
+        elif r() < Config.prob_addconn:
+            self._mutate_add_connection()
+
+        else:
+            conns = self._connection_genes
+            for i in xrange(len(conns)):
+                weight, enabled = conns.weights[i], conns.enabled[i]
+                conns.mutate(i) # mutate weights
+                if conns.enabled[i] != enabled:
+                    self._structural = True
+                elif conns.weights[i] != weight:
+                    self._dirty_conns.add((conns.in_ids[i], conns.out_ids[i]))
+            nodes = self._node_genes
+            for i in xrange(self._input_nodes, len(nodes)):
+                bias, response = nodes.biases[i], nodes.responses[i]
+                nodes.mutate(i) # mutate bias and response
+                if nodes.biases[i] != bias or nodes.responses[i] != response:
+                    self._dirty_nodes.add(i + 1)
+
+        return self
+
+    def _inherit_genes(child, parent1, parent2):
+        """ Applies the crossover operator, merging both parents' genes
+            in innovation order. """
+        assert(parent1.fitness >= parent2.fitness)
+
+        # the child has the same topology as the fittest parent
+        child._origin = parent1.id
+
+        # Crossover connection genes
+        conns1, conns2 = parent1._connection_genes, parent2._connection_genes
+        conns = child._connection_genes
+        j, n2 = 0, len(conns2)
+        for i in xrange(len(conns1)):
+            innov = conns1.innovations[i]
+            while j < n2 and conns2.innovations[j] < innov:
+                j += 1
+            weight, enabled = conns1.weights[i], conns1.enabled[i]
+            # Homologous gene found: randomly inherited from either parent
+            if j < n2 and conns2.innovations[j] == innov and random.choice((False, True)):
+                weight, enabled = conns2.weights[j], conns2.enabled[j]
+                if enabled != conns1.enabled[i]:
+                    child._structural = True
+                elif weight != conns1.weights[i]:
+                    child._dirty_conns.add((conns1.in_ids[i], conns1.out_ids[i]))
+            # excess or disjoint genes are copied from the fittest parent
+            conns.append(innov, conns1.in_ids[i], conns1.out_ids[i], weight, enabled)
+
+        # Crossover node genes
+        nodes1, nodes2 = parent1._node_genes, parent2._node_genes
+        nodes = child._node_genes
+        nodes.types.extend(nodes1.types)
+        nodes.activation_types = list(nodes1.activation_types)
+        nodes.activations.extend(nodes1.activations)
+        nodes.biases.extend(nodes1.biases)
+        nodes.responses.extend(nodes1.responses)
+        if nodes.time_constants is not None:
+            nodes.time_constants.extend(nodes1.time_constants)
+        # matching node genes: randomly selects the neuron's bias and response
+        for i in xrange(min(len(nodes1), len(nodes2))):
+            nodes.biases[i] = random.choice((nodes1.biases[i], nodes2.biases[i]))
+            nodes.responses[i] = random.choice((nodes1.responses[i], nodes2.responses[i]))
+            if nodes.time_constants is not None:
+                nodes.time_constants[i] = random.choice((nodes1.time_constants[i],
+                                                         nodes2.time_constants[i]))
+            if nodes.biases[i] != nodes1.biases[i] or nodes.responses[i] != nodes1.responses[i]:
+                child._dirty_nodes.add(i + 1)
+
+    def _mutate_add_node(self):
+        self._structural = True
+        self._sorted_genes = None
+        # Choose a random connection to split
+        conn_to_split = random.choice(self._connection_genes.values())
+        ng = self._node_gene_type(len(self._node_genes) + 1, 'HIDDEN', activation_type = Config.nn_activation)
+        self._node_genes.append(ng)
+        new_conn1, new_conn2 = conn_to_split.split(ng.id)
+        # views move when genes are inserted: returns a copy instead
+        conn_to_split = conn_to_split.copy()
+        self._connection_genes[new_conn1.key] = new_conn1
+        self._connection_genes[new_conn2.key] = new_conn2
+        return (ng, conn_to_split)
+
+    def _innovations(self):
+        # the arrays are kept sorted
+        return self._connection_genes.innovations, self._connection_genes.weights
+
+    def size(self):
+        """ Defines chromosome 'complexity': number of hidden nodes plus
+            number of enabled connections (bias is not considered)
+        """
+        num_hidden = len(self._node_genes) - self._input_nodes - self._output_nodes
+        return (num_hidden, sum(self._connection_genes.enabled))
+
+class FFArrayChromosome(FFChromosome, ArrayChromosome):
+    """ A chromosome for feedforward neural networks with its genes
+        stored in typed arrays. """
+    pass
+
 if __name__ == '__main__':
     # Example
     import visualize
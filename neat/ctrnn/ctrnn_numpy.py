@@ -0,0 +1,254 @@
+"""
+ NumPy Continuous-Time Recurrent Neural Networks. States, time
+ constants, biases and weights are kept in arrays with one row per
+ network, so a single phenotype can advance a whole batch of CTRNNs
+ (e.g. a population) at once. Three integration methods are available:
+
+    'euler'     - Forward-Euler, as in ctrnn_pure (the default)
+    'rk4'       - 4th order Runge-Kutta
+    'exp_euler' - exponential Euler: the decay term is integrated
+                  exactly and the synaptic input is held during the
+                  step, which stays stable for steps larger than tau
+"""
+try:
+    import numpy as np
+except ImportError:
+    print "NumPy not found! Please install it: http://numpy.scipy.org/"
+    raise
+
+from neat.nn import activations
+from neat.nn.nn_numpy import _sigmoid_into
+
+class CTRNN(object):
+    """ A batch of CTRNNs packed into padded arrays (networks x neurons).
+        Input neurons are not part of the state: they only feed the
+        neurons through the sensory weights.
+    """
+    METHODS = ('euler', 'rk4', 'exp_euler')
+
+    def __init__(self, weights, sensory_weights, bias, response, tau,
+                 activation_types, outputs, single = False):
+        self._num_inputs = sensory_weights.shape[-1]
+        self.__weights = weights                 # networks x neurons x neurons
+        self.__sensory_weights = sensory_weights # networks x neurons x inputs
+        self.__bias = bias
+        self.__response = response
+        self.__tau = tau
+        self.__activation_types = activation_types
+        self.__activations = dict((kind, activations.get(kind).vectorized)
+                                  for kind in set(activation_types.flat) - set([None]))
+        # exact functions of a single type are computed in place
+        kinds = self.__activations.keys()
+        if len(kinds) == 1 and kinds[0] in ('exp', 'tanh') and activations.is_exact(kinds[0]):
+            self.__exact = kinds[0]
+        else:
+            self.__exact = None
+        self.__outputs = outputs
+        self.__single = single # one network: lists in and out, as ctrnn_pure
+
+        self.__init_state = np.empty(bias.shape)
+        self.__init_state.fill(0.1) # as ctrnn_pure.CTNeuron
+        self.__allocate_buffers()
+        self.set_euler(0.05)
+        self.flush()
+
+    def __allocate_buffers(self):
+        self.__rows = np.arange(len(self.__bias))[:,None]
+        self.__x = np.zeros(self.__bias.shape)
+        self.__buffer = np.zeros(self.__bias.shape)
+        self.__mask = np.zeros(self.__bias.shape, dtype=bool)
+        # one mask per activation type, used when they are mixed
+        self.__masks = [(activation, self.__activation_types == kind)
+                        for kind, activation in self.__activations.items()]
+
+    def __len__(self):
+        return len(self.__bias)
+
+    def __repr__(self):
+        return '%d networks of up to %d neurons (%s, dt = %s)' \
+                % (len(self), self.__bias.shape[-1], self.__method, self.__dt)
+
+    method = property(lambda self: self.__method)
+    dt = property(lambda self: self.__dt)
+    states = property(lambda self: self.__state, doc = 'networks x neurons')
+    outputs = property(lambda self: self.__output, doc = 'networks x neurons')
+
+    def __set_method(self, method, dt):
+        assert method in self.METHODS, 'Invalid integration method: %s' % method
+        self.__method = method
+        self.__dt = dt
+        # precomputed factors, as dt*(1.0/tau) in ctrnn_pure
+        self.__rate = dt*(1.0/self.__tau)
+        self.__decay = np.exp(-self.__rate)
+
+    def set_euler(self, dt):
+        self.__set_method('euler', dt)
+
+    def set_rk4(self, dt):
+        self.__set_method('rk4', dt)
+
+    def set_exp_euler(self, dt):
+        self.__set_method('exp_euler', dt)
+
+    def set_integration_step(self, dt):
+        self.__set_method(self.__method, dt)
+
+    def set_init_state(self, states):
+        """ Initial states (one per neuron or networks x neurons), used
+            from now on by flush. """
+        self.__init_state[:] = states
+        self.flush()
+
+    def flush(self):
+        """ Restores the initial states """
+        self.__state = self.__init_state.copy()
+        self.__output = self.__activate(self.__state)
+
+    def keep(self, networks):
+        """ Drops all networks but the given ones (indices or a mask) """
+        for name in ('weights', 'sensory_weights', 'bias', 'response', 'tau',
+                     'activation_types', 'outputs', 'init_state', 'state',
+                     'output', 'rate', 'decay'):
+            attr = '_CTRNN__' + name
+            setattr(self, attr, getattr(self, attr)[networks])
+        self.__allocate_buffers()
+
+    def __activate(self, state, output = None):
+        x = np.add(state, self.__bias, out=self.__x)
+        if output is None:
+            output = np.empty(x.shape)
+        if self.__exact is not None:
+            _sigmoid_into(x, self.__response, self.__exact, output, self.__buffer, self.__mask)
+        else:
+            for activation, mask in self.__masks:
+                output[mask] = activation(x[mask], self.__response[mask])
+        return output
+
+    def __synaptic_input(self, output, sensory):
+        return np.einsum('pij,pj->pi', self.__weights, output) + sensory
+
+    def __step(self, sensory):
+        state = self.__state
+        if self.__method == 'euler':
+            state += self.__rate*(self.__synaptic_input(self.__output, sensory) - state)
+        elif self.__method == 'exp_euler':
+            current = self.__synaptic_input(self.__output, sensory)
+            state *= self.__decay
+            state += (1.0 - self.__decay)*current
+        else:
+            f = lambda s: self.__synaptic_input(self.__activate(s), sensory) - s
+            k1 = self.__rate*(self.__synaptic_input(self.__output, sensory) - state)
+            k2 = self.__rate*f(state + 0.5*k1)
+            k3 = self.__rate*f(state + 0.5*k2)
+            k4 = self.__rate*f(state + k3)
+            state += (k1 + 2.0*(k2 + k3) + k4)/6.0
+        self.__activate(state, self.__output)
+
+    def __sensory(self, inputs):
+        inputs = np.asarray(inputs, dtype=float)
+        assert inputs.shape[-1] == self._num_inputs, "Wrong number of inputs."
+        if inputs.ndim == 1:
+            return np.dot(self.__sensory_weights, inputs)
+        return np.einsum('pij,pj->pi', self.__sensory_weights, inputs)
+
+    def __return(self, output):
+        if self.__single:
+            return output[0].tolist()
+        return output
+
+    def pactivate(self, inputs=[]):
+        """ Advances every network a single time step. Inputs and outputs
+            have one row per network (a single row is fed to all of them);
+            for a phenotype of one chromosome they are lists, as in
+            ctrnn_pure. """
+        self.__step(self.__sensory(inputs))
+        return self.__return(self.__output[self.__rows, self.__outputs])
+
+    def rollout(self, input_sequence, steps=None):
+        """ Advances the networks for several time steps (see
+            nn_pure.Network.rollout): the inputs of step t are
+            input_sequence[t], the last ones being held. Returns a
+            (steps, outputs) array, or (steps, networks, outputs). """
+        if steps is None:
+            steps = len(input_sequence)
+        assert steps == 0 or len(input_sequence) > 0, "No inputs to hold."
+        trajectory = np.empty((steps,) + self.__outputs.shape)
+        last = len(input_sequence) - 1
+        sensory = None
+        for t in xrange(steps):
+            if t <= last: # held inputs are only multiplied once
+                sensory = self.__sensory(input_sequence[t])
+            self.__step(sensory)
+            trajectory[t] = self.__output[self.__rows, self.__outputs]
+        if self.__single:
+            return trajectory[:,0]
+        return trajectory
+
+def _arrays(chromosomes):
+    """ Packs the chromosomes into padded arrays. Padding neurons have
+        no links, so they don't affect the others. """
+    num_inputs = chromosomes[0].sensors
+    P = len(chromosomes)
+    N = max(len(c.node_genes) for c in chromosomes) - num_inputs
+
+    weights = np.zeros((P, N, N))
+    sensory_weights = np.zeros((P, N, num_inputs))
+    bias = np.zeros((P, N))
+    response = np.ones((P, N))
+    tau = np.ones((P, N))
+    activation_types = np.empty((P, N), dtype=object)
+    outputs = []
+    for p, c in enumerate(chromosomes):
+        assert c.sensors == num_inputs
+        neurons = c.node_genes[num_inputs:]
+        for i, ng in enumerate(neurons):
+            bias[p, i] = ng.bias
+            response[p, i] = ng.response
+            tau[p, i] = ng.time_constant
+            activation_types[p, i] = ng.activation_type
+        activation_types[p, len(neurons):] = neurons[-1].activation_type
+        outputs.append([i for i, ng in enumerate(neurons) if ng.type == 'OUTPUT'])
+        for cg in c.conn_genes:
+            if cg.enabled:
+                if cg.innodeid <= num_inputs:
+                    sensory_weights[p, cg.outnodeid-num_inputs-1, cg.innodeid-1] = cg.weight
+                else:
+                    weights[p, cg.outnodeid-num_inputs-1, cg.innodeid-num_inputs-1] = cg.weight
+    return weights, sensory_weights, bias, response, tau, activation_types, np.array(outputs, dtype=int)
+
+def create_phenotype(chromo):
+    """ Receives a chromosome and returns its phenotype (a CTRNN) """
+    return CTRNN(*_arrays([chromo]), single = True)
+
+def create_population_phenotype(chromosomes):
+    """ Receives a list of chromosomes and returns a single phenotype
+        advancing all of them at once. """
+    return CTRNN(*_arrays(chromosomes))
+
+if __name__ == "__main__":
+    # Beer's example (see ctrnn_pure): two neurons with no inputs
+    from neat.ctrnn import ctrnn_pure
+    from neat.nn import nn_pure as nn
+
+    def beer():
+        net = CTRNN(np.array([[[4.5, 1.0], [-1.0, 4.5]]]), np.zeros((1, 2, 0)),
+                    np.array([[-2.75, -1.75]]), np.ones((1, 2)), np.array([[0.5, 0.5]]),
+                    np.array([['exp', 'exp']], dtype=object), np.array([[0, 1]]), single = True)
+        net.set_init_state([-0.084000643, -0.408035109])
+        return net
+
+    N1 = ctrnn_pure.CTNeuron('OUTPUT', 1, -2.75, 1.0, 'exp', 0.5)
+    N2 = ctrnn_pure.CTNeuron('OUTPUT', 2, -1.75, 1.0, 'exp', 0.5)
+    N1.set_init_state(-0.084000643)
+    N2.set_init_state(-0.408035109)
+    pure = nn.Network([N1, N2], [(1, 1, 4.5), (1, 2, -1.0), (2, 1, 1.0), (2, 2, 4.5)])
+    expected = pure.rollout([[]], 1000)
+    print '   pure euler', expected[-1]
+
+    net = beer()
+    print '  numpy euler', net.rollout([[]], 1000)[-1].tolist()
+    # the same network with a smaller step, for every method
+    for method in CTRNN.METHODS:
+        net = beer()
+        getattr(net, 'set_' + method)(0.005)
+        print '%13s' % method, net.rollout([[]], 10000)[-1].tolist()
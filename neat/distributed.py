@@ -0,0 +1,461 @@
+# -*- coding: UTF-8 -*-
+"""
+ Distributed evaluation over TCP or Unix sockets. A Coordinator, in the
+ process running the population, sends chromosomes to Workers, which may
+ run on other machines and connect to it at any time:
+
+    # on the coordinator's machine
+    coordinator = distributed.Coordinator(('', 7777), timeout = 60, authkey = key)
+    population.Population.evaluate = lambda population: coordinator.evaluate(population)
+
+    # on each worker's machine (eval_fitness(chromo) -> float)
+    distributed.Worker(('coordinator-host', 7777), eval_fitness, authkey = key).run()
+
+ An address is a (host, port) tuple for TCP or a path for a Unix socket.
+ Messages are pickled tuples prefixed by their length (4 bytes, network
+ order). Chromosomes travel as delta records from a blank chromosome
+ (see Chromosome.delta), so only numbers are sent per gene; the blank,
+ with the class and settings, is sent once to each worker.
+
+ Workers must load the same configuration as the coordinator.
+
+ Both ends prove they know a shared authkey before anything is
+ unpickled (an HMAC challenge and response each way, as in
+ multiprocessing.connection); by default it is the authkey of the
+ current process, inherited by workers started with multiprocessing.
+ Even so, messages are neither encrypted nor protected once connected:
+ use it on trusted networks only.
+
+ A worker whose job takes longer than timeout seconds, or whose
+ connection is lost, is dropped and its jobs are sent to another one.
+ Results are assigned as they arrive (see also submit and collect, for
+ Population.steady_state).
+"""
+import os
+import hmac
+import time
+import errno
+import hashlib
+import socket
+import select
+import struct
+import traceback
+import cPickle as pickle
+import multiprocessing
+from multiprocessing import AuthenticationError
+from collections import deque
+
+_HEADER = struct.Struct('!I')
+
+_CHALLENGE = '#CHALLENGE#'
+_WELCOME = '#WELCOME#'
+_FAILURE = '#FAILURE#'
+_MAX_HANDSHAKE = 256 # bytes of any handshake message
+_HANDSHAKE_TIMEOUT = 10 # seconds
+
+def _socket(address):
+    if isinstance(address, tuple):
+        return socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    return socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+def _send(sock, message):
+    data = pickle.dumps(message, 2)
+    sock.sendall(_HEADER.pack(len(data)) + data)
+    return _HEADER.size + len(data)
+
+def _recv_exactly(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise EOFError('Connection closed')
+        chunks.append(chunk)
+        size -= len(chunk)
+    return ''.join(chunks)
+
+def _recv(sock):
+    size, = _HEADER.unpack(_recv_exactly(sock, _HEADER.size))
+    return pickle.loads(_recv_exactly(sock, size))
+
+def _send_bytes(sock, data):
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+def _recv_bytes(sock):
+    """ Receives a handshake message (never unpickled) """
+    size, = _HEADER.unpack(_recv_exactly(sock, _HEADER.size))
+    if size > _MAX_HANDSHAKE:
+        raise AuthenticationError('Handshake message too long')
+    return _recv_exactly(sock, size)
+
+def _authkey(authkey):
+    if authkey is None:
+        return multiprocessing.current_process().authkey
+    return authkey
+
+def _digest(authkey, challenge):
+    return hmac.new(authkey, challenge, hashlib.sha256).digest()
+
+def _deliver_challenge(sock, authkey):
+    """ Checks that the other end knows the authkey """
+    challenge = os.urandom(32)
+    _send_bytes(sock, _CHALLENGE + challenge)
+    if not hmac.compare_digest(_recv_bytes(sock), _digest(authkey, challenge)):
+        _send_bytes(sock, _FAILURE)
+        raise AuthenticationError('Digest received was wrong')
+    _send_bytes(sock, _WELCOME)
+
+def _answer_challenge(sock, authkey):
+    """ Proves to the other end that we know the authkey """
+    message = _recv_bytes(sock)
+    if not message.startswith(_CHALLENGE):
+        raise AuthenticationError('Expected a challenge')
+    _send_bytes(sock, _digest(authkey, message[len(_CHALLENGE):]))
+    if _recv_bytes(sock) != _WELCOME:
+        raise AuthenticationError('Digest sent was rejected')
+
+class Worker(object):
+    """ Evaluates the chromosomes sent by a coordinator with
+        eval_function(chromo) until the coordinator stops it. The
+        coordinator must have the same authkey (default: this process'
+        authkey, see multiprocessing). """
+    def __init__(self, address, eval_function, retry = 30, authkey = None):
+        self.__address = address
+        self.__eval_function = eval_function
+        self.__retry = retry # seconds to wait for the coordinator
+        self.__authkey = _authkey(authkey)
+
+    def __connect(self):
+        deadline = time.time() + self.__retry
+        while True:
+            sock = _socket(self.__address)
+            try:
+                sock.connect(self.__address)
+                return sock
+            except socket.error:
+                sock.close()
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.1)
+
+    def run(self):
+        """ Connects to the coordinator and serves it. Returns the number
+            of chromosomes evaluated. Raises AuthenticationError if the
+            coordinator has another authkey. """
+        sock = self.__connect()
+        if isinstance(self.__address, tuple):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            _answer_challenge(sock, self.__authkey)
+            _deliver_challenge(sock, self.__authkey)
+        except (EOFError, socket.error):
+            sock.close()
+            raise AuthenticationError('Connection closed during the handshake')
+        except AuthenticationError:
+            sock.close()
+            raise
+        _send(sock, ('hello', socket.gethostname(), os.getpid()))
+        blanks = {}
+        evaluated = 0
+        try:
+            while True:
+                message = _recv(sock)
+                if message is None: # stop
+                    break
+                if message[0] == 'blank':
+                    blanks[message[1]] = message[2]
+                    continue
+                # ('jobs', [(job id, blank's key, record), ...])
+                for job_id, key, record in message[1]:
+                    try:
+                        fitness = self.__eval_function(blanks[key].child_from_delta(record))
+                    except:
+                        _send(sock, ('error', job_id, traceback.format_exc()))
+                    else:
+                        # streamed: one result as soon as it is ready
+                        _send(sock, ('result', job_id, fitness))
+                        evaluated += 1
+        except (EOFError, socket.error): # the coordinator is gone (or dropped us)
+            pass
+        finally:
+            sock.close()
+        return evaluated
+
+class _Connection(object):
+    """ A worker, as seen from the coordinator """
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+        self.name = str(address)
+        self.buffer = ''
+        self.blanks = set()  # keys of the blank chromosomes sent
+        self.jobs = {}       # job id -> chromosome
+        self.deadline = None
+        self.evaluated = 0
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def receive(self):
+        """ Reads what is available and returns the complete messages """
+        data = self.sock.recv(65536)
+        if not data:
+            raise EOFError('Connection closed')
+        self.buffer += data
+        messages = []
+        while len(self.buffer) >= _HEADER.size:
+            size, = _HEADER.unpack_from(self.buffer)
+            end = _HEADER.size + size
+            if len(self.buffer) < end:
+                break
+            messages.append(pickle.loads(self.buffer[_HEADER.size:end]))
+            self.buffer = self.buffer[end:]
+        return messages
+
+class Coordinator(object):
+    """ Hands out chromosomes to the workers connected to address. A
+        job (chunksize chromosomes) taking more than timeout seconds per
+        chromosome (None: no limit) is given to another worker. Workers
+        must prove they know the authkey (default: this process'
+        authkey, see multiprocessing). """
+    def __init__(self, address, timeout = None, chunksize = 1, authkey = None):
+        self.__timeout = timeout
+        self.__authkey = _authkey(authkey)
+        self.__chunksize = chunksize
+        self.__listener = _socket(address)
+        if isinstance(address, tuple):
+            self.__listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        elif os.path.exists(address):
+            os.unlink(address)
+        self.__listener.bind(address)
+        self.__listener.listen(64)
+        self.__address = self.__listener.getsockname()
+        self.__workers = []
+        self.__queue = deque()     # (job id, chromosome) to be sent
+        self.__done = deque()      # chromosomes evaluated, not yet collected
+        self.__in_flight = 0
+        self.__next_job = 0
+        self.__blanks = {}         # chromosome class -> (key, blank)
+        self.__bytes_sent = 0
+        self.__requeued = 0
+
+    address = property(lambda self: self.__address)
+    num_workers = property(lambda self: len(self.__workers))
+    bytes_sent = property(lambda self: self.__bytes_sent)
+    requeued = property(lambda self: self.__requeued,
+                        doc = 'Chromosomes sent again after a worker was lost')
+
+    def wait_for_workers(self, n, timeout = None):
+        """ Waits until at least n workers are connected """
+        deadline = None if timeout is None else time.time() + timeout
+        while len(self.__workers) < n:
+            left = None if deadline is None else deadline - time.time()
+            if left is not None and left <= 0:
+                raise RuntimeError('Only %d of %d workers connected' % (len(self.__workers), n))
+            self.__poll(left)
+
+    def __enqueue(self, chromo):
+        self.__queue.append((self.__next_job, chromo))
+        self.__next_job += 1
+        self.__in_flight += 1
+
+    def submit(self, chromo):
+        """ Queues a chromosome for evaluation (see collect) """
+        self.__enqueue(chromo)
+        self.__dispatch()
+
+    def collect(self):
+        """ Waits for any submitted chromosome to be evaluated, assigns its
+            fitness and returns it. An exception raised by eval_function
+            is raised as a RuntimeError with the worker's traceback, and
+            all chromosomes in flight are forgotten (they must be
+            submitted again). """
+        assert self.__in_flight, 'No chromosomes in flight'
+        while not self.__done:
+            self.__poll(self.__time_left())
+        self.__in_flight -= 1
+        return self.__done.popleft()
+
+    def evaluate(self, population):
+        """ Assigns the fitness of every chromosome in the population """
+        chromosomes = list(population)
+        for chromo in chromosomes:
+            self.__enqueue(chromo)
+        self.__dispatch()
+        for chromo in chromosomes:
+            self.collect()
+
+    def __time_left(self):
+        """ Seconds to the first deadline (None: no deadline) """
+        deadlines = [w.deadline for w in self.__workers if w.deadline is not None]
+        if not deadlines:
+            return None
+        return max(0.0, min(deadlines) - time.time())
+
+    def __poll(self, timeout):
+        """ Accepts workers and reads results for up to timeout seconds """
+        try:
+            readable = select.select([self.__listener] + self.__workers, [], [], timeout)[0]
+        except select.error, e:
+            if e.args[0] != errno.EINTR:
+                raise
+            readable = []
+        for r in readable:
+            if r is self.__listener:
+                self.__accept()
+                continue
+            try:
+                messages = r.receive()
+            except (EOFError, socket.error):
+                self.__drop(r, 'connection lost')
+                continue
+            for message in messages:
+                self.__handle(r, message)
+        now = time.time()
+        for w in self.__workers[:]:
+            if w.deadline is not None and now > w.deadline:
+                self.__drop(w, 'timed out')
+        self.__dispatch()
+
+    def __accept(self):
+        sock, address = self.__listener.accept()
+        if isinstance(self.__address, tuple):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.settimeout(_HANDSHAKE_TIMEOUT)
+        try:
+            _deliver_challenge(sock, self.__authkey)
+            _answer_challenge(sock, self.__authkey)
+        except (AuthenticationError, EOFError, socket.error), e:
+            print 'Rejecting connection from %s: %s' % (address, e)
+            sock.close()
+            return
+        sock.settimeout(None)
+        self.__workers.append(_Connection(sock, address))
+
+    def __handle(self, worker, message):
+        kind = message[0]
+        if kind == 'hello':
+            worker.name = '%s:%d' % (message[1], message[2])
+            return
+        job_id = message[1]
+        chromo = worker.jobs.pop(job_id, None)
+        if chromo is None: # not ours anymore
+            return
+        if kind == 'error':
+            self.__cancel()
+            raise RuntimeError('eval_function failed in worker %s:\n%s' % (worker.name, message[2]))
+        chromo.fitness = message[2]
+        worker.evaluated += 1
+        self.__done.append(chromo)
+        if worker.jobs:
+            worker.deadline = self.__deadline(len(worker.jobs))
+        else:
+            worker.deadline = None
+
+    def __cancel(self):
+        """ Forgets every chromosome submitted and not collected: the
+            results still to come are ignored """
+        self.__queue.clear()
+        self.__done.clear()
+        self.__in_flight = 0
+        for w in self.__workers:
+            w.jobs = {}
+            w.deadline = None
+
+    def __deadline(self, jobs):
+        if self.__timeout is None:
+            return None
+        return time.time() + self.__timeout*jobs
+
+    def __drop(self, worker, reason):
+        """ Closes a worker's connection and requeues its jobs """
+        print 'Dropping worker %s (%s): %d job(s) requeued' % (worker.name, reason, len(worker.jobs))
+        self.__workers.remove(worker)
+        worker.sock.close()
+        self.__requeued += len(worker.jobs)
+        self.__queue.extendleft(sorted(worker.jobs.items(), reverse=True))
+        worker.jobs = {}
+
+    def __record(self, worker, chromo):
+        """ Returns the blank's key and the chromosome's record, sending
+            the worker the blank first if needed """
+        cls = chromo.__class__
+        if cls not in self.__blanks:
+            self.__blanks[cls] = (len(self.__blanks), chromo.blank())
+        key, blank = self.__blanks[cls]
+        if key not in worker.blanks:
+            self.__bytes_sent += _send(worker.sock, ('blank', key, blank))
+            worker.blanks.add(key)
+        return key, chromo.delta(blank)
+
+    def __dispatch(self):
+        """ Sends queued jobs to idle workers """
+        for w in self.__workers[:]:
+            if not self.__queue:
+                return
+            if w.jobs:
+                continue
+            jobs = []
+            while self.__queue and len(jobs) < self.__chunksize:
+                jobs.append(self.__queue.popleft())
+            try:
+                records = [(job_id,) + self.__record(w, chromo) for job_id, chromo in jobs]
+                self.__bytes_sent += _send(w.sock, ('jobs', records))
+            except socket.error:
+                self.__queue.extendleft(reversed(jobs))
+                self.__drop(w, 'connection lost')
+                continue
+            w.jobs = dict(jobs)
+            w.deadline = self.__deadline(len(jobs))
+
+    def print_stats(self):
+        print 'Worker                    evaluated   in flight'
+        for w in self.__workers:
+            print '%-25s %9d %11d' % (w.name, w.evaluated, len(w.jobs))
+        print 'Sent %d bytes, %d chromosome(s) requeued' % (self.__bytes_sent, self.__requeued)
+
+    def stop(self):
+        """ Stops the workers and closes the listening socket """
+        for w in self.__workers:
+            try:
+                _send(w.sock, None)
+            except socket.error:
+                pass
+            w.sock.close()
+        self.__workers = []
+        self.__listener.close()
+        if not isinstance(self.__address, tuple) and os.path.exists(self.__address):
+            os.unlink(self.__address)
+
+if __name__ == '__main__':
+    # Example: a coordinator and three local workers, one of them too slow
+    import multiprocessing
+    from config import Config
+    import chromosome, genome
+
+    Config.input_nodes = 2
+    Config.output_nodes = 1
+    Config.nn_activation = 'exp'
+    Config.weight_stdev = 0.9
+    chromosome.node_gene_type = genome.NodeGene
+
+    def eval_fitness(chromo):
+        return sum(cg.weight for cg in chromo.conn_genes)
+
+    def slow_fitness(chromo):
+        time.sleep(5)
+        return eval_fitness(chromo)
+
+    coordinator = Coordinator(('127.0.0.1', 0), timeout = 1)
+    workers = [multiprocessing.Process(target=Worker(coordinator.address, f).run)
+               for f in (eval_fitness, eval_fitness, slow_fitness)]
+    for w in workers:
+        w.start()
+    coordinator.wait_for_workers(3)
+
+    chromosomes = [chromosome.FFChromosome.create_fully_connected() for i in xrange(50)]
+    coordinator.evaluate(chromosomes)
+    assert all(c.fitness == eval_fitness(c) for c in chromosomes)
+    coordinator.print_stats()
+    coordinator.stop()
+    for w in workers:
+        w.join()
@@ -118,6 +118,20 @@ class ConnectionGene(object):
     def reset_innovations(cls):
         cls.__innovations = {}
 
+    @classmethod
+    def lookup_innovation(cls, key):
+        """ Returns the innovation number of a (in, out) connection, or None if it is new """
+        return cls.__innovations.get(key)
+
+    @classmethod
+    def register_innovation(cls, key, innovation):
+        """ Records the innovation number of a connection made elsewhere
+            (in another process or before a checkpoint was saved): new
+            connections are numbered after it """
+        cls.__innovations.setdefault(key, innovation)
+        if innovation > cls.__global_innov_number:
+            cls.__global_innov_number = innovation
+
     def __init__(self, innodeid, outnodeid, weight, enabled, innov = None):
         self.__in = innodeid
         self.__out = outnodeid
@@ -131,11 +145,13 @@ class ConnectionGene(object):
                 self.__innovations[self.key] = self.__innov_number
         else:
             self.__innov_number = innov
+            self.register_innovation(self.key, innov)
 
     weight    = property(lambda self: self.__weight)
     innodeid  = property(lambda self: self.__in)
     outnodeid = property(lambda self: self.__out)
     enabled   = property(lambda self: self.__enabled)
+    innovation = property(lambda self: self.__innov_number)
     # Key for dictionaries, avoids two connections between the same nodes.
     key = property(lambda self: (self.__in, self.__out))
 
@@ -180,7 +196,7 @@ class ConnectionGene(object):
         return s + "Innov %d" % (self.__innov_number,)
 
     def __cmp__(self, other):
-        return cmp(self.__innov_number, other.__innov_number)
+        return cmp(self.__innov_number, other.innovation)
 
     def split(self, node_id):
         """ Splits a connection, creating two new connections and disabling this one """
@@ -194,7 +210,7 @@ class ConnectionGene(object):
                               self.__enabled, self.__innov_number)
 
     def is_same_innov(self, cg):
-        return self.__innov_number == cg.__innov_number
+        return self.__innov_number == cg.innovation
 
     def get_child(self, cg):
         # TODO: average both weights (Stanley, p. 38)
@@ -0,0 +1,384 @@
+# -*- coding: UTF-8 -*-
+"""
+ Struct-of-arrays gene storage. Instead of one Python object per gene,
+ all of a chromosome's genes are kept in typed arrays, one for each
+ attribute. The stores behave like the containers used by Chromosome
+ (a dict of connection genes keyed by (in, out) and a list of node
+ genes) and return lightweight views of the genes, so the rest of the
+ code does not need to know how genes are stored.
+
+ A view refers to a position in the arrays: it is only valid until a
+ gene is inserted into the store.
+"""
+import math
+import random
+from array import array
+from bisect import bisect_left, bisect_right
+from config import Config
+import genome
+
+try:
+    import numpy as np
+except ImportError:
+    np = None # no vectorized comparison
+
+class ConnectionArray(object):
+    """ Connection genes sorted by innovation number """
+    __slots__ = ('innovations', 'in_ids', 'out_ids', 'weights', 'enabled')
+
+    def __init__(self):
+        self.innovations = array('l')
+        self.in_ids      = array('l')
+        self.out_ids     = array('l')
+        self.weights     = array('d')
+        self.enabled     = array('b')
+
+    def __len__(self):
+        return len(self.innovations)
+
+    def __getstate__(self):
+        return (self.innovations, self.in_ids, self.out_ids, self.weights, self.enabled)
+
+    def __setstate__(self, state):
+        self.innovations, self.in_ids, self.out_ids, self.weights, self.enabled = state
+        # genes from another process or a checkpoint: find needs their
+        # innovation numbers
+        register = genome.ConnectionGene.register_innovation
+        for i in xrange(len(self.innovations)):
+            register((self.in_ids[i], self.out_ids[i]), self.innovations[i])
+
+    def copy(self):
+        """ Returns a copy of the genes (faster than copy.deepcopy) """
+        store = ConnectionArray()
+        store.innovations = array('l', self.innovations)
+        store.in_ids      = array('l', self.in_ids)
+        store.out_ids     = array('l', self.out_ids)
+        store.weights     = array('d', self.weights)
+        store.enabled     = array('b', self.enabled)
+        return store
+
+    def find(self, key):
+        """ Returns the position of the connection gene, or -1. The key
+            is looked up by its innovation number: every gene must have
+            been created or registered in this process (see
+            ConnectionGene.register_innovation). """
+        innov = genome.ConnectionGene.lookup_innovation(key)
+        if innov is None:
+            return -1 # a brand new connection
+        i = bisect_left(self.innovations, innov)
+        if i < len(self.innovations) and self.innovations[i] == innov:
+            assert self.in_ids[i] == key[0] and self.out_ids[i] == key[1]
+            return i
+        return -1
+
+    def __contains__(self, key):
+        return self.find(key) >= 0
+
+    def __getitem__(self, key):
+        i = self.find(key)
+        if i < 0:
+            raise KeyError(key)
+        return ConnectionView(self, i)
+
+    def __setitem__(self, key, gene):
+        assert key == gene.key
+        i = self.find(key)
+        if i >= 0:
+            assert self.innovations[i] == gene.innovation
+            self.weights[i] = gene.weight
+            self.enabled[i] = gene.enabled
+        else:
+            self.insert(gene.innovation, gene.innodeid, gene.outnodeid,
+                        gene.weight, gene.enabled)
+
+    def insert(self, innovation, innodeid, outnodeid, weight, enabled):
+        """ Adds a new gene keeping the innovation order """
+        if not len(self.innovations) or innovation > self.innovations[-1]:
+            i = len(self.innovations) # the usual case: a brand new innovation
+        else:
+            i = bisect_left(self.innovations, innovation)
+        self.innovations.insert(i, innovation)
+        self.in_ids.insert(i, innodeid)
+        self.out_ids.insert(i, outnodeid)
+        self.weights.insert(i, weight)
+        self.enabled.insert(i, enabled)
+
+    def append(self, innovation, innodeid, outnodeid, weight, enabled):
+        """ Adds a gene with a higher innovation number than all others """
+        self.innovations.append(innovation)
+        self.in_ids.append(innodeid)
+        self.out_ids.append(outnodeid)
+        self.weights.append(weight)
+        self.enabled.append(enabled)
+
+    def keys(self):
+        return zip(self.in_ids, self.out_ids)
+
+    def values(self):
+        return [ConnectionView(self, i) for i in xrange(len(self.innovations))]
+
+    def items(self):
+        return [((self.in_ids[i], self.out_ids[i]), ConnectionView(self, i))
+                for i in xrange(len(self.innovations))]
+
+    def mutate(self, i):
+        """ Same as ConnectionGene.mutate for the i-th gene """
+        r = random.random
+        if r() < Config.prob_mutate_weight:
+            weight = self.weights[i] + random.gauss(0,1)*Config.weight_mutation_power
+            if weight > Config.max_weight:
+                weight = Config.max_weight
+            elif weight < Config.min_weight:
+                weight = Config.min_weight
+            self.weights[i] = weight
+        if r() < Config.prob_togglelink:
+            self.enabled[i] = True
+
+
+class ConnectionView(object):
+    """ A connection gene stored in a ConnectionArray """
+    __slots__ = ('__store', '__i')
+
+    def __init__(self, store, i):
+        self.__store = store
+        self.__i = i
+
+    weight     = property(lambda self: self.__store.weights[self.__i])
+    innodeid   = property(lambda self: self.__store.in_ids[self.__i])
+    outnodeid  = property(lambda self: self.__store.out_ids[self.__i])
+    enabled    = property(lambda self: bool(self.__store.enabled[self.__i]))
+    innovation = property(lambda self: self.__store.innovations[self.__i])
+    key        = property(lambda self: (self.innodeid, self.outnodeid))
+
+    def mutate(self):
+        self.__store.mutate(self.__i)
+
+    def enable(self):
+        self.__store.enabled[self.__i] = True
+
+    def split(self, node_id):
+        """ Splits a connection, creating two new connections and disabling this one """
+        self.__store.enabled[self.__i] = False
+        new_conn1 = genome.ConnectionGene(self.innodeid, node_id, 1.0, True)
+        new_conn2 = genome.ConnectionGene(node_id, self.outnodeid, self.weight, True)
+        return new_conn1, new_conn2
+
+    def copy(self):
+        return genome.ConnectionGene(self.innodeid, self.outnodeid, self.weight,
+                                     self.enabled, self.innovation)
+
+    def is_same_innov(self, cg):
+        return self.innovation == cg.innovation
+
+    def get_child(self, cg):
+        return random.choice((self, cg)).copy()
+
+    def __cmp__(self, other):
+        return cmp(self.innovation, other.innovation)
+
+    def __str__(self):
+        return str(self.copy())
+
+
+class NodeArray(object):
+    """ Node genes, in the order of their ids (starting at 1) """
+    __slots__ = ('types', 'biases', 'responses', 'activations', 'activation_types',
+                 'time_constants', '__gene_type')
+
+    TYPES = ('INPUT', 'HIDDEN', 'OUTPUT')
+
+    def __init__(self, node_gene_type):
+        self.__gene_type = node_gene_type
+        self.types       = array('b')
+        self.biases      = array('d')
+        self.responses   = array('d')
+        self.activations = array('b') # indexes into activation_types
+        # the activation types' names, kept (and pickled) with the genes:
+        # the indexes mean the same in every process
+        self.activation_types = []
+        # only for continuous-time node genes
+        if issubclass(node_gene_type, genome.CTNodeGene):
+            self.time_constants = array('d')
+        else:
+            self.time_constants = None
+
+    def __len__(self):
+        return len(self.types)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [NodeView(self, j) for j in xrange(*i.indices(len(self.types)))]
+        if i < 0:
+            i += len(self.types)
+        if not 0 <= i < len(self.types):
+            raise IndexError('node gene index out of range')
+        return NodeView(self, i)
+
+    def __iter__(self):
+        for i in xrange(len(self.types)):
+            yield NodeView(self, i)
+
+    def __setitem__(self, i, gene):
+        """ Copies the gene's bias, response and time constant into the
+            i-th gene, which must be of the same type """
+        assert gene.id == i + 1 and gene.type == self.TYPES[self.types[i]]
+        self.biases[i] = gene.bias
+        self.responses[i] = gene.response
+        if self.time_constants is not None:
+            self.time_constants[i] = gene.time_constant
+
+    def append(self, gene):
+        assert gene.id == len(self.types) + 1, 'Node genes must be added in the order of their ids'
+        self.add(gene.type, gene.bias, gene.response, gene.activation_type,
+                 getattr(gene, 'time_constant', None))
+
+    def add(self, nodetype, bias, response, activation_type, time_constant=None):
+        if activation_type not in self.activation_types:
+            self.activation_types.append(activation_type)
+        self.types.append(self.TYPES.index(nodetype))
+        self.biases.append(bias)
+        self.responses.append(response)
+        self.activations.append(self.activation_types.index(activation_type))
+        if self.time_constants is not None:
+            self.time_constants.append(time_constant)
+
+    def gene(self, i, bias, response, time_constant=None):
+        """ Returns a new node gene object like the i-th one """
+        activation_type = self.activation_types[self.activations[i]]
+        if self.time_constants is None:
+            return self.__gene_type(i + 1, self.TYPES[self.types[i]], bias,
+                                    response, activation_type)
+        return self.__gene_type(i + 1, self.TYPES[self.types[i]], bias,
+                                response, activation_type, time_constant)
+
+    def mutate(self, i):
+        """ Same as NodeGene.mutate for the i-th gene """
+        r = random.random
+        if r() < Config.prob_mutatebias:
+            bias = self.biases[i] + random.gauss(0,1)*Config.bias_mutation_power
+            if bias > Config.max_weight:
+                bias = Config.max_weight
+            elif bias < Config.min_weight:
+                bias = Config.min_weight
+            self.biases[i] = bias
+        if r() < Config.prob_mutatebias:
+            self.responses[i] += random.gauss(0,1)*Config.bias_mutation_power
+
+
+class NodeView(object):
+    """ A node gene stored in a NodeArray """
+    __slots__ = ('__store', '__i')
+
+    def __init__(self, store, i):
+        self.__store = store
+        self.__i = i
+
+    id       = property(lambda self: self.__i + 1)
+    type     = property(lambda self: NodeArray.TYPES[self.__store.types[self.__i]])
+    bias     = property(lambda self: self.__store.biases[self.__i])
+    response = property(lambda self: self.__store.responses[self.__i])
+    activation_type = property(lambda self: self.__store.activation_types[self.__store.activations[self.__i]])
+
+    @property
+    def time_constant(self):
+        if self.__store.time_constants is None:
+            raise AttributeError('time_constant')
+        return self.__store.time_constants[self.__i]
+
+    def mutate(self):
+        self.__store.mutate(self.__i)
+
+    def copy(self):
+        if self.__store.time_constants is None:
+            return self.__store.gene(self.__i, self.bias, self.response)
+        return self.__store.gene(self.__i, self.bias, self.response, self.time_constant)
+
+    def get_child(self, other):
+        """ Creates a new node gene randomly inheriting its attributes from parents """
+        assert(self.id == other.id)
+        bias = random.choice((self.bias, other.bias))
+        response = random.choice((self.response, other.response))
+        if self.__store.time_constants is None:
+            return self.__store.gene(self.__i, bias, response)
+        return self.__store.gene(self.__i, bias, response,
+                                 random.choice((self.time_constant, other.time_constant)))
+
+    def __str__(self):
+        return str(self.copy())
+
+# from this many genes on, compare uses NumPy (if installed) for genomes
+# in typed arrays: converting lists costs more than it saves
+VECTORIZE_GENES = 100
+
+def compare(innovations1, weights1, innovations2, weights2):
+    """ Compares two genomes given as the innovation numbers of their
+        connection genes (sorted) and their weights. Returns the number
+        of matching genes, the disjoint and excess genes of the first
+        genome (those of the second one not matched are disjoint) and
+        the sum of the matching genes' weight differences.
+    """
+    n1, n2 = len(innovations1), len(innovations2)
+    if n2 == 0:
+        return 0, 0, n1, 0.0
+    if np is not None and n1 + n2 >= VECTORIZE_GENES and isinstance(innovations1, array):
+        return compare_vectorized(innovations1, weights1, innovations2, weights2)
+
+    max_innov2 = innovations2[-1]
+    fabs = math.fabs
+    weight_diff = 0.0
+    matching = 0
+    excess = 0
+    # a single merge of both sorted lists
+    j = 0
+    innov2 = innovations2[0]
+    for i in xrange(n1):
+        innov = innovations1[i]
+        if innov > max_innov2:
+            excess = n1 - i
+            break
+        while innov2 < innov:
+            j += 1
+            innov2 = innovations2[j]
+        if innov2 == innov:
+            # Homologous genes
+            weight_diff += fabs(weights1[i] - weights2[j])
+            matching += 1
+    disjoint = n1 - excess - matching + n2 - matching
+    return matching, disjoint, excess, weight_diff
+
+def count_unmatched(innovations1, innovations2):
+    """ Returns the excess genes of the first genome, as compare counts
+        them, and a lower bound of the disjoint genes, from the ranges of
+        the innovation numbers (sorted) only: no gene outside the other
+        genome's range can match. """
+    n1, n2 = len(innovations1), len(innovations2)
+    if n1 == 0 or n2 == 0:
+        return (n1 if n2 == 0 else 0), n2
+    below2 = bisect_right(innovations1, innovations2[-1])
+    excess = n1 - below2
+    matching = min(below2 - bisect_left(innovations1, innovations2[0]),
+                   bisect_right(innovations2, innovations1[-1]) -
+                   bisect_left(innovations2, innovations1[0]))
+    return excess, n1 - excess - matching + n2 - matching
+
+def _vector(sequence, typecode):
+    if isinstance(sequence, array):
+        return np.frombuffer(sequence, dtype=typecode)
+    return np.asarray(sequence, dtype=typecode)
+
+def compare_vectorized(innovations1, weights1, innovations2, weights2):
+    """ Same as compare, with NumPy """
+    n1, n2 = len(innovations1), len(innovations2)
+    if n1 == 0 or n2 == 0:
+        return 0, n2, n1, 0.0
+    innovations1 = _vector(innovations1, 'l')
+    innovations2 = _vector(innovations2, 'l')
+    # where each gene would be in the second genome
+    j = np.minimum(innovations2.searchsorted(innovations1), n2 - 1)
+    match = innovations2[j] == innovations1
+    matching = int(np.count_nonzero(match))
+    excess = n1 - int(innovations1.searchsorted(innovations2[-1], 'right'))
+    diff = np.abs(_vector(weights1, 'd')[match] - _vector(weights2, 'd')[j[match]])
+    # added one by one, in order, as compare does (sum adds pairwise)
+    weight_diff = float(diff.cumsum()[-1]) if matching else 0.0
+    return matching, n1 - excess - matching + n2 - matching, excess, weight_diff
@@ -1,7 +1,7 @@
 from ifnn_cpp import *
 from neat.iznn.network import Network
 
-def create_phenotype(chromosome):
+def create_phenotype(chromosome, event_driven = False):
     """ Receives a chromosome and returns its phenotype (a neural network) """
     
     neurons = {}
@@ -14,7 +14,10 @@ def create_phenotype(chromosome):
         elif ng.type == 'OUTPUT':
             output_neurons.append(neurons[ng.id])
     
-    synapses = [Synapse(neurons[cg.innodeid], neurons[cg.outnodeid], cg.weight) \
-                 for cg in chromosome.conn_genes if cg.enabled] 
-    
+    conns = [cg for cg in chromosome.conn_genes if cg.enabled]
+    synapses = [Synapse(neurons[cg.innodeid], neurons[cg.outnodeid], cg.weight) for cg in conns]
+
+    if event_driven:
+        sources = [neurons[cg.innodeid] for cg in conns]
+        return Network(neurons, input_neurons, output_neurons, synapses, sources)
     return Network(neurons, input_neurons, output_neurons, synapses)
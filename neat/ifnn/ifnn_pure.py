@@ -22,15 +22,17 @@ class Neuron(object):
         self.__has_fired = False
         self.current = self.__bias
     
-    def advance(self):
-        'Advances time in 1 ms.'
-        self.__v += self.__invtau * (self.__vrest - self.__v + self.current)
-        if self.__v >= self.__vt:
-            self.__has_fired = True
-            self.__v = self.__vreset
-        else:
-            self.__has_fired = False
-        self.current = self.__bias
+    def advance(self, ms = 1):
+        '''Advances time in ms milliseconds (1 by default). When advancing
+           several ms at once, has_fired tells whether it fired at any of them.'''
+        fired = False
+        for t in xrange(ms):
+            self.__v += self.__invtau * (self.__vrest - self.__v + self.current)
+            if self.__v >= self.__vt:
+                fired = True
+                self.__v = self.__vreset
+            self.current = self.__bias
+        self.__has_fired = fired
     
     def reset(self):
         'Resets all state variables.'
@@ -42,7 +44,7 @@ class Neuron(object):
     has_fired = property(lambda self: self.__has_fired,
                      doc = 'Indicates whether the neuron has fired')
 
-def create_phenotype(chromosome):
+def create_phenotype(chromosome, event_driven = False):
     """ Receives a chromosome and returns its phenotype (a neural network) """
     
     neurons = {}
@@ -55,7 +57,10 @@ def create_phenotype(chromosome):
         elif ng.type == 'OUTPUT':
             output_neurons.append(neurons[ng.id])
     
-    synapses = [Synapse(neurons[cg.innodeid], neurons[cg.outnodeid], cg.weight) \
-                 for cg in chromosome.conn_genes if cg.enabled] 
-    
+    conns = [cg for cg in chromosome.conn_genes if cg.enabled]
+    synapses = [Synapse(neurons[cg.innodeid], neurons[cg.outnodeid], cg.weight) for cg in conns]
+
+    if event_driven:
+        sources = [neurons[cg.innodeid] for cg in conns]
+        return Network(neurons, input_neurons, output_neurons, synapses, sources)
     return Network(neurons, input_neurons, output_neurons, synapses)
@@ -82,7 +82,7 @@ PyGetSetDef Neuron_getsetters[] = {
      	{0}
 };
 
-PyObject* Neuron_advance(NeuronObject* self) {
+void advance(NeuronObject* self) {
 	self->v += self->invtau * (self->vrest - self->v + self->current);
 	if (self->v >= self->vt) {
 		self->has_fired = true;
@@ -92,6 +92,27 @@ PyObject* Neuron_advance(NeuronObject* self) {
 		self->has_fired = false;
 	}
 	self->current = self->bias;
+}
+
+PyObject* Neuron_advance(NeuronObject* self, PyObject* args) {
+	int ms = 1;
+	if (!PyArg_ParseTuple(args, "|i", &ms)) {
+		return 0;
+	}
+	if (ms == 1) {
+		advance(self);
+	}
+	else {
+		// several ms at once: has_fired tells whether it fired at any of them
+		bool fired = false;
+		Py_BEGIN_ALLOW_THREADS
+		for (int t = 0; t < ms; t++) {
+			advance(self);
+			fired = fired || self->has_fired;
+		}
+		Py_END_ALLOW_THREADS
+		self->has_fired = fired;
+	}
 	return Py_BuildValue("");
 }
 
@@ -103,8 +124,8 @@ PyObject* Neuron_reset(NeuronObject* self) {
 }
 
 PyMethodDef Neuron_methods[] = {
-    {"advance", reinterpret_cast<PyCFunction>(Neuron_advance), METH_NOARGS,
-    	"Advances time in 1 ms."},
+    {"advance", reinterpret_cast<PyCFunction>(Neuron_advance), METH_VARARGS,
+    	"advance(ms=1): advances time in ms milliseconds."},
     {"reset", reinterpret_cast<PyCFunction>(Neuron_reset), METH_NOARGS,
     	"Resets all state variables."},
     {0}
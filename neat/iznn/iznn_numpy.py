@@ -0,0 +1,124 @@
+# -*- coding: UTF-8 -*-
+"""
+ Array-backed spiking networks. The state and the parameters of the
+ Izhikevich neurons are kept in vectors and the synapses in coordinate
+ form (source, destination and weight arrays), so each ms is a few
+ vectorized operations instead of a method call per neuron and synapse.
+
+ In float64 (the default) the operations are carried out in the same
+ order as iznn_pure, giving bit-for-bit the same potentials and spikes
+ as a network of iznn_pure.Neuron and iznn_pure.Synapse objects.
+"""
+try:
+    import numpy as np
+except ImportError:
+    print "NumPy not found! Please install it: http://numpy.scipy.org/"
+    raise
+
+class Network(object):
+    """ A network of Izhikevich neurons (see iznn_pure.Neuron) """
+    def __init__(self, bias, sources, dests, weights, input_neurons, output_neurons,
+                 a = 0.02, b = 0.2, c = -65.0, d = 8.0, dtype = np.float64):
+        n = len(bias)
+        vector = lambda x: np.array(np.broadcast_to(x, (n,)), dtype=dtype)
+        self.__a = vector(a)
+        self.__b = vector(b)
+        self.__c = vector(c)
+        self.__d = vector(d)
+        self.__bias = vector(bias)
+        # synapses in the order they are advanced
+        self.__sources = np.asarray(sources, dtype=int)
+        self.__dests = np.asarray(dests, dtype=int)
+        self.__weights = np.asarray(weights, dtype=dtype)
+        self.__input_neurons = np.asarray(input_neurons, dtype=int)
+        self.__output_neurons = np.asarray(output_neurons, dtype=int)
+        self.reset()
+
+    def __repr__(self):
+        return '%d nodes and %d synapses' % (len(self.__bias), len(self.__weights))
+
+    potentials = property(lambda self: self.__v, doc = 'Membrane potentials')
+    has_fired = property(lambda self: self.__has_fired,
+                         doc = 'Indicates which neurons fired in the last ms')
+
+    def reset(self):
+        "Resets the network's state."
+        self.__v = self.__c.copy()             # membrane potential
+        self.__u = self.__b * self.__v         # membrane recovery variable
+        self.__has_fired = np.zeros(len(self.__bias), dtype=bool)
+        self.__current = self.__bias.copy()
+
+    def __tick(self):
+        """ Advances time in 1 ms (inputs are already in the current) """
+        # synapses from neurons which fired in the previous ms, in order
+        active = np.flatnonzero(self.__has_fired[self.__sources])
+        if len(active):
+            np.add.at(self.__current, self.__dests[active], self.__weights[active])
+
+        v, u, I = self.__v, self.__u, self.__current
+        # v ** 2 would be computed as v * v, which may differ in the
+        # last bit from Python's pow used by iznn_pure
+        v += 0.5 * (0.04 * np.power(v, 2.0) + 5 * v + 140 - u + I)
+        v += 0.5 * (0.04 * np.power(v, 2.0) + 5 * v + 140 - u + I)
+        u += self.__a * (self.__b * v - u)
+        fired = np.greater(v, 30, out=self.__has_fired)
+        if fired.any():
+            v[fired] = self.__c[fired]
+            u[fired] += self.__d[fired]
+        I[:] = self.__bias
+
+    def advance(self, inputs):
+        """ Advances time in 1 ms and tells which output neurons fired,
+            as iznn.Network.advance. """
+        assert len(inputs) == len(self.__input_neurons), "Wrong number of inputs."
+        self.__current[self.__input_neurons] += inputs
+        self.__tick()
+        return self.__has_fired[self.__output_neurons].tolist()
+
+    def advance_many(self, inputs, ms, until_spike = False):
+        """ Advances time in ms milliseconds feeding the same inputs every
+            ms. Returns the spike raster of the output neurons (a boolean
+            array of ms x outputs). If until_spike is true it stops after
+            the first ms in which an output neuron fires, so the raster
+            may be shorter. """
+        assert len(inputs) == len(self.__input_neurons), "Wrong number of inputs."
+        inputs = np.asarray(inputs, dtype=self.__bias.dtype)
+        raster = np.zeros((ms, len(self.__output_neurons)), dtype=bool)
+        for t in xrange(ms):
+            self.__current[self.__input_neurons] += inputs
+            self.__tick()
+            self.__has_fired.take(self.__output_neurons, out=raster[t])
+            if until_spike and raster[t].any():
+                return raster[:t+1]
+        return raster
+
+def first_spike_times(raster):
+    """ Returns the ms of the first spike of each neuron in a raster
+        (see Network.advance_many), or -1 if it never fired. """
+    raster = np.asarray(raster, dtype=bool)
+    return np.where(raster.any(axis=0), raster.argmax(axis=0), -1)
+
+def create_phenotype(chromosome, dtype = np.float64):
+    """ Receives a chromosome and returns its phenotype (an array-backed network) """
+    index = dict((ng.id, i) for i, ng in enumerate(chromosome.node_genes))
+    conns = [cg for cg in chromosome.conn_genes if cg.enabled]
+    return Network([ng.bias for ng in chromosome.node_genes],
+                   [index[cg.innodeid] for cg in conns],
+                   [index[cg.outnodeid] for cg in conns],
+                   [cg.weight for cg in conns],
+                   [index[ng.id] for ng in chromosome.node_genes if ng.type == 'INPUT'],
+                   [index[ng.id] for ng in chromosome.node_genes if ng.type == 'OUTPUT'],
+                   dtype = dtype)
+
+if __name__ == '__main__':
+    # a single neuron, as in iznn_pure
+    import iznn_pure
+    n = iznn_pure.Neuron(10)
+    net = Network([10], [], [], [], [], [0])
+    for i in range(1000):
+        assert net.potentials[0] == n.potential
+        n.advance()
+        net.advance([])
+    print 'Same potentials as iznn_pure'
+    # regular spiking with a constant input
+    print 'First spike at %d ms' % first_spike_times(Network([0], [], [], [], [0], [0]).advance_many([10], 100))[0]
@@ -37,18 +37,20 @@ class Neuron(object):
         self.__bias = bias
         self.current = self.__bias
 
-    def advance(self):
-        'Advances time in 1 ms.'
-        self.__v += 0.5 * (0.04 * self.__v ** 2 + 5 * self.__v + 140 - self.__u + self.current)
-        self.__v += 0.5 * (0.04 * self.__v ** 2 + 5 * self.__v + 140 - self.__u + self.current)
-        self.__u += self.__a * (self.__b * self.__v - self.__u)
-        if self.__v > 30:
-            self.__has_fired = True
-            self.__v = self.__c
-            self.__u += self.__d
-        else:
-            self.__has_fired = False
-        self.current = self.__bias
+    def advance(self, ms = 1):
+        '''Advances time in ms milliseconds (1 by default). When advancing
+           several ms at once, has_fired tells whether it fired at any of them.'''
+        fired = False
+        for t in xrange(ms):
+            self.__v += 0.5 * (0.04 * self.__v ** 2 + 5 * self.__v + 140 - self.__u + self.current)
+            self.__v += 0.5 * (0.04 * self.__v ** 2 + 5 * self.__v + 140 - self.__u + self.current)
+            self.__u += self.__a * (self.__b * self.__v - self.__u)
+            if self.__v > 30:
+                fired = True
+                self.__v = self.__c
+                self.__u += self.__d
+            self.current = self.__bias
+        self.__has_fired = fired
 
     def reset(self):
         'Resets all state variables.'
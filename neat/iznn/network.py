@@ -2,33 +2,66 @@ from iznn_cpp import *
 
 class Network(object):
     """ A neural network has a list of neurons linked by synapses """
-    def __init__(self, neurons=[], input_neurons = [], output_neurons = [], synapses=[]):
+    def __init__(self, neurons=[], input_neurons = [], output_neurons = [], synapses=[], sources=None):
+        """ If the source neuron of each synapse is given, spikes are propagated
+            event-driven: only the synapses of neurons which fired are advanced,
+            so the synaptic work scales with the number of spikes. """
         self.__neurons = neurons
         self.__input_neurons = input_neurons
         self.__output_neurons = output_neurons
         self.__synapses = synapses
+        if sources is not None:
+            assert len(sources) == len(synapses)
+            # outgoing synapses of each neuron, with their position
+            self.__outgoing = dict((id(n), []) for n in neurons.values())
+            for i, (source, s) in enumerate(zip(sources, synapses)):
+                self.__outgoing[id(source)].append((i, s))
+        else:
+            self.__outgoing = None
+        self.__fired = [] # neurons which fired in the last ms
+        self.__spike_count = 0
+        self.__synaptic_events = 0
 
     def __repr__(self):
         return '%d nodes and %d synapses' % (len(self.__neurons), len(self.__synapses))
 
+    event_driven = property(lambda self: self.__outgoing is not None)
+    spike_count = property(lambda self: self.__spike_count, doc = 'Spikes of all neurons')
+    synaptic_events = property(lambda self: self.__synaptic_events, doc = 'Synapses advanced')
+
     def advance(self, inputs):
         assert len(inputs) == len(self.__input_neurons), "Wrong number of inputs."
         for i, input in enumerate(inputs):
             self.__input_neurons[i].current += input
-        for s in self.__synapses:
+        if self.__outgoing is None:
+            synapses = self.__synapses
+        else:
+            # in the same order as all synapses, so every neuron sums
+            # its incoming currents in the same order
+            synapses = [s for i, s in sorted(x for n in self.__fired for x in self.__outgoing[id(n)])]
+        for s in synapses:
             s.advance()
+        self.__synaptic_events += len(synapses)
+        fired = []
         for n in self.__neurons.values():
             n.advance()
+            if n.has_fired:
+                fired.append(n)
+        self.__fired = fired
+        self.__spike_count += len(fired)
         return [n.has_fired for n in self.__output_neurons]
 
     def reset(self):
-        "Resets the network's state."
+        "Resets the network's state and counters."
         for n in self.__neurons.values():
             n.reset()
+        self.__fired = []
+        self.__spike_count = 0
+        self.__synaptic_events = 0
 
     neurons = property(lambda self: self.__neurons.values())
 
-def create_phenotype(chromosome):
+def create_phenotype(chromosome, event_driven = False):
     """ Receives a chromosome and returns its phenotype (a neural network) """
 
     neurons = {}
@@ -41,9 +74,12 @@ def create_phenotype(chromosome):
         elif ng.type == 'OUTPUT':
             output_neurons.append(neurons[ng.id])
 
-    synapses = [Synapse(neurons[cg.innodeid], neurons[cg.outnodeid], cg.weight) \
-                 for cg in chromosome.conn_genes if cg.enabled]
+    conns = [cg for cg in chromosome.conn_genes if cg.enabled]
+    synapses = [Synapse(neurons[cg.innodeid], neurons[cg.outnodeid], cg.weight) for cg in conns]
 
+    if event_driven:
+        sources = [neurons[cg.innodeid] for cg in conns]
+        return Network(neurons, input_neurons, output_neurons, synapses, sources)
     return Network(neurons, input_neurons, output_neurons, synapses)
 
 if __name__ == '__main__':
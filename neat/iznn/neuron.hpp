@@ -83,7 +83,7 @@ PyGetSetDef Neuron_getsetters[] = {
      	{0}
 };
 
-PyObject* Neuron_advance(NeuronObject* self) {
+void advance(NeuronObject* self) {
 	self->v += 0.5 * (0.04 * self->v * self->v + 5 * self->v + 140 - self->u + self->current);
 	self->v += 0.5 * (0.04 * self->v * self->v + 5 * self->v + 140 - self->u + self->current);
 	self->u += self->a * (self->b * self->v - self->u);
@@ -96,6 +96,27 @@ PyObject* Neuron_advance(NeuronObject* self) {
 		self->has_fired = false;
 	}
 	self->current = self->bias;
+}
+
+PyObject* Neuron_advance(NeuronObject* self, PyObject* args) {
+	int ms = 1;
+	if (!PyArg_ParseTuple(args, "|i", &ms)) {
+		return 0;
+	}
+	if (ms == 1) {
+		advance(self);
+	}
+	else {
+		// several ms at once: has_fired tells whether it fired at any of them
+		bool fired = false;
+		Py_BEGIN_ALLOW_THREADS
+		for (int t = 0; t < ms; t++) {
+			advance(self);
+			fired = fired || self->has_fired;
+		}
+		Py_END_ALLOW_THREADS
+		self->has_fired = fired;
+	}
 	return Py_BuildValue("");
 }
 
@@ -108,8 +129,8 @@ PyObject* Neuron_reset(NeuronObject* self) {
 }
 
 PyMethodDef Neuron_methods[] = {
-    {"advance", reinterpret_cast<PyCFunction>(Neuron_advance), METH_NOARGS,
-    	"Advances time in 1 ms."},
+    {"advance", reinterpret_cast<PyCFunction>(Neuron_advance), METH_VARARGS,
+    	"advance(ms=1): advances time in ms milliseconds."},
     {"reset", reinterpret_cast<PyCFunction>(Neuron_reset), METH_NOARGS,
     	"Resets all state variables."},
     {0}
@@ -0,0 +1,161 @@
+"""
+ Activation functions. Each neuron's function is looked up once, when
+ the phenotype is built, so activating a neuron is a single call with
+ no string comparisons:
+
+    from neat.nn import activations
+    activations.default_mode = 'table' # before creating the phenotypes
+    f = activations.get('exp') # f(x, response)
+
+ Available modes:
+
+    'exact' - the same outputs as nn_pure.sigmoid (max_error is 0)
+    'table' - linear interpolation over a precomputed table of the
+              function, trading a bounded error for speed. It only
+              pays off in the C++ extension (nn_cpp turns on
+              ANN::use_fast_sigmoid): in Python the lookup is slower
+              than math.exp, so the Python phenotypes fall back to the
+              exact functions in this mode.
+
+ Every function has a max_error attribute (the maximum absolute
+ difference from the exact function) and, if NumPy is installed, a
+ vectorized attribute working on arrays.
+"""
+import sys
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None # no vectorized variants
+
+# mode used by the phenotypes when none is given
+default_mode = 'exact'
+
+# modes implemented by the C++ extension only
+native_modes = ('table',)
+
+_registry = {}
+
+def register(activation_type, mode, function, max_error, vectorized=None):
+    """ Adds an activation function f(x, response) to the registry """
+    function.max_error = max_error
+    function.vectorized = vectorized
+    _registry[(activation_type, mode)] = function
+
+def get(activation_type, mode=None):
+    """ Returns the activation function f(x, response) of the given type
+        (exp or tanh) in the given mode (default_mode if not given). """
+    if mode is None:
+        mode = default_mode
+    if mode in native_modes and (activation_type, mode) not in _registry:
+        mode = 'exact'
+    try:
+        return _registry[(activation_type, mode)]
+    except KeyError:
+        raise NameError('Invalid activation type selected: %s (%s mode)' % (activation_type, mode))
+
+def is_exact(activation_type, mode=None):
+    """ Whether get returns the exact function (the phenotypes may then
+        compute it in place, see nn_numpy._sigmoid_into) """
+    return get(activation_type, mode) is _registry.get((activation_type, 'exact'))
+
+def modes(activation_type):
+    """ Returns the available modes for the activation type """
+    return sorted(m for t, m in _registry if t == activation_type)
+
+# exact functions: inputs out of [-limit, limit] saturate as in nn_pure
+def exp_sigmoid(x, response):
+    if x < -30.0: return 0.0
+    elif x > 30.0: return 1.0
+    try:
+        return 1.0/(1.0 + math.exp(-x*response))
+    except OverflowError:
+        return 0.0 # nn_pure outputs zero in this case
+
+def tanh_sigmoid(x, response):
+    if x < -20.0: return -1.0
+    elif x > 20.0: return 1.0
+    return math.tanh(x*response)
+
+class Table(object):
+    """ Samples f over [lower, upper] every step. Between samples f is
+        linearly interpolated, with an error below step**2/8*max|f''|;
+        outside the interval it saturates to f's limits.
+    """
+    def __init__(self, f, lower, upper, step, max_d2, low, high):
+        self.lower = lower
+        self.upper = upper
+        self.scale = 1.0/step
+        self.size = int(round((upper - lower)*self.scale))
+        self.values = [f(lower + i*step) for i in xrange(self.size + 1)]
+        self.low = low   # limit of f as x -> -inf
+        self.high = high # limit of f as x -> +inf
+        # interpolation plus saturation errors
+        self.max_error = step*step/8.0*max_d2 + max(abs(f(lower) - low), abs(f(upper) - high))
+
+    def function(self, limit):
+        """ Returns f(x, response) for the table, saturating when x
+            is out of [-limit, limit] (see nn_pure.sigmoid) """
+        def interpolated(x, response, values=self.values, lower=self.lower,
+                         scale=self.scale, size=self.size, low=self.low, high=self.high):
+            if x < -limit: return low
+            elif x > limit: return high
+            t = (x*response - lower)*scale
+            if t <= 0.0: return low
+            elif t >= size: return high
+            i = int(t)
+            v = values[i]
+            return v + (values[i+1] - v)*(t - i)
+        return interpolated
+
+# the tables of ANN::use_fast_sigmoid (their functions are only used to
+# measure its error, see below)
+# sigmoid: max|f''| = 1/(6*sqrt(3)) ~ 0.0962; tanh: max|f''| = 4/(3*sqrt(3)) ~ 0.7698
+exp_table = Table(lambda z: 1.0/(1.0 + math.exp(-z)), -20.0, 20.0, 1.0/64, 1/(6*math.sqrt(3)), 0.0, 1.0)
+tanh_table = Table(math.tanh, -10.0, 10.0, 1.0/128, 4/(3*math.sqrt(3)), -1.0, 1.0)
+
+if np is not None:
+    # largest argument of exp which doesn't overflow
+    _max_exp = math.log(sys.float_info.max)
+
+    def exp_sigmoid_vectorized(x, response):
+        # the overflow is bounded by hand: np.errstate costs more than
+        # the sigmoid itself on small arrays
+        z = np.clip(x, -30.0, 30.0)*-response
+        overflow = z > _max_exp
+        np.minimum(z, _max_exp, out=z)
+        output = 1.0/(1.0 + np.exp(z))
+        output[overflow] = 0.0 # nn_pure outputs zero in this case
+        output[x < -30] = 0.0
+        output[x > 30] = 1.0
+        return output
+
+    def tanh_sigmoid_vectorized(x, response):
+        output = np.tanh(np.clip(x, -20.0, 20.0)*response)
+        output[x < -20] = -1.0
+        output[x > 20] = 1.0
+        return output
+
+    register('exp', 'exact', exp_sigmoid, 0.0, exp_sigmoid_vectorized)
+    register('tanh', 'exact', tanh_sigmoid, 0.0, tanh_sigmoid_vectorized)
+else:
+    register('exp', 'exact', exp_sigmoid, 0.0)
+    register('tanh', 'exact', tanh_sigmoid, 0.0)
+
+if __name__ == "__main__":
+    # measures the error of each mode against the exact functions
+    import random, timeit
+    tables = {'exp': exp_table.function(30.0), 'tanh': tanh_table.function(20.0)}
+    tables['exp'].max_error = exp_table.max_error
+    tables['tanh'].max_error = tanh_table.max_error
+    for activation_type in ('exp', 'tanh'):
+        exact = get(activation_type, 'exact')
+        functions = [(m, get(activation_type, m)) for m in modes(activation_type)]
+        functions.append(('table', tables[activation_type])) # as in the C++ extension
+        for m, f in functions:
+            error = max(abs(f(x, r) - exact(x, r)) for x, r in
+                        ((random.uniform(-35, 35), random.uniform(0.1, 5)) for i in xrange(100000)))
+            time = timeit.Timer(lambda: f(0.3, 4.924273)).timeit(100000)
+            print '%4s %5s: max error %.2e (measured %.2e), %.3f us per call' \
+                    % (activation_type, m, f.max_error, error, time*10)
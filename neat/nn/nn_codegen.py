@@ -0,0 +1,160 @@
+"""
+ Code generation backend. Each genome is translated into straight-line
+ Python source (one local variable per neuron and the weights inlined
+ as constants), which is compiled once into a function. For the small
+ topologies evolved by NEAT this avoids all the attribute lookups and
+ method calls of nn_pure, while giving exactly the same outputs.
+"""
+import math
+
+class CompiledNetwork(object):
+    """ A network whose activation method was generated from a chromosome """
+    def __init__(self, source, name, num_inputs, num_neurons, num_synapses, state_size):
+        self._num_inputs = num_inputs
+        self.__source = source
+        self.__num_neurons = num_neurons
+        self.__num_synapses = num_synapses
+        # neurons' outputs kept between activations
+        self.__state = [0.0]*state_size
+
+        namespace = {'exp': math.exp, 'tanh': math.tanh, 'state': self.__state}
+        exec compile(source, '<neat phenotype>', 'exec') in namespace
+        setattr(self, name, namespace[name])
+
+    source = property(lambda self: self.__source, doc = 'Generated source code')
+
+    def flush(self):
+        self.__state[:] = [0.0]*len(self.__state)
+
+    def __repr__(self):
+        return '%d nodes and %d synapses' % (self.__num_neurons, self.__num_synapses)
+
+def _sigmoid(var, x, response, activation_type):
+    """ Returns the lines computing nn_pure.sigmoid(x, response, activation_type) """
+    if activation_type == 'exp':
+        lines = ['if %s < -30: %s = 0.0' % (x, var),
+                 'elif %s > 30: %s = 1.0' % (x, var)]
+        if abs(response)*30 < 700:
+            lines.append('else: %s = 1.0/(1.0 + exp(-%s*%r))' % (var, x, response))
+        else:
+            # exp may overflow: nn_pure outputs zero in this case
+            lines.extend(['else:',
+                          '    try: %s = 1.0/(1.0 + exp(-%s*%r))' % (var, x, response),
+                          '    except OverflowError: %s = 0.0' % var])
+    elif activation_type == 'tanh':
+        lines = ['if %s < -20: %s = -1.0' % (x, var),
+                 'elif %s > 20: %s = 1.0' % (x, var),
+                 'else: %s = tanh(%s*%r)' % (var, x, response)]
+    else:
+        raise NameError('Invalid activation type selected: %s' % activation_type)
+    return lines
+
+def _soma(links, bias, variable):
+    """ Sums the incoming signals in the same order as nn_pure.Neuron """
+    terms = ['0.0'] + ['%r*%s' % (w, variable(i)) for i, w in links]
+    return ' + '.join(terms) + ' + %r' % bias
+
+def _incoming(chromo):
+    """ Incoming links of each node, in the chromosome's connection order """
+    links = dict((ng.id, []) for ng in chromo.node_genes)
+    num_synapses = 0
+    for cg in chromo.conn_genes:
+        if cg.enabled:
+            links[cg.outnodeid].append((cg.innodeid, cg.weight))
+            num_synapses += 1
+    return links, num_synapses
+
+def _unpack(names, value):
+    if not names:
+        return []
+    return ['%s, = %s' % (', '.join(names), value)]
+
+def create_phenotype(chromo):
+    """ Receives a chromosome and returns its phenotype with a generated
+        parallel activation method (pactivate). """
+    num_inputs = chromo.sensors
+    neurons = chromo.node_genes[num_inputs:]
+    links, num_synapses = _incoming(chromo)
+
+    old = lambda id: 's%d' % id
+    lines = ['def pactivate(inputs, state=state, exp=exp, tanh=tanh):',
+             '    assert len(inputs) == %d, "Wrong number of inputs."' % num_inputs]
+    body = _unpack([old(ng.id) for ng in chromo.node_genes[:num_inputs]], 'inputs')
+    body += _unpack([old(ng.id) for ng in neurons], 'state')
+    # every neuron is updated from the previous step's outputs
+    for ng in neurons:
+        body.append('x = ' + _soma(links[ng.id], ng.bias, old))
+        body.extend(_sigmoid('n%d' % ng.id, 'x', ng.response, ng.activation_type))
+    body.append('state[:] = [%s]' % ', '.join('n%d' % ng.id for ng in neurons))
+    body.append('return [%s]' % ', '.join('n%d' % ng.id for ng in neurons if ng.type == 'OUTPUT'))
+    lines.extend('    ' + line for line in body)
+
+    return CompiledNetwork('\n'.join(lines) + '\n', 'pactivate', num_inputs,
+                           len(chromo.node_genes), num_synapses, len(neurons))
+
+def create_ffphenotype(chromo):
+    """ Receives a chromosome and returns its phenotype with a generated
+        serial activation method (sactivate). """
+    num_inputs = chromo.sensors
+    node_genes = chromo.node_genes
+    inputs = [ng for ng in node_genes[:num_inputs] if ng.type == 'INPUT']
+    neurons = [node_genes[id-1] for id in chromo.node_order]
+    neurons.extend(ng for ng in node_genes if ng.type == 'OUTPUT')
+    assert(len(inputs) + len(neurons) == len(node_genes))
+    links, num_synapses = _incoming(chromo)
+
+    # links to neurons activated later (or to itself) read the
+    # output of the previous activation, so it must be kept
+    position = dict((ng.id, i) for i, ng in enumerate(inputs + neurons))
+    recurrent = any(position[i] >= position[ng.id] for ng in neurons for i, w in links[ng.id])
+
+    var = lambda id: 's%d' % id
+    lines = ['def sactivate(inputs, state=state, exp=exp, tanh=tanh):',
+             '    assert len(inputs) == %d, "Wrong number of inputs."' % num_inputs]
+    body = _unpack([var(ng.id) for ng in inputs], 'inputs')
+    if recurrent:
+        body += _unpack([var(ng.id) for ng in neurons], 'state')
+    # neurons are updated one at a time in their order of activation
+    for ng in neurons:
+        body.append('x = ' + _soma(links[ng.id], ng.bias, var))
+        body.extend(_sigmoid(var(ng.id), 'x', ng.response, ng.activation_type))
+    if recurrent:
+        body.append('state[:] = [%s]' % ', '.join(var(ng.id) for ng in neurons))
+    body.append('return [%s]' % ', '.join(var(ng.id) for ng in neurons if ng.type == 'OUTPUT'))
+    lines.extend('    ' + line for line in body)
+
+    return CompiledNetwork('\n'.join(lines) + '\n', 'sactivate', num_inputs,
+                           len(node_genes), num_synapses, len(neurons) if recurrent else 0)
+
+if __name__ == "__main__":
+    # Example: checks the generated networks against nn_pure
+    import random
+    from neat.config import Config
+    from neat import chromosome, genome
+    from neat.nn import nn_pure
+
+    Config.input_nodes = 2
+    Config.output_nodes = 1
+    Config.nn_activation = 'exp'
+    Config.weight_stdev = 0.9
+
+    chromosome.node_gene_type = genome.NodeGene
+    c = chromosome.FFChromosome.create_fully_connected()
+    c.add_hidden_nodes(2)
+
+    net = create_ffphenotype(c)
+    print net.source
+    pure = nn_pure.create_ffphenotype(c)
+    for inputs in [[0, 0], [0, 1], [1, 0], [1, 1]]:
+        assert net.sactivate(inputs) == pure.sactivate(inputs)
+
+    c = chromosome.Chromosome.create_fully_connected()
+    c.add_hidden_nodes(2)
+
+    net = create_phenotype(c)
+    print net.source
+    pure = nn_pure.create_phenotype(c)
+    for t in range(100):
+        inputs = [random.random(), random.random()]
+        assert net.pactivate(inputs) == pure.pactivate(inputs)
+    print 'Same outputs as nn_pure'
@@ -4,6 +4,8 @@ except ImportError:
     print "Neural network extension library not found!"
     raise
 
+import activations
+
 def create_ffphenotype(chromo):
     """ Receives a chromosome and returns its phenotype (a neural network) """
 
@@ -14,6 +16,8 @@ def create_ffphenotype(chromo):
 
     if chromo.node_genes[-1].activation_type == 'tanh':
         network.set_logistic(0)
+    if activations.default_mode == 'table':
+        network.use_fast_sigmoid(1)
 
     # creates a dict mapping node_order + output node to [0, 1, 3, ... , n]
     value = 0
@@ -54,6 +58,8 @@ def create_phenotype(chromo):
 
     if chromo.node_genes[-1].activation_type == 'tanh':
         network.set_logistic(0)
+    if activations.default_mode == 'table':
+        network.use_fast_sigmoid(1)
 
     # create neurons
     neuron_type = None
@@ -1,27 +1,55 @@
 // ******************************************************************//
-// A class to handle general neural networks in matrix form.         //
+// A class to handle general neural networks in sparse matrix form.  //
 // ------------------------------------------------------------------//
 // To compile:
 // g++ -I /usr/include/python2.5/ -c ANN.cpp
 // g++ -lpython2.5 ANN.o -o ann.out
 
 #include <iostream>
+#include <cstring>
 #include "ANN.h"
 
+// Lookup tables of the activation functions (of x*response). They are
+// sampled exactly as the 'table' mode in neat/nn/activations.py, so
+// both give the same outputs and the same maximum error.
+namespace {
+    const double EXP_LOWER = -20.0, EXP_STEP = 1.0/64;
+    const int EXP_SIZE = 2560;
+    const double TANH_LOWER = -10.0, TANH_STEP = 1.0/128;
+    const int TANH_SIZE = 2560;
+
+    double exp_table[EXP_SIZE + 1];
+    double tanh_table[TANH_SIZE + 1];
+    bool tables_ready = false;
+
+    void build_tables() {
+        for(int i=0; i<=EXP_SIZE; i++)
+            exp_table[i] = 1.0/(1.0 + exp(-(EXP_LOWER + i*EXP_STEP)));
+        for(int i=0; i<=TANH_SIZE; i++)
+            tanh_table[i] = tanh(TANH_LOWER + i*TANH_STEP);
+        tables_ready = true;
+    }
+
+    inline double interpolate(const double* table, int size, double lower, double step,
+                              double z, double low, double high) {
+        double t = (z - lower)*(1.0/step);
+        if (t <= 0.0)
+            return low;
+        else if (t >= size)
+            return high;
+        int i = int(t);
+        return table[i] + (table[i+1] - table[i])*(t - i);
+    }
+}
+
 ANN::ANN(int inputs, int neurons) {
 
     sensors = inputs;
     size = neurons;
     logistic = true;
+    fast_sigmoid = false;
 
-    sensory_weights = new double*[sensors];
-    weights = new double*[size];
-
-    for(int i=0; i<sensors; i++)
-        sensory_weights[i] = new double[size];
-
-    for(int i=0; i<size; i++)
-        weights[i] = new double[size];
+    compiled = false;
 
     states   = new double[size];
     outputs  = new double[size];
@@ -30,6 +58,8 @@ ANN::ANN(int inputs, int neurons) {
 
     neuron_type = new int[size];
 
+    input_buffer = new double[sensors];
+
     // set everything to zero
     for(int i=0; i<size; i++) {
         states[i]   = 0.0;
@@ -39,37 +69,18 @@ ANN::ANN(int inputs, int neurons) {
         neuron_type[i] = 0;
     }
 
-    for(int i=0; i<sensors; i++) {
-        for(int j=0; j<size; j++) {
-            sensory_weights[i][j] = 0.0;
-        }
-    }
-
-    for(int i=0; i<size; i++) {
-        for(int j=0; j<size; j++) {
-            weights[i][j] = 0.0;
-        }
-    }
-
 }
 
 ANN::~ANN()
 {
-    for(int i=0; i<sensors; i++)
-        delete[] sensory_weights[i];
-    
-    for(int i=0; i<size; i++)
-        delete[] weights[i];
-    
-    delete[] sensory_weights;
-    delete[] weights;
-    
     delete[] states;
     delete[] outputs;
     delete[] biases;
     delete[] response;
     
     delete[] neuron_type;
+
+    delete[] input_buffer;
 }
 
 // flushes all neuron's output
@@ -79,119 +90,405 @@ void ANN::flush() {
     }
 }
 
-// serial activation method (for feedforward topologies)
-PyObject* ANN::sactivate(PyObject* inputs)
+// reads a sequence of numbers into a buffer of size 'sensors'
+bool ANN::read_inputs(PyObject* inputs, double* buffer)
 {
-    if (PyList_Size(inputs) != sensors) {
+    PyObject* seq = PySequence_Fast(inputs, "Inputs must be a sequence.");
+    if (!seq) return false;
+
+    if (PySequence_Fast_GET_SIZE(seq) != sensors) {
         PyErr_SetString(PyExc_ValueError, "Wrong number of inputs.");
-        return 0;
+        Py_DECREF(seq);
+        return false;
     }
 
+    for (int j = 0; j < sensors; j++) {
+        buffer[j] = PyFloat_AsDouble(PySequence_Fast_GET_ITEM(seq, j));
+        if (PyErr_Occurred()) {
+            Py_DECREF(seq);
+            return false;
+        }
+    }
+    Py_DECREF(seq);
+    return true;
+}
+
+// returns a list with the outputs of all output neurons
+PyObject* ANN::output_list()
+{
     PyObject* output = PyList_New(0);
     if (!output) return 0;
 
-    double neuron_input, inputjd;
-    PyObject* inputj;
-
-    // Update the state of all neurons.
     for (int i = 0; i < size; i++) {
-        neuron_input = 0.0;
-
-        // inputs from the outside (sensors)
-        for (int j = 0; j < sensors; j++) {
-            inputj = PyList_GetItem(inputs, j);
-
-            if (!inputj) {
+        if(neuron_type[i] == 1) {
+            PyObject* newoutput = PyFloat_FromDouble(outputs[i]);
+            if (!newoutput || PyList_Append(output, newoutput) != 0) {
+                Py_XDECREF(newoutput);
                 Py_DECREF(output);
                 return 0;
             }
+            Py_DECREF(newoutput);
+        }
+    }
+    return output;
+}
 
-            inputjd = PyFloat_AsDouble(inputj);
+// builds the compressed sparse rows from the connections: the maps
+// are sorted by (to, from), so each row is sorted by source
+static void compress(const std::map<std::pair<int, int>, double>& links, int rows,
+                     std::vector<int>& start, std::vector<int>& source,
+                     std::vector<double>& weight)
+{
+    start.assign(rows + 1, 0);
+    source.clear();
+    weight.clear();
+    for (std::map<std::pair<int, int>, double>::const_iterator it = links.begin();
+         it != links.end(); ++it) {
+        start[it->first.first + 1]++;
+        source.push_back(it->first.second);
+        weight.push_back(it->second);
+    }
+    for (int i = 0; i < rows; i++)
+        start[i + 1] += start[i];
+}
 
-            // pode dar problemas ao rodar a main()
-            //if (PyErr_Occurred()) {
-            //    Py_DECREF(output);
-            //    return 0;
-            //}
+void ANN::compile()
+{
+    compress(sensory_synapses, size, sensory_start, sensory_source, sensory_weight);
+    compress(synapses, size, synapse_start, synapse_source, synapse_weight);
+    compiled = true;
+}
 
-            neuron_input += sensory_weights[j][i] * inputjd;
-        }
-        // signal coming from other neurons
-        for (int j = 0; j < size; j++)
-            neuron_input += weights[j][i] * outputs[j];
+// total input of neuron i: sensors first and then other neurons, in
+// order of their indexes (the same sum as with dense matrices)
+inline double ANN::incoming(int i, const double* inputs)
+{
+    double neuron_input = 0.0;
+
+    // inputs from the outside (sensors)
+    for (int k = sensory_start[i]; k < sensory_start[i + 1]; k++)
+        neuron_input += sensory_weight[k] * inputs[sensory_source[k]];
+
+    // signal coming from other neurons
+    for (int k = synapse_start[i]; k < synapse_start[i + 1]; k++)
+        neuron_input += synapse_weight[k] * outputs[synapse_source[k]];
+
+    return neuron_input;
+}
+
+// updates all neurons one at a time (serial activation)
+void ANN::serial_update(const double* inputs)
+{
+    if (!compiled) compile();
+
+    // Update the state of all neurons.
+    for (int i = 0; i < size; i++) {
+        states[i]  = incoming(i, inputs);
+        outputs[i] = sigmoid(states[i] + biases[i], response[i]);
+    }
+}
 
-        states[i]  = neuron_input;
+// updates all neurons at once (parallel activation)
+void ANN::parallel_update(const double* inputs)
+{
+    if (!compiled) compile();
+
+    // Update the state of all neurons.
+    for (int i = 0; i < size; i++)
+        states[i] = incoming(i, inputs);
 
+    for (int i = 0; i < size; i++)
         outputs[i] = sigmoid(states[i] + biases[i], response[i]);
+}
 
-        if(neuron_type[i] == 1) {
-            PyObject* newoutput = PyFloat_FromDouble(outputs[i]);
-            if (PyList_Append(output, newoutput) != 0) {
-                Py_DECREF(output);
-                return 0;
+// exports a contiguous block of doubles from a Python object: returns
+// 1 on success, 0 if the object has no buffer and -1 on errors
+int DoubleBuffer::get(PyObject* obj, bool writable)
+{
+    if (PyObject_CheckBuffer(obj)) {
+        int flags = PyBUF_C_CONTIGUOUS | PyBUF_FORMAT;
+        if (writable) flags |= PyBUF_WRITABLE;
+        if (PyObject_GetBuffer(obj, &view, flags) != 0)
+            return -1;
+        has_view = true;
+        const char* format = view.format;
+        if (format && (*format == '@' || *format == '='))
+            format++;
+        if (view.itemsize != sizeof(double) || !format || strcmp(format, "d") != 0) {
+            PyErr_SetString(PyExc_TypeError, "Buffer must contain doubles.");
+            return -1;
+        }
+        data = static_cast<double*>(view.buf);
+        length = view.len/sizeof(double);
+        return 1;
+    }
+#if PY_MAJOR_VERSION < 3
+    // old buffer protocol (e.g. array.array in Python 2)
+    PyBufferProcs* procs = obj->ob_type->tp_as_buffer;
+    if (procs && procs->bf_getreadbuffer && !PyString_Check(obj) && !PyUnicode_Check(obj)) {
+        // without type information, only arrays of doubles are accepted
+        static PyObject* typecode_name = PyString_InternFromString("typecode");
+        PyObject* typecode = PyObject_GetAttr(obj, typecode_name);
+        if (!typecode) {
+            PyErr_Clear();
+        } else {
+            bool doubles = PyString_Check(typecode) && strcmp(PyString_AS_STRING(typecode), "d") == 0;
+            Py_DECREF(typecode);
+            if (!doubles) {
+                PyErr_SetString(PyExc_TypeError, "Buffer must contain doubles.");
+                return -1;
             }
-            Py_DECREF(newoutput);
         }
+        void* buffer;
+        Py_ssize_t bytes;
+        int error = writable ? PyObject_AsWriteBuffer(obj, &buffer, &bytes)
+                             : PyObject_AsReadBuffer(obj, const_cast<const void**>(&buffer), &bytes);
+        if (error)
+            return -1;
+        if (bytes % sizeof(double)) {
+            PyErr_SetString(PyExc_TypeError, "Buffer must contain doubles.");
+            return -1;
+        }
+        data = static_cast<double*>(buffer);
+        length = bytes/sizeof(double);
+        return 1;
     }
-    return output;
+#endif
+    return 0;
 }
 
-// parallel activation method (for recurrent neural networks)
-PyObject*  ANN::pactivate(PyObject* inputs) {
+DoubleBuffer::~DoubleBuffer()
+{
+    if (has_view)
+        PyBuffer_Release(&view);
+}
+
+// number of output neurons
+int ANN::num_outputs()
+{
+    int n = 0;
+    for (int i = 0; i < size; i++)
+        if (neuron_type[i] == 1) n++;
+    return n;
+}
 
-    if (PyList_Size(inputs) != sensors) {
+// copies the outputs of all output neurons into a buffer
+void ANN::write_outputs(double* buffer)
+{
+    for (int i = 0; i < size; i++)
+        if (neuron_type[i] == 1)
+            *buffer++ = outputs[i];
+}
+
+// returns the inputs from a locked buffer (without copying them) or
+// from a sequence or an old-style buffer (copied into input_buffer), or
+// 0 with an exception set
+const double* ANN::get_inputs(PyObject* inputs, DoubleBuffer& buffer)
+{
+    int found = buffer.get(inputs, false);
+    if (found < 0) return 0;
+    if (found == 0)
+        return read_inputs(inputs, input_buffer) ? input_buffer : 0;
+    if (buffer.length != sensors) {
         PyErr_SetString(PyExc_ValueError, "Wrong number of inputs.");
         return 0;
     }
+    if (!buffer.locked()) {
+        // it could be resized by another thread while activate runs
+        memcpy(input_buffer, buffer.data, sensors*sizeof(double));
+        return input_buffer;
+    }
+    return buffer.data;
+}
 
-    PyObject* output = PyList_New(0);
-    if (!output) return 0;
+// gets a writable buffer of n doubles for the outputs
+bool ANN::get_outputs(PyObject* out, DoubleBuffer& buffer, Py_ssize_t n)
+{
+    int found = buffer.get(out, true);
+    if (found == 0)
+        PyErr_SetString(PyExc_TypeError, "Outputs must be a writable buffer of doubles.");
+    if (found <= 0)
+        return false;
+    if (buffer.length != n) {
+        PyErr_SetString(PyExc_ValueError, "Wrong size of the output buffer.");
+        return false;
+    }
+    return true;
+}
 
-    double neuron_input, inputjd;
-    PyObject* inputj;
+// returns the outputs as a new list, or writes them into out (if given)
+PyObject* ANN::return_outputs(PyObject* out)
+{
+    if (!out || out == Py_None)
+        return output_list();
 
-    // Update the state of all neurons.
-    for (int i = 0; i < size; i++) {
-        neuron_input = 0.0;
+    DoubleBuffer buffer;
+    if (!get_outputs(out, buffer, num_outputs()))
+        return 0;
+    write_outputs(buffer.data);
+    Py_INCREF(out);
+    return out;
+}
 
-        // inputs from the outside (sensors)
-        for (int j = 0; j < sensors; j++) {
-            inputj = PyList_GetItem(inputs, j);
-            if (!inputj) {
-                Py_DECREF(output);
-                return 0;
-            }
+// networks with fewer links are updated holding the GIL:
+// releasing it would cost more than the update itself
+const size_t GIL_RELEASE_LINKS = 256;
+
+// updates the network, letting other Python threads run meanwhile
+// if it is large enough (an ANN must not be shared between threads)
+void ANN::activate(const double* inputs, bool serial)
+{
+    if (!compiled) compile();
+    if (sensory_weight.size() + synapse_weight.size() < GIL_RELEASE_LINKS) {
+        if (serial) serial_update(inputs);
+        else parallel_update(inputs);
+    }
+    else {
+        Py_BEGIN_ALLOW_THREADS
+        if (serial) serial_update(inputs);
+        else parallel_update(inputs);
+        Py_END_ALLOW_THREADS
+    }
+}
 
-            inputjd = PyFloat_AsDouble(inputj);
+// serial activation method (for feedforward topologies)
+PyObject* ANN::sactivate(PyObject* inputs, PyObject* out)
+{
+    DoubleBuffer buffer;
+    const double* x = get_inputs(inputs, buffer);
+    if (!x) return 0;
+    activate(x, true);
+    return return_outputs(out);
+}
+
+// parallel activation method (for recurrent neural networks)
+PyObject*  ANN::pactivate(PyObject* inputs, PyObject* out) {
 
-            // pode dar problemas ao rodar a main()
-            //if (PyErr_Occurred()) {
-            //    Py_DECREF(output);
-            //    return 0;
-           // }
+    DoubleBuffer buffer;
+    const double* x = get_inputs(inputs, buffer);
+    if (!x) return 0;
+    activate(x, false);
+    return return_outputs(out);
+}
+
+// serial activation of a batch of inputs: each row is activated from a
+// flushed network and the network is left flushed afterwards. The rows
+// are a sequence of sequences or a (N, inputs) buffer of doubles; the
+// outputs are returned as a list of lists or written into a (N, outputs)
+// buffer
+PyObject* ANN::sactivate_batch(PyObject* rows, PyObject* out)
+{
+    return activate_rows(rows, out, -1, false);
+}
 
-            neuron_input += sensory_weights[j][i] * inputjd;
+// parallel activation for several ticks from the current state: the
+// inputs of tick t are the t-th row, the last row being held when there
+// are more steps than rows (steps defaults to the number of rows). The
+// rows and the outputs (steps, outputs) are as in sactivate_batch
+PyObject* ANN::rollout(PyObject* rows, int steps, PyObject* out)
+{
+    return activate_rows(rows, out, steps, true);
+}
+
+// one output row for each input row: independent rows from a flushed
+// network (batch) or consecutive ticks (rollout)
+PyObject* ANN::activate_rows(PyObject* rows, PyObject* out, Py_ssize_t steps, bool rollout)
+{
+    DoubleBuffer in;
+    int found = in.get(rows, false);
+    if (found < 0) return 0;
+
+    PyObject* seq = 0;
+    Py_ssize_t n;
+    if (found) {
+        if (sensors == 0 || in.length % sensors) {
+            PyErr_SetString(PyExc_ValueError, "Wrong number of inputs.");
+            return 0;
         }
+        n = in.length/sensors;
+    } else {
+        seq = PySequence_Fast(rows, "Inputs must be a sequence of rows.");
+        if (!seq) return 0;
+        n = PySequence_Fast_GET_SIZE(seq);
+    }
+    if (steps < 0)
+        steps = n;
+    else if (steps > 0 && n == 0) {
+        PyErr_SetString(PyExc_ValueError, "No inputs to hold.");
+        Py_XDECREF(seq);
+        return 0;
+    }
 
-        // signal coming from other neurons
-        for (int j = 0; j < size; j++)
-            neuron_input += weights[j][i] * outputs[j];
+    PyObject* output;
+    DoubleBuffer buffer;
+    int outputs_per_row = num_outputs();
+    if (out && out != Py_None) {
+        if (!get_outputs(out, buffer, steps*outputs_per_row)) {
+            Py_XDECREF(seq);
+            return 0;
+        }
+        output = out;
+        Py_INCREF(output);
+    } else {
+        output = PyList_New(steps);
+        if (!output) {
+            Py_XDECREF(seq);
+            return 0;
+        }
+    }
 
-        states[i] = neuron_input;
+    if (!seq && buffer.data) {
+        // from buffer to buffer: no Python objects are involved, so the
+        // GIL is released unless a buffer is old-style (not locked)
+        if (!compiled) compile();
+        PyThreadState* saved = 0;
+        if (in.locked() && buffer.locked())
+            saved = PyEval_SaveThread();
+        for (Py_ssize_t r = 0; r < steps; r++) {
+            const double* x = in.data + (r < n ? r : n - 1)*sensors;
+            if (rollout) {
+                parallel_update(x);
+            } else {
+                flush();
+                serial_update(x);
+            }
+            write_outputs(buffer.data + r*outputs_per_row);
+        }
+        if (!rollout) flush();
+        if (saved) PyEval_RestoreThread(saved);
+        return output;
     }
 
-    for (int i = 0; i < size; i++) {
-        outputs[i] = sigmoid(states[i] + biases[i], response[i]);
-        if(neuron_type[i] == 1) {
-            PyObject* newoutput = PyFloat_FromDouble(outputs[i]);
-            if (PyList_Append(output, newoutput) != 0) {
+    for (Py_ssize_t r = 0; r < steps; r++) {
+        const double* x = in.data + (r < n ? r : n - 1)*sensors;
+        if (seq && r < n) {
+            if (!read_inputs(PySequence_Fast_GET_ITEM(seq, r), input_buffer)) {
                 Py_DECREF(output);
+                Py_DECREF(seq);
+                if (!rollout) flush();
                 return 0;
             }
-            Py_DECREF(newoutput);
+        }
+        if (seq)
+            x = input_buffer; // holds the last row read
+        if (!rollout) flush();
+        activate(x, !rollout);
+        if (buffer.data) {
+            write_outputs(buffer.data + r*outputs_per_row);
+        } else {
+            PyObject* row_output = output_list();
+            if (!row_output) {
+                Py_DECREF(output);
+                Py_XDECREF(seq);
+                if (!rollout) flush();
+                return 0;
+            }
+            PyList_SET_ITEM(output, r, row_output);
         }
     }
-   return output;
+    if (!rollout) flush();
+    Py_XDECREF(seq);
+    return output;
 }
 
 // The sigmoid function
@@ -201,6 +498,8 @@ inline double ANN::sigmoid(double x, double response) {
             return 0.0;
         else if (x > 30.0)
             return 1.0;
+        else if (fast_sigmoid)
+            return interpolate(exp_table, EXP_SIZE, EXP_LOWER, EXP_STEP, x*response, 0.0, 1.0);
         else
             return 1.0/(1.0 + exp(-x*response));
     }
@@ -209,11 +508,19 @@ inline double ANN::sigmoid(double x, double response) {
             return -1.0;
         else if (x > 20.0)
             return 1.0;
+        else if (fast_sigmoid)
+            return interpolate(tanh_table, TANH_SIZE, TANH_LOWER, TANH_STEP, x*response, -1.0, 1.0);
         else
             return tanh(x*response);
     }
 }
 
+void ANN::use_fast_sigmoid(bool b) {
+    if (b && !tables_ready)
+        build_tables();
+    fast_sigmoid = b;
+}
+
 // to compile manually:
 // g++ -I /usr/include/python2.5/ -lpython2.5 ANN.cpp
 int main() {
@@ -1,5 +1,5 @@
 // ******************************************************************//
-// A class to handle general neural networks in matrix form.         //
+// A class to handle general neural networks in sparse matrix form.  //
 // ------------------------------------------------------------------//
 // To compile:
 // g++ -I /usr/include/python2.5/ -c ANN.cpp
@@ -9,6 +9,28 @@
 #define _ANN_H_
 
 #include <Python.h>
+#include <map>
+#include <vector>
+
+// a block of doubles exported by a Python object through the buffer
+// protocol (NumPy arrays, array.array('d'), ...), released on destruction
+class DoubleBuffer {
+    public:
+        DoubleBuffer() : data(0), length(0), has_view(false) {}
+        ~DoubleBuffer();
+        int get(PyObject* obj, bool writable);
+        // whether the exporter keeps the block in place until it is
+        // released: old-style buffers (array.array in Python 2) don't,
+        // so they must not be used without holding the GIL
+        bool locked() const { return has_view; }
+
+        double* data;
+        Py_ssize_t length; // number of doubles
+
+    private:
+        Py_buffer view;
+        bool has_view;
+};
 
 class ANN {
     public:
@@ -16,9 +38,14 @@ class ANN {
         ~ANN();
 
         void set_synapse(int from, int to, double value) {
-            weights[from][to] = value; };
+            synapses[Link(to, from)] = value;
+            compiled = false;
+        };
 
-        void set_sensory_weight(int from, int to, double value) {sensory_weights[from][to] = value;};
+        void set_sensory_weight(int from, int to, double value) {
+            sensory_synapses[Link(to, from)] = value;
+            compiled = false;
+        };
 
         void set_neuron(int i, double bias, double gain, int type) {
             biases[i] = bias;
@@ -34,10 +61,17 @@ class ANN {
 
         double get_neuron_output(int i) { return outputs[i]; };
 
+        // inputs can be sequences or buffers of doubles; if out (a
+        // buffer of doubles) is given the outputs are written into it
+
         // serial activation method (for feedforward topologies)
-        PyObject* sactivate(PyObject* inputs);
+        PyObject* sactivate(PyObject* inputs, PyObject* out = 0);
         // parallel activation method (for recurrent neural networks)
-        PyObject* pactivate(PyObject* inputs);
+        PyObject* pactivate(PyObject* inputs, PyObject* out = 0);
+        // serial activation of several rows of inputs at once
+        PyObject* sactivate_batch(PyObject* rows, PyObject* out = 0);
+        // parallel activation for several ticks (one row of inputs each)
+        PyObject* rollout(PyObject* rows, int steps = -1, PyObject* out = 0);
 
         // flushes all neuron's output
         void flush();
@@ -48,14 +82,29 @@ class ANN {
 
         double sigmoid(double x, double response);
 
-       // void use_fast_sigmoid(bool b) {
-       //     fast_sigmoid = b;
-       // }
+        // interpolates the activation function from a lookup table
+        // (see neat/nn/activations.py for the maximum error)
+        void use_fast_sigmoid(bool b);
 
    private:
+        bool read_inputs(PyObject* inputs, double* buffer);
+        PyObject* output_list();
+        int num_outputs();
+        void write_outputs(double* buffer);
+        const double* get_inputs(PyObject* inputs, DoubleBuffer& buffer);
+        bool get_outputs(PyObject* out, DoubleBuffer& buffer, Py_ssize_t n);
+        PyObject* return_outputs(PyObject* out);
+        PyObject* activate_rows(PyObject* rows, PyObject* out, Py_ssize_t steps, bool rollout);
+        void serial_update(const double* inputs);
+        void parallel_update(const double* inputs);
+        void activate(const double* inputs, bool serial);
+        void compile();
+        double incoming(int i, const double* inputs);
+
         int size;      // number of neurons (hidden + output)
         int sensors;   // number of sensors (inputs)
         bool logistic; // activation type (exp or tanh)
+        bool fast_sigmoid; // table mode
 
         // neuron's properties
         double *states, *outputs, *biases, *response;
@@ -63,11 +112,24 @@ class ANN {
         // each neuron has a type: 0 (hidden) or 1 (output)
         int *neuron_type;
 
-        // each network is composed of two matrices:
-        // one to specify how the inputs are connected
-        // to neurons and other to specify inter-neuron
-        // connections (hidden and outputs)
-        double **weights, **sensory_weights;
+        // each network has two sets of connections: one
+        // to specify how the inputs are connected to neurons
+        // and other to specify inter-neuron connections
+        // (hidden and outputs), both keyed by (to, from)
+        typedef std::pair<int, int> Link;
+        std::map<Link, double> synapses, sensory_synapses;
+
+        // the same connections in compressed sparse row form,
+        // rebuilt before activating if any of them has changed:
+        // the links to neuron i are [start[i], start[i+1])
+        bool compiled;
+        std::vector<int> sensory_start, sensory_source;
+        std::vector<double> sensory_weight;
+        std::vector<int> synapse_start, synapse_source;
+        std::vector<double> synapse_weight;
+
+        // sensor readings of the current activation
+        double *input_buffer;
 
 };
 #endif
@@ -23,13 +23,23 @@ PyMethodDef ANN_methods[] = {
     {"get_neuron_output", reinterpret_cast<PyCFunction>(get_neuron_output),
         METH_VARARGS, ""},
     {"sactivate", reinterpret_cast<PyCFunction>(sactivate),
-        METH_VARARGS, ""},
+        METH_VARARGS | METH_KEYWORDS, "sactivate(inputs[, out]): inputs and out can be buffers of doubles."},
     {"pactivate", reinterpret_cast<PyCFunction>(pactivate),
-        METH_VARARGS, ""},
+        METH_VARARGS | METH_KEYWORDS, "pactivate(inputs[, out]): inputs and out can be buffers of doubles."},
+    {"sactivate_batch", reinterpret_cast<PyCFunction>(sactivate_batch),
+        METH_VARARGS | METH_KEYWORDS, "sactivate_batch(rows[, out]): serial activation of each row of inputs "
+                      "from a flushed network; rows (N, inputs) and out (N, outputs) can be buffers. "
+                      "Returns a list of lists, or out if given."},
+    {"rollout", reinterpret_cast<PyCFunction>(rollout),
+        METH_VARARGS | METH_KEYWORDS, "rollout(input_sequence[, steps[, out]]): parallel activation for "
+                      "steps ticks (one row of inputs each, the last one held); returns the outputs of every tick "
+                      "as a list of lists, or out (steps, outputs) if given."},
     {"flush", reinterpret_cast<PyCFunction>(flush),
         METH_NOARGS, ""},
     {"set_logistic", reinterpret_cast<PyCFunction>(set_logistic),
         METH_VARARGS, ""},
+    {"use_fast_sigmoid", reinterpret_cast<PyCFunction>(use_fast_sigmoid),
+        METH_VARARGS, "Interpolates the activation function from a lookup table."},
     {0}
 };
 
@@ -100,26 +100,56 @@ PyObject* get_neuron_output(ANNObject *self, PyObject *args) {
     return Py_BuildValue("d", self->ann->get_neuron_output(i));
 }
 
-PyObject* sactivate(ANNObject *self, PyObject *args) {
-    PyObject* list;
-    if (!PyArg_ParseTuple(args, "O!", &PyList_Type, &list)) {
+PyObject* sactivate(ANNObject *self, PyObject *args, PyObject *kwds) {
+    PyObject* inputs;
+    PyObject* out = 0;
+    static char *kwlist[] = {"inputs", "out", 0};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|O", kwlist, &inputs, &out)) {
         return 0;
     }
-    Py_INCREF(list);
-    PyObject* output = self->ann->sactivate(list);
-    Py_DECREF(list);
-    return output;
+    return self->ann->sactivate(inputs, out);
 }
 
-PyObject* pactivate(ANNObject *self, PyObject *args) {
-    PyObject* list;
-    if (!PyArg_ParseTuple(args, "O!", &PyList_Type, &list)) {
+PyObject* pactivate(ANNObject *self, PyObject *args, PyObject *kwds) {
+    PyObject* inputs;
+    PyObject* out = 0;
+    static char *kwlist[] = {"inputs", "out", 0};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|O", kwlist, &inputs, &out)) {
         return 0;
     }
-    Py_INCREF(list);
-    PyObject* output = self->ann->pactivate(list);
-    Py_DECREF(list);
-    return output;
+    return self->ann->pactivate(inputs, out);
+}
+
+PyObject* sactivate_batch(ANNObject *self, PyObject *args, PyObject *kwds) {
+    PyObject* rows;
+    PyObject* out = 0;
+    static char *kwlist[] = {"rows", "out", 0};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|O", kwlist, &rows, &out)) {
+        return 0;
+    }
+    return self->ann->sactivate_batch(rows, out);
+}
+
+PyObject* rollout(ANNObject *self, PyObject *args, PyObject *kwds) {
+    PyObject* rows;
+    PyObject* steps = Py_None;
+    PyObject* out = 0;
+    static char *kwlist[] = {"input_sequence", "steps", "out", 0};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|OO", kwlist, &rows, &steps, &out)) {
+        return 0;
+    }
+    int n = -1;
+    if (steps != Py_None) {
+        n = PyInt_AsLong(steps);
+        if (n == -1 && PyErr_Occurred()) {
+            return 0;
+        }
+        if (n < 0) {
+            PyErr_SetString(PyExc_ValueError, "The number of steps must not be negative.");
+            return 0;
+        }
+    }
+    return self->ann->rollout(rows, n, out);
 }
 
 PyObject* flush(ANNObject* self) {
@@ -136,6 +166,15 @@ PyObject* set_logistic(ANNObject *self, PyObject *args) {
     return Py_BuildValue("");
 }
 
+PyObject* use_fast_sigmoid(ANNObject *self, PyObject *args) {
+    int option;
+    if (!PyArg_ParseTuple(args, "i", &option)) {
+        return 0;
+    }
+    self->ann->use_fast_sigmoid(bool(option));
+    return Py_BuildValue("");
+}
+
 }
 
 #endif
@@ -0,0 +1,576 @@
+"""
+ NumPy phenotypes. Instead of walking a graph of Neuron/Synapse
+ objects, the chromosome is compiled into dense weight blocks which
+ are evaluated with vectorized matrix-vector products.
+"""
+import copy
+
+try:
+    import numpy as np
+except ImportError:
+    print "NumPy not found! Please install it: http://numpy.scipy.org/"
+    raise
+
+import activations
+
+def sigmoid(x, response, activation_type, mode = None):
+    """ Vectorized version of nn_pure.sigmoid (see activations for the modes) """
+    return activations.get(activation_type, mode).vectorized(x, response)
+
+def _sigmoid_into(x, response, activation_type, out, buffer, mask):
+    """ Same as sigmoid, but writes into preallocated arrays (out, a float
+        buffer and a boolean mask, all shaped as x) instead of allocating
+        new ones. """
+    if activation_type == 'exp':
+        np.clip(x, -30.0, 30.0, out=buffer)
+        buffer *= response
+        np.negative(buffer, out=buffer)
+        with np.errstate(over='ignore'):
+            np.exp(buffer, out=buffer)
+        buffer += 1.0
+        np.divide(1.0, buffer, out=out)
+        np.less(x, -30.0, out=mask)
+        np.copyto(out, 0.0, where=mask)
+        np.greater(x, 30.0, out=mask)
+        np.copyto(out, 1.0, where=mask)
+    elif activation_type == 'tanh':
+        np.clip(x, -20.0, 20.0, out=buffer)
+        buffer *= response
+        np.tanh(buffer, out=out)
+        np.less(x, -20.0, out=mask)
+        np.copyto(out, -1.0, where=mask)
+        np.greater(x, 20.0, out=mask)
+        np.copyto(out, 1.0, where=mask)
+    else:
+        raise NameError('Invalid activation type selected: %s' % activation_type)
+
+class Layer(object):
+    """ A group of neurons sharing the same depth and activation function.
+        Their inputs only come from neurons of previous layers, so the
+        whole group is updated with a single matrix-vector product.
+    """
+    def __init__(self, neurons, sources, weights, back_sources, back_weights,
+                 bias, response, activation_type):
+        self.neurons = neurons           # neurons' positions in the state vector
+        self.sources = sources           # positions read by the weight block
+        self.weights = weights           # len(neurons) x len(sources)
+        self.back_sources = back_sources # links to neurons activated later (or to itself)
+        self.back_weights = back_weights
+        self.bias = bias
+        self.response = response
+        self.activation_type = activation_type
+        self.activation = activations.get(activation_type).vectorized
+
+    def copy(self):
+        """ Copies the layer's parameters (its structure is shared) """
+        layer = copy.copy(self)
+        layer.weights = self.weights.copy()
+        if self.back_weights is not None:
+            layer.back_weights = self.back_weights.copy()
+        layer.bias = self.bias.copy()
+        layer.response = self.response.copy()
+        return layer
+
+class FeedForwardNetwork(object):
+    """ A feedforward network compiled into dependency layers. It gives
+        the same outputs as nn_pure.Network.sactivate for a phenotype
+        built by nn_pure.create_ffphenotype.
+    """
+    def __init__(self, num_inputs, num_neurons, layers, outputs, num_synapses = 0, genes = None):
+        self._num_inputs = num_inputs
+        self.__layers = layers
+        self.__outputs = outputs # positions of output neurons
+        self.__state = np.zeros(num_neurons)
+        self.__num_synapses = num_synapses
+        # links to neurons not yet activated read the state from the previous call
+        self.__recurrent = any(l.back_weights is not None for l in layers)
+        # where each gene is stored: node id -> (layer, row) and
+        # connection key -> (layer, row, column, backward)
+        self.__genes = genes
+
+    layers = property(lambda self: self.__layers)
+
+    def flush(self):
+        self.__state[:] = 0.0
+
+    def copy(self):
+        """ Returns a flushed copy that can be updated independently """
+        return FeedForwardNetwork(self._num_inputs, len(self.__state),
+                                  [l.copy() for l in self.__layers], self.__outputs,
+                                  self.__num_synapses, self.__genes)
+
+    def update(self, conn_genes, node_genes):
+        """ Copies the weights, biases and responses of the given genes
+            into the network. The topology must not have changed (see
+            Chromosome.changed_genes).
+        """
+        for cg in conn_genes:
+            if cg.enabled:
+                l, row, column, backward = self.__genes[cg.key]
+                if backward:
+                    self.__layers[l].back_weights[row, column] = cg.weight
+                else:
+                    self.__layers[l].weights[row, column] = cg.weight
+        for ng in node_genes:
+            l, row = self.__genes[ng.id]
+            self.__layers[l].bias[row] = ng.bias
+            self.__layers[l].response[row] = ng.response
+
+    def __repr__(self):
+        return '%d nodes and %d synapses' % (len(self.__state), self.__num_synapses)
+
+    def sactivate(self, inputs=[]):
+        """ Serial activation method: layers are activated in dependency order. """
+        assert len(inputs) == self._num_inputs, "Wrong number of inputs."
+
+        state = self.__state
+        if self.__recurrent:
+            previous = state.copy()
+        state[:self._num_inputs] = inputs
+        for l in self.__layers:
+            x = np.dot(l.weights, state[l.sources])
+            if l.back_weights is not None:
+                x += np.dot(l.back_weights, previous[l.back_sources])
+            x += l.bias
+            state[l.neurons] = l.activation(x, l.response)
+        return state[self.__outputs].tolist()
+
+    def sactivate_batch(self, rows):
+        """ Activates the network for an (N, inputs) array, as if the network
+            were flushed before each row, and returns an (N, outputs) array.
+            Each layer is computed with a single matrix product.
+        """
+        rows = np.asarray(rows, dtype=float)
+        assert rows.ndim == 2 and rows.shape[1] == self._num_inputs, "Wrong number of inputs."
+
+        # links read from a flushed network don't contribute
+        state = np.zeros((rows.shape[0], len(self.__state)))
+        state[:, :self._num_inputs] = rows
+        for l in self.__layers:
+            x = np.dot(state[:, l.sources], l.weights.T)
+            x += l.bias
+            state[:, l.neurons] = l.activation(x, l.response)
+        return state[:, self.__outputs]
+
+def _activation_order(chromo):
+    """ Returns the node genes in the order sactivate updates them:
+        inputs, hidden nodes in node_order and then outputs.
+    """
+    node_genes = chromo.node_genes
+    order = [ng for ng in node_genes[:chromo.sensors] if ng.type == 'INPUT']
+    order.extend(node_genes[id-1] for id in chromo.node_order)
+    order.extend(ng for ng in node_genes if ng.type == 'OUTPUT')
+    assert(len(order) == len(node_genes))
+    return order
+
+def _ff_links(chromo, order):
+    """ Splits the enabled connections into forward links (from neurons
+        activated earlier) and backward links, and computes each neuron's
+        depth: one more than the deepest neuron it depends on.
+    """
+    position = dict((ng.id, i) for i, ng in enumerate(order))
+
+    # incoming links for each neuron
+    forward = dict((ng.id, []) for ng in order)
+    backward = dict((ng.id, []) for ng in order)
+    for cg in chromo.conn_genes:
+        if cg.enabled:
+            if position[cg.innodeid] < position[cg.outnodeid]:
+                forward[cg.outnodeid].append((position[cg.innodeid], cg.weight))
+            else:
+                backward[cg.outnodeid].append((position[cg.innodeid], cg.weight))
+
+    depth = {}
+    for ng in order:
+        if ng.type == 'INPUT':
+            depth[ng.id] = 0
+        else:
+            depth[ng.id] = 1 + max([depth[order[i].id] for i, w in forward[ng.id]] or [0])
+
+    return position, forward, backward, depth
+
+def create_ffphenotype(chromo):
+    """ Receives a chromosome and returns its phenotype (a layered network) """
+
+    order = _activation_order(chromo)
+    position, forward, backward, depth = _ff_links(chromo, order)
+
+    groups = {}
+    for ng in order[chromo.sensors:]:
+        groups.setdefault((depth[ng.id], ng.activation_type), []).append(ng)
+
+    layers = []
+    genes = {}
+    for key in sorted(groups.keys()):
+        neurons = groups[key]
+        sources, weights, column = _weight_block(neurons, forward)
+        back_sources, back_weights, back_column = _weight_block(neurons, backward)
+        for row, ng in enumerate(neurons):
+            genes[ng.id] = (len(layers), row)
+            for i, w in forward[ng.id]:
+                genes[(order[i].id, ng.id)] = (len(layers), row, column[i], False)
+            for i, w in backward[ng.id]:
+                genes[(order[i].id, ng.id)] = (len(layers), row, back_column[i], True)
+        if not len(back_sources):
+            back_sources, back_weights = None, None
+        layers.append(Layer(np.array([position[ng.id] for ng in neurons]),
+                            sources, weights, back_sources, back_weights,
+                            np.array([ng.bias for ng in neurons], dtype=float),
+                            np.array([ng.response for ng in neurons], dtype=float),
+                            key[1]))
+
+    outputs = np.array([position[ng.id] for ng in order if ng.type == 'OUTPUT'])
+    num_synapses = len([cg for cg in chromo.conn_genes if cg.enabled])
+
+    return FeedForwardNetwork(chromo.sensors, len(order), layers, outputs, num_synapses, genes)
+
+def _weight_block(neurons, links):
+    """ Builds a dense weight matrix for the given neurons over the
+        columns they actually read from. Returns the columns, the matrix
+        and a mapping from the source position to its column. """
+    columns = sorted(set(i for ng in neurons for i, w in links[ng.id]))
+    column = dict((c, j) for j, c in enumerate(columns))
+    weights = np.zeros((len(neurons), len(columns)))
+    for row, ng in enumerate(neurons):
+        for i, w in links[ng.id]:
+            weights[row, column[i]] = w
+    return np.array(columns, dtype=int), weights, column
+
+class RecurrentNetwork(object):
+    """ A recurrent network whose enabled connections are stored as a
+        sparse matrix in CSR form (one row of incoming links for each
+        non-input neuron). Each tick is a sparse matrix-vector product
+        followed by the activation functions, computed in preallocated
+        buffers. It gives the same outputs as nn_pure.Network.pactivate
+        for a phenotype built by nn_pure.create_phenotype.
+    """
+    def __init__(self, num_inputs, indptr, indices, weights, bias, response,
+                 activation_types, outputs):
+        self._num_inputs = num_inputs
+        self.__num_synapses = len(indices)
+
+        # neurons are sorted by activation type (keeping their links'
+        # order), so that each type's neurons are a slice of the state
+        order = sorted(xrange(len(bias)), key = lambda i: activation_types[i])
+        self.__rows = np.empty(len(bias), dtype=int) # a neuron's row (in the chromosome's order)
+        self.__rows[order] = np.arange(len(bias))
+        position = np.concatenate((np.arange(num_inputs), self.__rows + num_inputs)).astype(int)
+        links = {} # position of each connection gene in the weights array
+        sorted_indices, sorted_weights, sorted_indptr = [], [], [0]
+        for i in order:
+            for k in xrange(indptr[i], indptr[i+1]):
+                links[(indices[k] + 1, i + num_inputs + 1)] = len(sorted_indices)
+                sorted_indices.append(position[indices[k]])
+                sorted_weights.append(weights[k])
+            sorted_indptr.append(len(sorted_indices))
+        indptr, indices, weights = sorted_indptr, sorted_indices, sorted_weights
+        bias = [bias[i] for i in order]
+        response = [response[i] for i in order]
+        activation_types = [activation_types[i] for i in order]
+        outputs = position[np.asarray(outputs, dtype=int)]
+
+        # reduceat needs a valid start for every row, so a zero link is
+        # appended and rows without links are masked out afterwards
+        self.__indices = np.append(np.asarray(indices, dtype=int), 0)
+        self.__weights = np.append(np.asarray(weights, dtype=float), 0.0)
+        self.__starts = np.asarray(indptr[:-1], dtype=int)
+        self.__has_links = (np.diff(indptr) > 0).astype(float)
+
+        self.__bias = np.asarray(bias, dtype=float)
+        self.__response = np.asarray(response, dtype=float)
+        self.__outputs = np.asarray(outputs, dtype=int)
+
+        # activation functions and the slices of neurons using them: exact
+        # exp and tanh functions are computed in place (see _sigmoid_into)
+        self.__kinds = []
+        for kind in sorted(set(activation_types)):
+            start = activation_types.index(kind)
+            stop = start + activation_types.count(kind)
+            if kind in ('exp', 'tanh') and activations.is_exact(kind):
+                activation = None
+            else:
+                activation = activations.get(kind).vectorized
+            self.__kinds.append((kind, activation, start, stop))
+
+        self.__links = links
+
+        self.__allocate_buffers()
+
+    def __allocate_buffers(self):
+        self.__state = np.zeros(self._num_inputs + len(self.__bias))
+        self.__neurons = self.__state[self._num_inputs:] # view on non-input neurons
+        # the incoming signals are gathered into a second buffer, so all
+        # neurons are updated from the previous step's outputs
+        self.__incoming = np.zeros(len(self.__indices))
+        self.__soma = np.zeros(len(self.__bias))
+        self.__buffer = np.zeros(len(self.__bias))
+        self.__mask = np.zeros(len(self.__bias), dtype=bool)
+        # views on the arrays of each activation type's neurons
+        self.__groups = [(kind, activation) +
+                         tuple(a[start:stop] for a in (self.__soma, self.__response, self.__neurons,
+                                                       self.__buffer, self.__mask))
+                         for kind, activation, start, stop in self.__kinds]
+
+    def flush(self):
+        self.__state[:] = 0.0
+
+    def copy(self):
+        """ Returns a flushed copy that can be updated independently """
+        net = copy.copy(self) # the sparse structure is shared
+        net.__weights = self.__weights.copy()
+        net.__bias = self.__bias.copy()
+        net.__response = self.__response.copy()
+        net.__allocate_buffers()
+        return net
+
+    def update(self, conn_genes, node_genes):
+        """ Copies the weights, biases and responses of the given genes
+            into the network. The topology must not have changed (see
+            Chromosome.changed_genes).
+        """
+        for cg in conn_genes:
+            if cg.enabled:
+                self.__weights[self.__links[cg.key]] = cg.weight
+        for ng in node_genes:
+            row = self.__rows[ng.id - self._num_inputs - 1]
+            self.__bias[row] = ng.bias
+            self.__response[row] = ng.response
+
+    def __repr__(self):
+        return '%d nodes and %d synapses' % (len(self.__state), self.__num_synapses)
+
+    def __tick(self):
+        np.take(self.__state, self.__indices, out=self.__incoming)
+        self.__incoming *= self.__weights
+        soma = self.__soma
+        np.add.reduceat(self.__incoming, self.__starts, out=soma)
+        soma *= self.__has_links
+        soma += self.__bias
+        for kind, activation, x, response, output, buffer, mask in self.__groups:
+            if activation is None:
+                _sigmoid_into(x, response, kind, output, buffer, mask)
+            else:
+                output[:] = activation(x, response)
+
+    def pactivate(self, inputs=[]):
+        """ Parallel activation method: all neurons are updated at once. """
+        assert len(inputs) == self._num_inputs, "Wrong number of inputs."
+        self.__state[:self._num_inputs] = inputs
+        if len(self.__soma):
+            self.__tick()
+        return self.__state[self.__outputs].tolist()
+
+    def rollout(self, input_sequence, steps=None):
+        """ Parallel activation for several ticks from the current state
+            (see nn_pure.Network.rollout). Returns a (steps, outputs) array. """
+        inputs = np.asarray(input_sequence, dtype=float).reshape(len(input_sequence), self._num_inputs)
+        if steps is None:
+            steps = len(inputs)
+        assert steps == 0 or len(inputs) > 0, "No inputs to hold."
+        trajectory = np.empty((steps, len(self.__outputs)))
+        last = len(inputs) - 1
+        for t in xrange(steps):
+            self.__state[:self._num_inputs] = inputs[t if t < last else last]
+            if len(self.__soma):
+                self.__tick()
+            trajectory[t] = self.__state[self.__outputs]
+        return trajectory
+
+def create_phenotype(chromo):
+    """ Receives a chromosome and returns its phenotype (a sparse recurrent network) """
+    num_inputs = chromo.sensors
+    neurons = chromo.node_genes[num_inputs:]
+
+    # incoming links of each non-input neuron, in the chromosome's order
+    links = [[] for ng in neurons]
+    for cg in chromo.conn_genes:
+        if cg.enabled:
+            links[cg.outnodeid - num_inputs - 1].append((cg.innodeid - 1, cg.weight))
+
+    indptr = [0]
+    indices = []
+    weights = []
+    for row in links:
+        for i, w in row:
+            indices.append(i)
+            weights.append(w)
+        indptr.append(len(indices))
+
+    return RecurrentNetwork(num_inputs, indptr, indices, weights,
+                            [ng.bias for ng in neurons],
+                            [ng.response for ng in neurons],
+                            [ng.activation_type for ng in neurons],
+                            [ng.id - 1 for ng in neurons if ng.type == 'OUTPUT'])
+
+class PopulationNetwork(object):
+    """ The phenotypes of a whole population packed into padded arrays
+        (networks x neurons x neurons), so each activation step updates
+        every network at once. Inputs and outputs have one row per network.
+    """
+    def __init__(self, num_inputs, weights, back_weights, bias, response,
+                 activation_types, outputs, depth = None):
+        self._num_inputs = num_inputs
+        self.__weights = weights
+        self.__back_weights = back_weights # None for recurrent networks
+        self.__bias = bias
+        self.__response = response
+        self.__activations = dict((kind, activations.get(kind).vectorized)
+                                  for kind in set(activation_types.flat) - set([None]))
+        # one mask per activation type, only needed when they are mixed
+        self.__masks = [(activation, activation_types == kind)
+                        for kind, activation in self.__activations.items()]
+        self.__outputs = outputs
+        self.__depth = depth # None for recurrent networks
+        self.__rows = np.arange(len(weights))[:,None]
+        self.__state = np.zeros(bias.shape)
+        self.__flat_state = self.__state.reshape(-1) # a view
+        if depth is not None:
+            self.__has_back_weights = back_weights.any()
+            self.__layers = [self.__layer(depth == d, activation_types)
+                             for d in xrange(1, depth.max() + 1)]
+
+    def __layer(self, mask, activation_types):
+        """ The neurons of every network at one depth, grouped by
+            activation type: their flat indices in the state, the row of
+            their network, their weights, biases and responses. """
+        p, i = np.nonzero(mask)
+        kinds = activation_types[p, i]
+        order = np.argsort(kinds, kind='mergesort')
+        p, i, kinds = p[order], i[order], kinds[order]
+        groups = []
+        for kind, activation in sorted(self.__activations.items()):
+            selected = np.flatnonzero(kinds == kind)
+            if len(selected):
+                groups.append((activation, selected[0], selected[-1] + 1))
+        return (p*self.__state.shape[1] + i, p, self.__weights[p, i],
+                self.__bias[p, i], self.__response[p, i], groups)
+
+    def __len__(self):
+        return len(self.__weights)
+
+    def flush(self):
+        self.__state[:] = 0.0
+
+    def __activate(self, x):
+        if len(self.__activations) == 1:
+            return self.__activations.values()[0](x, self.__response)
+        output = np.zeros(x.shape)
+        for activation, mask in self.__masks:
+            output[mask] = activation(x[mask], self.__response[mask])
+        return output
+
+    def __set_inputs(self, inputs):
+        inputs = np.asarray(inputs, dtype=float)
+        assert inputs.shape[-1] == self._num_inputs, "Wrong number of inputs."
+        self.__state[:, :self._num_inputs] = inputs
+
+    def sactivate(self, inputs):
+        """ Serial activation of all (feedforward) networks. Neurons are
+            updated depth by depth, each depth for the whole population
+            at once.
+        """
+        assert self.__depth is not None, "Not a feedforward population."
+        state = self.__state
+        # backward links read the previous state: their sum is done once
+        if self.__has_back_weights:
+            previous = np.einsum('pij,pj->pi', self.__back_weights, state).reshape(-1)
+        self.__set_inputs(inputs)
+        flat_state = self.__flat_state
+        for neurons, rows, weights, bias, response, groups in self.__layers:
+            x = np.einsum('ij,ij->i', weights, state[rows])
+            x += bias
+            if self.__has_back_weights:
+                x += previous[neurons]
+            if len(groups) == 1:
+                flat_state[neurons] = groups[0][0](x, response)
+            else:
+                for activation, start, stop in groups:
+                    flat_state[neurons[start:stop]] = activation(x[start:stop], response[start:stop])
+        return state[self.__rows, self.__outputs]
+
+    def pactivate(self, inputs):
+        """ Parallel activation of all (recurrent) networks: a single step
+            for every neuron of every network.
+        """
+        state = self.__state
+        self.__set_inputs(inputs)
+        x = np.einsum('pij,pj->pi', self.__weights, state)
+        x += self.__bias
+        output = self.__activate(x)
+        state[:, self._num_inputs:] = output[:, self._num_inputs:]
+        return state[self.__rows, self.__outputs]
+
+def _population_arrays(chromosomes, orders):
+    """ Allocates the padded arrays shared by both population phenotypes """
+    P = len(chromosomes)
+    N = max(len(order) for order in orders)
+    bias = np.zeros((P, N))
+    response = np.zeros((P, N))
+    activation_types = np.empty((P, N), dtype=object)
+    outputs = []
+    for p, order in enumerate(orders):
+        for i, ng in enumerate(order):
+            if ng.type != 'INPUT':
+                bias[p, i] = ng.bias
+                response[p, i] = ng.response
+                activation_types[p, i] = ng.activation_type
+        outputs.append([i for i, ng in enumerate(order) if ng.type == 'OUTPUT'])
+    return bias, response, activation_types, np.array(outputs, dtype=int)
+
+def create_population_ffphenotype(chromosomes):
+    """ Receives a list of feedforward chromosomes and returns a
+        single phenotype for all of them. """
+    orders = [_activation_order(c) for c in chromosomes]
+    bias, response, activation_types, outputs = _population_arrays(chromosomes, orders)
+
+    weights = np.zeros(bias.shape + bias.shape[-1:])
+    back_weights = np.zeros(weights.shape)
+    depth = np.zeros(bias.shape, dtype=int)
+    for p, (c, order) in enumerate(zip(chromosomes, orders)):
+        position, forward, backward, node_depth = _ff_links(c, order)
+        for ng in order:
+            i = position[ng.id]
+            depth[p, i] = node_depth[ng.id]
+            for j, w in forward[ng.id]:
+                weights[p, i, j] = w
+            for j, w in backward[ng.id]:
+                back_weights[p, i, j] = w
+
+    return PopulationNetwork(chromosomes[0].sensors, weights, back_weights,
+                             bias, response, activation_types, outputs, depth)
+
+def create_population_phenotype(chromosomes):
+    """ Receives a list of chromosomes and returns a single recurrent
+        phenotype for all of them. """
+    orders = [c.node_genes for c in chromosomes]
+    bias, response, activation_types, outputs = _population_arrays(chromosomes, orders)
+
+    weights = np.zeros(bias.shape + bias.shape[-1:])
+    for p, c in enumerate(chromosomes):
+        for cg in c.conn_genes:
+            if cg.enabled:
+                weights[p, cg.outnodeid-1, cg.innodeid-1] = cg.weight
+
+    return PopulationNetwork(chromosomes[0].sensors, weights, None,
+                             bias, response, activation_types, outputs)
+
+if __name__ == "__main__":
+    # Example: compares the compiled network against nn_pure
+    from neat.config import Config
+    from neat import chromosome, genome
+    from neat.nn import nn_pure
+
+    Config.input_nodes = 2
+    Config.output_nodes = 1
+    Config.nn_activation = 'exp'
+    Config.weight_stdev = 0.9
+
+    chromosome.node_gene_type = genome.NodeGene
+    c = chromosome.FFChromosome.create_fully_connected()
+    c.add_hidden_nodes(3)
+
+    pure = nn_pure.create_ffphenotype(c)
+    fast = create_ffphenotype(c)
+    print fast, len(fast.layers), 'layers'
+    for inputs in [[0, 0], [0, 1], [1, 0], [1, 1]]:
+        print pure.sactivate(inputs), fast.sactivate(inputs)
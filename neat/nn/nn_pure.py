@@ -1,5 +1,6 @@
 import math
 import random
+import activations
 
 try:
     import psyco; psyco.full()
@@ -42,6 +43,9 @@ class Neuron(object):
         assert(self._type in ('INPUT', 'OUTPUT', 'HIDDEN'))
 
         self._activation_type = activation_type # default is exponential
+        if self._type != 'INPUT':
+            # resolved once instead of at every activation
+            self._activation = activations.get(activation_type)
 
         self._response = response # default = 4.924273 (Stanley, p. 146)
         self._output = 0.0  # for recurrent networks all neurons must have an "initial state"
@@ -60,7 +64,7 @@ class Neuron(object):
     def activate(self):
         "Activates the neuron"
         assert self._type is not 'INPUT'
-        return sigmoid(self._update_activation() + self._bias, self._response, self._activation_type)
+        return self._activation(self._update_activation() + self._bias, self._response)
 
     def _update_activation(self):
         soma = 0.0
@@ -160,6 +164,20 @@ class Network(object):
                 net_output.append(n._output)
         return net_output
 
+    def sactivate_batch(self, rows):
+        '''Serial activation of several input rows. Each row is activated
+           from a flushed network (the network is left flushed afterwards)
+           and a list with one output list per row is returned: unlike
+           nn_numpy, which returns an (N, outputs) array, this module
+           doesn't need NumPy (use numpy.asarray on the result if needed).
+        '''
+        net_outputs = []
+        for inputs in rows:
+            self.flush()
+            net_outputs.append(self.sactivate(inputs))
+        self.flush()
+        return net_outputs
+
     def pactivate(self, inputs=[]):
         '''Parallel (synchronous) network activation method. Mostly used
            for control and unsupervised learning (i.e., artificial life)
@@ -186,12 +204,41 @@ class Network(object):
 
         return net_output
 
+    def rollout(self, input_sequence, steps=None):
+        '''Parallel activation for several ticks in a single call, starting
+           from the current state. The inputs of tick t are input_sequence[t];
+           if steps is greater than the number of rows the last one is held,
+           so rollout([inputs], steps) feeds constant inputs. Returns the
+           list of outputs of every tick (the same as calling pactivate),
+           a list of lists where nn_numpy returns a (steps, outputs) array.
+        '''
+        if steps is None:
+            steps = len(input_sequence)
+        assert steps == 0 or len(input_sequence) > 0, "No inputs to hold."
+
+        sensors = [n for n in self.__neurons[:self._num_inputs] if n._type == 'INPUT']
+        neurons = [n for n in self.__neurons if n._type != 'INPUT']
+        outputs = [n for n in neurons if n._type == 'OUTPUT']
+        last = len(input_sequence) - 1
+        trajectory = []
+        for t in xrange(steps):
+            inputs = input_sequence[t if t < last else last]
+            assert len(inputs) == self._num_inputs, "Wrong number of inputs."
+            for n, value in zip(sensors, inputs):
+                n._output = value
+            # updates all neurons at once
+            current_state = [n.activate() for n in neurons]
+            for n, state in zip(neurons, current_state):
+                n._output = state
+            trajectory.append([n._output for n in outputs])
+        return trajectory
+
 class FeedForward(Network):
     """ A feedforward network is a particular class of neural network.
         Only one hidden layer is considered for now.
     """
 
-    def __init__(self, layers, use_bias=False, activation_type=None):
+    def __init__(self, layers, use_bias=False, activation_type='exp'):
         super(FeedForward, self).__init__()
 
         self.__input_layer   = layers[0]
@@ -236,11 +283,11 @@ class FeedForward(Network):
 def create_phenotype(chromo):
         """ Receives a chromosome and returns its phenotype (a neural network) """
 
-        neurons_list = [Neuron(ng._type, ng._id,
-                               ng._bias,
-                               ng._response,
+        neurons_list = [Neuron(ng.type, ng.id,
+                               ng.bias,
+                               ng.response,
                                ng.activation_type)
-                        for ng in chromo._node_genes]
+                        for ng in chromo.node_genes]
 
         conn_list = [(cg.innodeid, cg.outnodeid, cg.weight)
                      for cg in chromo.conn_genes if cg.enabled]
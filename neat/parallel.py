@@ -0,0 +1,403 @@
+# -*- coding: UTF-8 -*-
+"""
+ Parallel evaluation of a population. The evaluators call a fitness
+ function f(chromosome) -> float for each chromosome and assign the
+ results back:
+
+    def eval_fitness(chromo):
+        net = nn.create_ffphenotype(chromo)
+        ...
+        return fitness
+
+    evaluator = parallel.ParallelEvaluator(4, eval_fitness)
+    population.Population.evaluate = lambda population: evaluator.evaluate(population)
+
+ ParallelEvaluator runs a persistent pool of processes and works for any
+ fitness function defined at the top level of a module. DeltaEvaluator
+ keeps the population in its processes and only sends them what changed
+ from one generation to the next. ThreadedEvaluator runs a pool of
+ threads: it only pays off when the evaluation runs mostly outside the
+ GIL, as in ann.ANN and dpole.integrate, which release it around their
+ numeric loops. Spiking networks (iznn, ifnn) don't gain from threads:
+ iznn.Network advances its synapses and neurons in Python, one ms at a
+ time. Networks must not be shared between threads.
+
+ ThreadedEvaluator and ParallelEvaluator can also evaluate chromosomes
+ one at a time (submit and collect), with no generation barrier:
+
+    pop.steady_state(evaluator, 10000)
+"""
+import os
+import sys
+import time
+import copy
+import traceback
+import cPickle as pickle
+import threading
+import Queue
+import multiprocessing
+
+class ThreadedEvaluator(object):
+    """ Calls eval_function(chromo) for each chromosome in num_workers
+        threads, which are kept alive between generations. """
+    def __init__(self, num_workers, eval_function):
+        self.__eval_function = eval_function
+        self.__jobs = Queue.Queue()
+        self.__results = Queue.Queue()
+        self.__workers = []
+        for i in xrange(num_workers):
+            worker = threading.Thread(target=self.__work, name='neat-evaluator-%d' % i)
+            worker.daemon = True
+            worker.start()
+            self.__workers.append(worker)
+
+    num_workers = property(lambda self: len(self.__workers))
+
+    def __work(self):
+        while True:
+            job = self.__jobs.get()
+            if job is None: # stop
+                return
+            i, chromo = job
+            try:
+                self.__results.put((i, self.__eval_function(chromo), None))
+            except:
+                self.__results.put((i, None, sys.exc_info()))
+
+    def evaluate(self, population):
+        """ Assigns the fitness of every chromosome in the population. The
+            first exception raised by eval_function is raised again here,
+            after all jobs have finished. """
+        assert self.__workers, 'The evaluator has been stopped'
+        chromosomes = list(population)
+        for job in enumerate(chromosomes):
+            self.__jobs.put(job)
+        error = None
+        for k in xrange(len(chromosomes)):
+            i, fitness, exc_info = self.__results.get()
+            if exc_info is not None:
+                error = error or exc_info
+            else:
+                chromosomes[i].fitness = fitness
+        if error is not None:
+            raise error[0], error[1], error[2]
+
+    def submit(self, chromo):
+        """ Queues a single chromosome for evaluation (see collect). Do not
+            mix with evaluate while chromosomes are in flight. """
+        assert self.__workers, 'The evaluator has been stopped'
+        self.__jobs.put((chromo, chromo))
+
+    def collect(self):
+        """ Waits for any submitted chromosome to be evaluated, assigns its
+            fitness and returns it. """
+        chromo, fitness, exc_info = self.__results.get()
+        if exc_info is not None:
+            raise exc_info[0], exc_info[1], exc_info[2]
+        chromo.fitness = fitness
+        return chromo
+
+    def stop(self):
+        """ Terminates the worker threads """
+        for worker in self.__workers:
+            self.__jobs.put(None)
+        for worker in self.__workers:
+            worker.join()
+        self.__workers = []
+
+# set in each worker process by the pool's initializer
+_eval_function = None
+
+def _init_worker(eval_function):
+    global _eval_function
+    _eval_function = eval_function
+
+def _evaluate_chunk(chunk):
+    """ Evaluates a list of chromosomes in a worker process. Returns the
+        worker's pid, (id, fitness) pairs and the time it took. """
+    start = time.time()
+    fitness = [(chromo.id, _eval_function(chromo)) for chromo in chunk]
+    return os.getpid(), fitness, time.time() - start
+
+def _evaluate_submitted(chunk):
+    """ As _evaluate_chunk, returning the ids of the chunk and the
+        traceback of an exception instead of raising it (an async
+        result's callback never sees exceptions). """
+    try:
+        return _evaluate_chunk(chunk), None
+    except:
+        return None, ([chromo.id for chromo in chunk], traceback.format_exc())
+
+class ParallelEvaluator(object):
+    """ Calls eval_function(chromo) for each chromosome in a pool of
+        num_workers processes (one per core by default), which are kept
+        alive between generations. eval_function must be picklable (i.e.
+        defined at the top level of a module). """
+    def __init__(self, num_workers, eval_function, chunksize = None):
+        if num_workers is None:
+            num_workers = multiprocessing.cpu_count()
+        self.__num_workers = num_workers
+        self.__chunksize = chunksize
+        self.__pool = multiprocessing.Pool(num_workers, _init_worker, (eval_function,))
+        self.__stats = {} # pid -> [chromosomes evaluated, seconds]
+        self.__submitted = {} # id -> chromosome in flight
+        self.__done = Queue.Queue()
+
+    num_workers = property(lambda self: self.__num_workers)
+    stats = property(lambda self: dict((pid, tuple(s)) for pid, s in self.__stats.items()),
+                     doc = 'pid -> (chromosomes evaluated, seconds) of each worker')
+
+    def __chunks(self, chromosomes):
+        """ Splits the population so that every worker gets about four
+            chunks: small enough to balance the load, large enough to
+            amortize the communication. """
+        size = self.__chunksize
+        if size is None:
+            size = max(1, -(-len(chromosomes) // (4*self.__num_workers)))
+        return [chromosomes[i:i+size] for i in xrange(0, len(chromosomes), size)]
+
+    def evaluate(self, population):
+        """ Assigns the fitness of every chromosome in the population """
+        assert self.__pool is not None, 'The evaluator has been stopped'
+        chromosomes = list(population)
+        fitness = {}
+        for pid, results, elapsed in self.__pool.imap_unordered(_evaluate_chunk,
+                                                                self.__chunks(chromosomes)):
+            fitness.update(results)
+            self.__count(pid, len(results), elapsed)
+        # assigned by id: the chromosomes sent were copies
+        for chromo in chromosomes:
+            chromo.fitness = fitness[chromo.id]
+
+    def __count(self, pid, evaluated, elapsed):
+        stats = self.__stats.setdefault(pid, [0, 0.0])
+        stats[0] += evaluated
+        stats[1] += elapsed
+
+    def submit(self, chromo):
+        """ Sends a single chromosome to be evaluated (see collect) """
+        assert self.__pool is not None, 'The evaluator has been stopped'
+        self.__submitted[chromo.id] = chromo
+        self.__pool.apply_async(_evaluate_submitted, ([chromo],), callback=self.__done.put)
+
+    def collect(self):
+        """ Waits for any submitted chromosome to be evaluated, assigns its
+            fitness and returns it. An exception raised by eval_function
+            is raised as a RuntimeError with the worker's traceback. """
+        assert self.__submitted, 'No chromosomes in flight'
+        result, error = self.__done.get()
+        if error is not None:
+            ids, error = error
+            for id in ids: # no longer in flight
+                del self.__submitted[id]
+            raise RuntimeError('eval_function failed in a worker:\n' + error)
+        pid, [(id, fitness)], elapsed = result
+        self.__count(pid, 1, elapsed)
+        chromo = self.__submitted.pop(id)
+        chromo.fitness = fitness
+        return chromo
+
+    def throughput(self):
+        """ Chromosomes evaluated per second of work by each worker (pid) """
+        return dict((pid, n/seconds if seconds else 0.0)
+                    for pid, (n, seconds) in self.__stats.items())
+
+    def print_stats(self):
+        _print_stats(self.__stats)
+
+    def stop(self):
+        """ Terminates the worker processes """
+        self.__pool.close()
+        self.__pool.join()
+        self.__pool = None
+
+def _print_stats(stats):
+    print 'Worker    evaluated   busy (s)   chromosomes/s'
+    for pid, (n, seconds) in sorted(stats.items()):
+        print '%6d %12d %10.3f %15.1f' % (pid, n, seconds, n/seconds if seconds else 0.0)
+
+def _delta_worker(conn, results, eval_function):
+    """ Keeps the chromosomes of the current generation, by id, and
+        evaluates them on request. Messages are pickled tuples:
+
+        ('genomes', chromosomes, deltas, ids) - new chromosomes, sent whole
+            or as (base id, record) pairs (see Chromosome.delta), and the
+            ids of the generation (all other chromosomes are dropped)
+        ('evaluate', ids) - puts (pid, (id, fitness) pairs, seconds,
+            error) in the results queue
+        None - stop
+    """
+    genomes = {}
+    while True:
+        message = pickle.loads(conn.recv_bytes())
+        if message is None:
+            return
+        if message[0] == 'genomes':
+            chromosomes, deltas, ids = message[1:]
+            # all records refer to the bases as they were before this message
+            updated = dict((record[0], genomes[base_id].child_from_delta(record))
+                           for base_id, record in deltas)
+            updated.update((chromo.id, chromo) for chromo in chromosomes)
+            genomes = dict((id, updated[id] if id in updated else genomes[id]) for id in ids)
+        else:
+            start = time.time()
+            try:
+                fitness = [(id, eval_function(genomes[id])) for id in message[1]]
+            except:
+                results.put((os.getpid(), None, 0.0, traceback.format_exc()))
+            else:
+                results.put((os.getpid(), fitness, time.time() - start, None))
+
+class DeltaEvaluator(object):
+    """ Calls eval_function(chromo) for each chromosome in num_workers
+        persistent processes, which keep the current generation. Instead
+        of pickling every chromosome each generation, only the genes in
+        which a chromosome differs from its fittest parent (or from the
+        previous version of itself) are sent; chromosomes whose parent is
+        unknown are sent whole. Pays off when the evaluation is short and
+        pickling the population dominates.
+    """
+    def __init__(self, num_workers, eval_function, chunksize = None):
+        if num_workers is None:
+            num_workers = multiprocessing.cpu_count()
+        self.__chunksize = chunksize
+        self.__results = multiprocessing.Queue()
+        self.__workers = []
+        for i in xrange(num_workers):
+            conn, worker_conn = multiprocessing.Pipe()
+            worker = multiprocessing.Process(target=_delta_worker, name='neat-evaluator-%d' % i,
+                                             args=(worker_conn, self.__results, eval_function))
+            worker.daemon = True
+            worker.start()
+            self.__workers.append((worker, conn))
+        # the coordinator's copy of what the workers have, rebuilt from
+        # the same records (genes are never mutated in place here)
+        self.__genomes = {}
+        self.__stats = {} # pid -> [chromosomes evaluated, seconds]
+        self.__bytes_sent = 0
+        self.__full_sent = 0
+
+    num_workers = property(lambda self: len(self.__workers))
+    bytes_sent = property(lambda self: self.__bytes_sent,
+                          doc = 'Bytes sent to the workers so far')
+    full_sent = property(lambda self: self.__full_sent,
+                         doc = 'Chromosomes which had to be sent whole')
+
+    def __send(self, conn, message):
+        data = pickle.dumps(message, 2)
+        self.__bytes_sent += len(data)
+        conn.send_bytes(data)
+
+    def __broadcast(self, chromosomes):
+        """ Sends the new and changed chromosomes to every worker """
+        full, deltas = [], []
+        for chromo in chromosomes:
+            record = None
+            if chromo.id in self.__genomes: # possibly mutated in place
+                base_id = chromo.id
+            elif chromo.origin in self.__genomes:
+                base_id = chromo.origin
+            else:
+                base_id = chromo.parent1_id
+            if base_id in self.__genomes:
+                record = chromo.delta(self.__genomes[base_id])
+            if record is None:
+                full.append(chromo)
+            elif base_id != chromo.id or record[4] or record[5]:
+                deltas.append((base_id, record))
+        ids = [chromo.id for chromo in chromosomes]
+        message = ('genomes', full, deltas, ids)
+        data = pickle.dumps(message, 2)
+        for worker, conn in self.__workers:
+            self.__bytes_sent += len(data)
+            conn.send_bytes(data)
+        self.__full_sent += len(full)
+
+        # the same as the workers do
+        updated = dict((record[0], self.__genomes[base_id].child_from_delta(record))
+                       for base_id, record in deltas)
+        updated.update((chromo.id, copy.deepcopy(chromo)) for chromo in full)
+        self.__genomes = dict((id, updated[id] if id in updated else self.__genomes[id])
+                              for id in ids)
+
+    def __chunks(self, ids):
+        size = self.__chunksize
+        if size is None:
+            size = max(1, -(-len(ids) // (4*len(self.__workers))))
+        return [ids[i:i+size] for i in xrange(0, len(ids), size)]
+
+    def evaluate(self, population):
+        """ Assigns the fitness of every chromosome in the population. An
+            exception raised by eval_function is raised as a RuntimeError
+            with the worker's traceback. """
+        assert self.__workers, 'The evaluator has been stopped'
+        chromosomes = list(population)
+        self.__broadcast(chromosomes)
+
+        # chunks are handed out to whichever worker becomes idle
+        chunks = self.__chunks([chromo.id for chromo in chromosomes])
+        conns = dict((worker.pid, conn) for worker, conn in self.__workers)
+        pending = 0
+        for worker, conn in self.__workers:
+            if chunks:
+                self.__send(conn, ('evaluate', chunks.pop()))
+                pending += 1
+        fitness = {}
+        error = None
+        while pending:
+            pid, results, elapsed, exc = self.__results.get()
+            pending -= 1
+            if exc is not None:
+                error = error or exc
+                continue
+            fitness.update(results)
+            stats = self.__stats.setdefault(pid, [0, 0.0])
+            stats[0] += len(results)
+            stats[1] += elapsed
+            if chunks and error is None:
+                self.__send(conns[pid], ('evaluate', chunks.pop()))
+                pending += 1
+        if error is not None:
+            raise RuntimeError('eval_function failed in a worker:\n' + error)
+        for chromo in chromosomes:
+            chromo.fitness = fitness[chromo.id]
+
+    def throughput(self):
+        """ Chromosomes evaluated per second of work by each worker (pid) """
+        return dict((pid, n/seconds if seconds else 0.0)
+                    for pid, (n, seconds) in self.__stats.items())
+
+    def print_stats(self):
+        _print_stats(self.__stats)
+        print 'Sent %d bytes (%d chromosomes whole)' % (self.__bytes_sent, self.__full_sent)
+
+    def stop(self):
+        """ Terminates the worker processes """
+        for worker, conn in self.__workers:
+            self.__send(conn, None)
+        for worker, conn in self.__workers:
+            worker.join()
+        self.__workers = []
+
+if __name__ == '__main__':
+    # Example: the same fitness, serial, in threads and in processes
+    import random
+    from config import Config
+    import chromosome, genome
+
+    Config.input_nodes = 2
+    Config.output_nodes = 1
+    Config.nn_activation = 'exp'
+    Config.weight_stdev = 0.9
+    chromosome.node_gene_type = genome.NodeGene
+
+    def eval_fitness(chromo):
+        return sum(cg.weight for cg in chromo.conn_genes)
+
+    chromosomes = [chromosome.FFChromosome.create_fully_connected() for i in xrange(50)]
+    for evaluator in (ThreadedEvaluator(4, eval_fitness), ParallelEvaluator(4, eval_fitness),
+                      DeltaEvaluator(4, eval_fitness)):
+        evaluator.evaluate(chromosomes)
+        evaluator.stop()
+        assert all(c.fitness == eval_fitness(c) for c in chromosomes)
+        print '%s: evaluated %d chromosomes' % (evaluator.__class__.__name__, len(chromosomes))
@@ -6,11 +6,17 @@ import cPickle as pickle
 from config import Config
 import species
 import chromosome
+import genome
 
 class Population(object):
     """ Manages all the species  """
     evaluate = None # Evaluates the entire population. You need to override
                     # this method in your experiments
+    genotype = None # The chromosome class. If None, FFChromosome or Chromosome
+                    # are used (see Config.feedforward)
+    distance_matrix = None # If set, a function (chromosomes, representants) -> matrix
+                           # of distances used to speciate the population at once (see
+                           # distance_numpy). Representants are taken before speciating.
 
     def __init__(self, checkpoint_file=None):
 
@@ -23,18 +29,25 @@ class Population(object):
             self.__popsize = Config.pop_size
             # currently living species
             self.__species = []
+            # members of each species (by id) as of the last speciation
+            self.__members = {}
             # species history
             self.__species_log = []
 
             # Statistics
             self.__avg_fitness = []
             self.__best_fitness = []
+            # distances computed and ruled out by their lower bound
+            self.__distances_computed = 0
+            self.__distances_pruned = 0
 
             self.__create_population()
             self.__generation = -1
 
     stats = property(lambda self: (self.__best_fitness, self.__avg_fitness))
     species_log = property(lambda self: self.__species_log)
+    distance_stats = property(lambda self: (self.__distances_computed, self.__distances_pruned),
+                              doc = 'Distances computed and pruned while speciating')
 
     def __resume_checkpoint(self, checkpoint):
         """ Resumes the simulation from a previous saved point. """
@@ -47,6 +60,15 @@ class Population(object):
         # when unpickling __init__ is not called again
         previous_pop = pickle.load(file)
         self.__dict__ = previous_pop.__dict__
+        # attributes missing in checkpoints saved by older versions
+        self.__dict__.setdefault('_Population__members', {})
+        self.__dict__.setdefault('_Population__distances_computed', 0)
+        self.__dict__.setdefault('_Population__distances_pruned', 0)
+        # the innovation numbers aren't saved: new connections must be
+        # numbered after those in the population
+        for c in self.__population:
+            for cg in c.conn_genes:
+                genome.ConnectionGene.register_innovation(cg.key, cg.innovation)
 
         print 'Loading random state'
         rstate = pickle.load(file)
@@ -73,7 +95,9 @@ class Population(object):
 
     def __create_population(self):
 
-        if Config.feedforward:
+        if self.genotype is not None:
+            genotypes = self.genotype
+        elif Config.feedforward:
             genotypes = chromosome.FFChromosome
         else:
             genotypes = chromosome.Chromosome
@@ -108,16 +132,16 @@ class Population(object):
     def __speciate(self, report):
         """ Group chromosomes into species by similarity """
         # Speciate the population
-        for individual in self:
-            found = False
-            for s in self.__species:
-                if individual.distance(s.representant) < Config.compatibility_threshold:
-                    s.add(individual)
-                    found = True
-                    break
-
-            if not found: # create a new species for this lone chromosome
-                self.__species.append(species.Species(individual))
+        if self.distance_matrix is not None and self.__species:
+            matrix = self.distance_matrix(self.__population,
+                                          [s.representant for s in self.__species])
+            columns = dict((s.id, j) for j, s in enumerate(self.__species))
+            self.__distances_computed += matrix.size
+            for i, individual in enumerate(self):
+                self.__add_to_species(individual, matrix[i], columns)
+        else:
+            for individual in self:
+                self.__add_to_species(individual)
 
         # python technical note:
         # we need a "working copy" list when removing elements while looping
@@ -130,8 +154,41 @@ class Population(object):
                 # remove empty species
                 self.__species.remove(s)
 
+        # kept apart from the species, which are emptied when reproducing
+        self.__members = dict((s.id, list(s)) for s in self.__species)
+
         self.__set_compatibility_threshold()
 
+    def __add_to_species(self, individual, distances=None, columns=None):
+        """ Adds the individual to the first compatible species, trying
+            its parent's species first (see Chromosome.crossover). The
+            distances to the species in columns may be given. """
+        candidates = self.__species
+        for i, s in enumerate(self.__species):
+            if s.id == individual.species_id:
+                candidates = [s] + self.__species[:i] + self.__species[i+1:]
+                break
+
+        threshold = Config.compatibility_threshold
+        for s in candidates:
+            if columns is not None and s.id in columns:
+                if distances[columns[s.id]] < threshold:
+                    s.add(individual)
+                    return s
+                continue
+            # skips the distance if even its lower bound is too far
+            if individual.distance_lower_bound(s.representant) >= threshold:
+                self.__distances_pruned += 1
+                continue
+            self.__distances_computed += 1
+            if individual.distance(s.representant) < threshold:
+                s.add(individual)
+                return s
+        # create a new species for this lone chromosome
+        s = species.Species(individual)
+        self.__species.append(s)
+        return s
+
     def __set_compatibility_threshold(self):
         ''' Controls compatibility threshold '''
         if len(self.__species) > Config.species_size:
@@ -205,17 +262,8 @@ class Population(object):
     def __log_species(self):
         """ Logging species data for visualizing speciation """
         higher = max([s.id for s in self.__species])
-        temp = []
-        for i in xrange(1, higher+1):
-            found_specie = False
-            for s in self.__species:
-                if i == s.id:
-                    temp.append(len(s))
-                    found_specie = True
-                    break
-            if not found_specie:
-                temp.append(0)
-        self.__species_log.append(temp)
+        sizes = dict((s.id, len(s)) for s in self.__species)
+        self.__species_log.append([sizes.get(i, 0) for i in xrange(1, higher+1)])
 
     def __population_diversity(self):
         """ Calculates the diversity of population: total average weights,
@@ -288,6 +336,9 @@ class Population(object):
             #-----------------------------------------
 
 
+            # ids of the removed species: their members leave the population at once
+            removed = set()
+
             # Remove stagnated species and its members (except if it has the best chromosome)
             for s in self.__species[:]:
                 if s.no_improvement_age > Config.max_stagnation:
@@ -297,11 +348,7 @@ class Population(object):
                                     %(s.id, len(s))
                         # removing species
                         self.__species.remove(s)
-                        # removing all the species' members
-                        #TODO: can be optimized!
-                        for c in self.__population[:]:
-                            if c.species_id == s.id:
-                                self.__population.remove(c)
+                        removed.add(s.id)
 
             # Remove "super-stagnated" species (even if it has the best chromosome)
             # It is not clear if it really avoids local minima
@@ -312,11 +359,7 @@ class Population(object):
                                 %(s.id, len(s))
                     # removing species
                     self.__species.remove(s)
-                    # removing all the species' members
-                    #TODO: can be optimized!
-                    for c in self.__population[:]:
-                        if c.species_id == s.id:
-                            self.__population.remove(c)
+                    removed.add(s.id)
 
             # Compute spawn levels for each remaining species
             self.__compute_spawn_levels()
@@ -327,11 +370,14 @@ class Population(object):
                 if s.spawn_amount == 0:
                     if report:
                         print '   Species %2d age %2s removed: produced no offspring' %(s.id, s.age)
-                    for c in self.__population[:]:
-                        if c.species_id == s.id:
-                            self.__population.remove(c)
-                                #self.remove(c)
                     self.__species.remove(s)
+                    removed.add(s.id)
+
+            # removing all the removed species' members
+            if removed:
+                self.__population = [c for c in self.__population if c.species_id not in removed]
+                for id in removed:
+                    del self.__members[id]
 
             # Logging speciation stats
             self.__log_species()
@@ -345,6 +391,7 @@ class Population(object):
                 # print some "debugging" information
                 print 'Species length: %d totalizing %d individuals' \
                         %(len(self.__species), sum([len(s) for s in self.__species]))
+                print 'Distances computed: %d  pruned: %d' % self.distance_stats
                 print 'Species ID       : %s' % [s.id for s in self.__species]
                 print 'Each species size: %s' % [len(s) for s in self.__species]
                 print 'Amount to spawn  : %s' % [s.spawn_amount for s in self.__species]
@@ -380,15 +427,12 @@ class Population(object):
                     # Selects a random chromosome from population
                     parent1 = random.choice(self.__population)
                     # Search for a mate within the same species
-                    found = False
-                    for c in self:
-                        # what if c is parent1 itself?
-                        if c.species_id == parent1.species_id:
-                            child = parent1.crossover(c)
-                            new_population.append(child.mutate())
-                            found = True
-                            break
-                    if not found:
+                    mates = self.__members.get(parent1.species_id)
+                    if mates:
+                        # what if it is parent1 itself?
+                        child = parent1.crossover(mates[0])
+                        new_population.append(child.mutate())
+                    else:
                         # If no mate was found, just mutate it
                         new_population.append(parent1.mutate())
                     #new_population.append(chromosome.FFChromosome.create_fully_connected())
@@ -404,6 +448,121 @@ class Population(object):
             elif checkpoint_generation is not None and self.__generation % checkpoint_generation == 0:
                 self.__create_checkpoint(report)
 
+    def steady_state(self, evaluator, evaluations, in_flight=None, report=True):
+        """ Runs a steady-state (rtNEAT-like) evolution for a number of
+            evaluations, with no generations: as soon as an individual is
+            evaluated it joins its species, the individual with the lowest
+            shared fitness (its fitness divided by its species' size)
+            retires and a replacement is bred and sent to be evaluated.
+            Slow evaluations don't hold back the others.
+
+            Keyword arguments:
+            evaluator -- sends individuals to be evaluated, with a
+                submit(chromo) and a collect() method returning the next
+                evaluated chromosome (see parallel.ParallelEvaluator)
+            in_flight -- individuals being evaluated at any time
+                (default evaluator.num_workers)
+            report -- show stats every pop_size evaluations (default True)
+
+            Statistics are kept every pop_size evaluations, as if they
+            were a generation.
+        """
+        if in_flight is None:
+            in_flight = evaluator.num_workers
+        # nothing can be bred until the first individuals are evaluated
+        if not 0 < in_flight <= len(self.__population):
+            raise ValueError('in_flight must be between 1 and the population size (%d), not %d'
+                             % (len(self.__population), in_flight))
+
+        # the population is evaluated again and rejoins the species
+        waiting = list(self.__population)
+        self.__population = []
+        for s in self.__species:
+            for c in list(s):
+                s.remove(c)
+
+        def next_individual():
+            if waiting:
+                return waiting.pop(0)
+            # a species is chosen in proportion to its average fitness,
+            # shifted so that none is negative
+            living = [s for s in self.__species if len(s)]
+            fitness = [float(sum(c.fitness for c in s))/len(s) for s in living]
+            lowest = min(min(fitness), 0.0)
+            fitness = [f - lowest for f in fitness]
+            total = sum(fitness)
+            if total <= 0:
+                return random.choice(living).breed()
+            r = random.uniform(0, total)
+            for s, f in zip(living, fitness):
+                r -= f
+                if r <= 0:
+                    break
+            return s.breed()
+
+        submitted = evaluated = 0
+        for i in xrange(min(in_flight, evaluations)):
+            evaluator.submit(next_individual())
+            submitted += 1
+
+        found = False
+        while evaluated < submitted: # wait for all individuals in flight
+            individual = evaluator.collect()
+            evaluated += 1
+            self.__population.append(individual)
+            self.__add_to_species(individual)
+
+            if len(self.__population) > self.__popsize:
+                self.__retire()
+
+            if evaluated % self.__popsize == 0:
+                self.__steady_state_stats(evaluated, report)
+
+            if individual.fitness > Config.max_fitness_threshold and not found:
+                print '\nBest individual found after %d evaluations - complexity: %s' \
+                        %(evaluated, individual.size())
+                found = True # stops breeding
+
+            if submitted < evaluations and not found:
+                evaluator.submit(next_individual())
+                submitted += 1
+
+        if evaluated % self.__popsize: # the last, partial round
+            self.__steady_state_stats(evaluated, report)
+
+    def __retire(self):
+        """ Removes the individual with the lowest shared fitness, except
+            for the best one """
+        best = max(self.__population)
+        species_of = dict((s.id, s) for s in self.__species)
+        worst = min((c for c in self.__population if c is not best),
+                    key = lambda c: float(c.fitness)/len(species_of[c.species_id]))
+        # not list.remove: individuals compare by fitness
+        self.__population = [c for c in self.__population if c is not worst]
+        s = species_of[worst.species_id]
+        s.remove(worst)
+        if not len(s):
+            self.__species.remove(s)
+
+    def __steady_state_stats(self, evaluations, report):
+        """ Keeps the statistics of the last pop_size evaluations """
+        self.__generation += 1
+        self.__best_fitness.append(max(self.__population))
+        self.__avg_fitness.append(self.average_fitness())
+        # species emptied when the steady state started
+        self.__species = [s for s in self.__species if len(s)]
+        self.__set_compatibility_threshold()
+        self.__log_species()
+
+        if report:
+            best = self.__best_fitness[-1]
+            print '\n ****** %d evaluations ****** \n' % evaluations
+            print 'Population\'s average fitness: %3.5f stdev: %3.5f' %(self.__avg_fitness[-1], self.stdeviation())
+            print 'Best fitness: %2.12s - size: %s - species %s - id %s' \
+                %(best.fitness, best.size(), best.species_id, best.id)
+            print 'Species ID       : %s' % [s.id for s in self.__species]
+            print 'Each species size: %s' % [len(s) for s in self.__species]
+
 if __name__ ==  '__main__' :
     
     # sample fitness function
@@ -41,6 +41,20 @@ class Species(object):
         # choose a new random representant for the species
         self.representant = random.choice(self.__subpopulation)
 
+    def remove(self, individual):
+        """ Removes an individual from the species """
+        # not list.remove: individuals compare by fitness
+        for i, c in enumerate(self.__subpopulation):
+            if c is individual:
+                del self.__subpopulation[i]
+                break
+        else:
+            raise ValueError('Individual %d is not in species %d' % (individual.id, self.__id))
+        # the representant is kept if it was the last one: an empty
+        # species still attracts similar individuals
+        if individual is self.representant and self.__subpopulation:
+            self.representant = random.choice(self.__subpopulation)
+
     def __iter__(self):
         """ Iterates over individuals """
         return iter(self.__subpopulation)
@@ -115,23 +129,7 @@ class Species(object):
         while(self.spawn_amount > 0):
 
             self.spawn_amount -= 1
-
-            if len(self) > 1:
-                # Selects two parents from the remaining species and produces a single individual
-                # Stanley selects at random, here we use tournament selection (although it is not
-                # clear if has any advantages)
-                parent1 = self.TournamentSelection()
-                parent2 = self.TournamentSelection()
-
-                assert parent1.species_id == parent2.species_id, "Parents has different species id."
-                child = parent1.crossover(parent2)
-                offspring.append(child.mutate())
-            else:
-                # mutate only
-                parent1 = self.__subpopulation[0]
-                # TODO: temporary hack - the child needs a new id (not the father's)
-                child = parent1.crossover(parent1)
-                offspring.append(child.mutate())
+            offspring.append(self.breed())
 
         # reset species (new members will be added again when speciating)
         self.__subpopulation = []
@@ -140,3 +138,21 @@ class Species(object):
         self.representant = random.choice(offspring)
 
         return offspring
+
+    def breed(self):
+        """ Returns a new individual bred from the current members """
+        if len(self) > 1:
+            # Selects two parents from the remaining species and produces a single individual
+            # Stanley selects at random, here we use tournament selection (although it is not
+            # clear if has any advantages)
+            parent1 = self.TournamentSelection()
+            parent2 = self.TournamentSelection()
+
+            assert parent1.species_id == parent2.species_id, "Parents has different species id."
+            child = parent1.crossover(parent2)
+        else:
+            # mutate only
+            parent1 = self.__subpopulation[0]
+            # TODO: temporary hack - the child needs a new id (not the father's)
+            child = parent1.crossover(parent1)
+        return child.mutate()
@@ -0,0 +1,44 @@
+# -*- coding: UTF-8 -*-
+""" Fixtures shared by the tests """
+import os
+import math
+import random
+from neat import config, chromosome, genome
+from neat.nn import nn_pure
+
+CONFIG = os.path.join(os.path.dirname(__file__), '..', 'examples', 'xor', 'xor2_config')
+
+def load_config():
+    """ Loads the XOR settings (tests may change Config) """
+    config.load(CONFIG)
+    chromosome.node_gene_type = genome.NodeGene
+
+def evolved(genotype, mutations):
+    """ A chromosome grown by random structural and weight mutations """
+    c = genotype.create_fully_connected()
+    for i in xrange(mutations):
+        r = random.random()
+        if r < 0.3:
+            c._mutate_add_node()
+        elif r < 0.6:
+            c._mutate_add_connection()
+        else:
+            c.mutate()
+    return c
+
+INPUTS = ((0, 0), (0, 1), (1, 0), (1, 1))
+OUTPUTS = (0, 1, 1, 0)
+
+def eval_fitness(chromo):
+    """ XOR fitness of a feedforward chromosome """
+    net = nn_pure.create_ffphenotype(chromo)
+    error = 0.0
+    for inputs, output in zip(INPUTS, OUTPUTS):
+        error += (net.sactivate(inputs)[0] - output)**2
+    return 1 - math.sqrt(error/len(OUTPUTS))
+
+def failing_fitness(chromo):
+    """ eval_fitness, except for chromosomes marked with species_id -1 """
+    if chromo.species_id == -1:
+        raise ValueError('cannot evaluate it')
+    return eval_fitness(chromo)
@@ -0,0 +1,55 @@
+# -*- coding: UTF-8 -*-
+""" distance_numpy must give exactly the distances of Chromosome.distance """
+import random
+import unittest
+from neat import chromosome, genome_array
+try:
+    from neat import distance_numpy
+except ImportError:
+    distance_numpy = None
+from helpers import load_config, evolved
+
+@unittest.skipIf(distance_numpy is None, 'NumPy is not installed')
+class DistanceMatrixTest(unittest.TestCase):
+    def setUp(self):
+        load_config()
+        random.seed(23)
+
+    def check(self, genotype):
+        chromosomes = [evolved(genotype, random.randint(0, 40)) for i in xrange(100)]
+        # with no connection genes at all
+        chromosomes.append(genotype.create_unconnected())
+        representants = chromosomes[:5] + chromosomes[-1:]
+        matrix = distance_numpy.distance_matrix(chromosomes, representants)
+        self.assertEqual(matrix.shape, (len(chromosomes), len(representants)))
+        for i, c in enumerate(chromosomes):
+            self.assertEqual(matrix[i].tolist(), [c.distance(r) for r in representants])
+
+    def test_chromosome(self):
+        self.check(chromosome.FFChromosome)
+
+    def test_array_chromosome(self):
+        self.check(chromosome.FFArrayChromosome)
+
+    def test_distance_after_mutation(self):
+        # structural mutations must refresh the sorted genes of distance
+        for genotype in (chromosome.FFChromosome, chromosome.Chromosome):
+            c1, c2 = evolved(genotype, 10), evolved(genotype, 10)
+            c1.distance(c2)
+            c1._mutate_add_node()
+            c1._mutate_add_connection()
+            expected = genotype.child_from_delta(c1, c1.delta(c1.blank()))
+            self.assertEqual(c1.distance(c2), expected.distance(c2))
+
+    def test_vectorized_compare(self):
+        # the NumPy path of genome_array.compare is exact too (lists
+        # are always merged)
+        for k in xrange(50):
+            c1 = evolved(chromosome.FFArrayChromosome, random.randint(0, 60))
+            c2 = evolved(chromosome.FFArrayChromosome, random.randint(0, 60))
+            genes = c1._innovations() + c2._innovations()
+            self.assertEqual(genome_array.compare_vectorized(*genes),
+                             genome_array.compare(*[list(a) for a in genes]))
+
+if __name__ == '__main__':
+    unittest.main()
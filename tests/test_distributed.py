@@ -0,0 +1,109 @@
+# -*- coding: UTF-8 -*-
+""" Chromosomes evaluated by distributed workers must get the same
+    fitness as when evaluated serially """
+import os
+import random
+import socket
+import unittest
+import threading
+import cPickle as pickle
+import multiprocessing
+from neat import chromosome, distributed
+from helpers import load_config, evolved, eval_fitness, failing_fitness
+
+def lost_worker(chromo):
+    os._exit(1) # as if the machine went down
+
+class DistributedTest(unittest.TestCase):
+    def setUp(self):
+        load_config()
+        random.seed(20)
+        self.coordinator = distributed.Coordinator(('127.0.0.1', 0), chunksize = 5)
+        self.workers = []
+
+    def tearDown(self):
+        self.coordinator.stop()
+        for w in self.workers:
+            w.join()
+
+    def start_workers(self, *eval_functions):
+        for f in eval_functions:
+            w = multiprocessing.Process(target=distributed.Worker(self.coordinator.address, f).run)
+            w.start()
+            self.workers.append(w)
+        self.coordinator.wait_for_workers(len(eval_functions), timeout = 30)
+
+    def check(self, chromosomes):
+        for c in chromosomes:
+            self.assertEqual(c.fitness, eval_fitness(c))
+
+    def test_evaluate(self):
+        self.start_workers(eval_fitness, eval_fitness)
+        for genotype in (chromosome.FFChromosome, chromosome.FFArrayChromosome):
+            chromosomes = [evolved(genotype, random.randint(0, 20)) for i in xrange(40)]
+            self.coordinator.evaluate(chromosomes)
+            self.check(chromosomes)
+            # offspring are sent as deltas from their parents
+            children = [c.crossover(random.choice(chromosomes)) for c in chromosomes]
+            for c in children:
+                c.mutate()
+            self.coordinator.evaluate(children)
+            self.check(children)
+
+    def test_submit_and_collect(self):
+        self.start_workers(eval_fitness, eval_fitness)
+        chromosomes = [evolved(chromosome.FFChromosome, random.randint(0, 20)) for i in xrange(30)]
+        for c in chromosomes:
+            self.coordinator.submit(c)
+        collected = [self.coordinator.collect() for c in chromosomes]
+        self.assertEqual(sorted(c.id for c in collected), sorted(c.id for c in chromosomes))
+        self.check(chromosomes)
+
+    def test_lost_worker(self):
+        # the jobs of a worker which went away are given to another one
+        self.start_workers(lost_worker, eval_fitness)
+        chromosomes = [evolved(chromosome.FFChromosome, random.randint(0, 20)) for i in xrange(30)]
+        self.coordinator.evaluate(chromosomes)
+        self.check(chromosomes)
+        self.assertTrue(self.coordinator.requeued > 0)
+
+    def test_error(self):
+        # after an error, the batch is forgotten: late results of its
+        # chromosomes don't count for the next one
+        self.start_workers(failing_fitness, failing_fitness)
+        chromosomes = [evolved(chromosome.FFChromosome, random.randint(0, 20)) for i in xrange(30)]
+        chromosomes[3].species_id = -1
+        self.assertRaises(RuntimeError, self.coordinator.evaluate, chromosomes)
+        fresh = [evolved(chromosome.FFChromosome, random.randint(0, 20)) for i in xrange(20)]
+        for c in fresh:
+            c.fitness = -1.0
+        self.coordinator.evaluate(fresh)
+        self.check(fresh)
+
+    def test_wrong_authkey(self):
+        errors = []
+        def run():
+            try:
+                distributed.Worker(self.coordinator.address, eval_fitness, retry = 5,
+                                   authkey = 'not the key').run()
+            except multiprocessing.AuthenticationError, e:
+                errors.append(e)
+        worker = threading.Thread(target=run)
+        worker.start()
+        self.assertRaises(RuntimeError, self.coordinator.wait_for_workers, 1, timeout = 2)
+        worker.join()
+        self.assertEqual(len(errors), 1)
+
+    def test_no_unpickling_before_authentication(self):
+        class Exploit(object):
+            def __reduce__(self):
+                return (os._exit, (1,)) # would kill the coordinator
+        data = pickle.dumps(('hello', Exploit()), 2)
+        sock = socket.create_connection(self.coordinator.address)
+        sock.sendall(distributed._HEADER.pack(len(data)) + data)
+        self.assertRaises(RuntimeError, self.coordinator.wait_for_workers, 1, timeout = 1)
+        self.assertEqual(self.coordinator.num_workers, 0)
+        sock.close()
+
+if __name__ == '__main__':
+    unittest.main()
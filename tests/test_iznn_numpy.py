@@ -0,0 +1,63 @@
+# -*- coding: UTF-8 -*-
+""" iznn_numpy must give bit-for-bit the same potentials and spikes as
+    a network of iznn_pure neurons and synapses """
+import random
+import unittest
+try:
+    # the package needs the iznn_cpp extension (python setup.py build_ext -i)
+    from neat.iznn import iznn_pure, iznn_numpy
+except ImportError:
+    iznn_numpy = None
+
+def random_network(neurons, synapses, inputs, outputs):
+    bias = [random.uniform(0, 10) for i in xrange(neurons)]
+    sources = [random.randrange(neurons) for i in xrange(synapses)]
+    dests = [random.randrange(neurons) for i in xrange(synapses)]
+    weights = [random.uniform(-20, 20) for i in xrange(synapses)]
+    return bias, sources, dests, weights, range(inputs), range(neurons - outputs, neurons)
+
+@unittest.skipIf(iznn_numpy is None, 'NumPy or the iznn_cpp extension is not installed')
+class IzhikevichNumpyTest(unittest.TestCase):
+    def setUp(self):
+        random.seed(15)
+
+    def test_single_neuron(self):
+        n = iznn_pure.Neuron(10)
+        net = iznn_numpy.Network([10], [], [], [], [], [0])
+        for i in xrange(1000):
+            self.assertEqual(net.potentials[0], n.potential)
+            n.advance()
+            net.advance([])
+
+    def test_network(self):
+        spikes = 0
+        for k in xrange(10):
+            bias, sources, dests, weights, inputs, outputs = random_network(20, 60, 3, 2)
+            net = iznn_numpy.Network(bias, sources, dests, weights, inputs, outputs)
+            # as iznn.Network.advance: inputs, then synapses, then neurons
+            neurons = [iznn_pure.Neuron(b) for b in bias]
+            synapses = [iznn_pure.Synapse(neurons[s], neurons[d], w)
+                        for s, d, w in zip(sources, dests, weights)]
+            for t in xrange(200):
+                values = [random.uniform(0, 15) for i in inputs]
+                for i, value in zip(inputs, values):
+                    neurons[i].current += value
+                for s in synapses:
+                    s.advance()
+                for n in neurons:
+                    n.advance()
+                fired = net.advance(values)
+                self.assertEqual(fired, [neurons[i].has_fired for i in outputs])
+                self.assertEqual(list(net.potentials), [n.potential for n in neurons])
+                spikes += sum(n.has_fired for n in neurons)
+        self.assertTrue(spikes > 0)
+
+    def test_advance_many(self):
+        bias, sources, dests, weights, inputs, outputs = random_network(10, 30, 2, 2)
+        net = iznn_numpy.Network(bias, sources, dests, weights, inputs, outputs)
+        raster = net.advance_many([5, 8], 100)
+        net.reset()
+        self.assertEqual(raster.tolist(), [net.advance([5, 8]) for t in xrange(100)])
+
+if __name__ == '__main__':
+    unittest.main()
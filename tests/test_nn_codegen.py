@@ -0,0 +1,53 @@
+# -*- coding: UTF-8 -*-
+""" nn_codegen must give exactly the same outputs as nn_pure """
+import random
+import unittest
+from neat import chromosome
+from neat.config import Config
+from neat.nn import nn_pure, nn_codegen
+from helpers import load_config, evolved
+
+class CodegenTest(unittest.TestCase):
+    def setUp(self):
+        load_config()
+        random.seed(5)
+
+    def check_feedforward(self):
+        for k in xrange(30):
+            c = evolved(chromosome.FFChromosome, random.randint(0, 30))
+            net = nn_codegen.create_ffphenotype(c)
+            pure = nn_pure.create_ffphenotype(c)
+            for t in xrange(10):
+                inputs = [random.uniform(-2, 2) for i in xrange(Config.input_nodes)]
+                self.assertEqual(net.sactivate(inputs), pure.sactivate(inputs))
+
+    def check_recurrent(self):
+        for k in xrange(30):
+            c = evolved(chromosome.Chromosome, random.randint(0, 30))
+            net = nn_codegen.create_phenotype(c)
+            pure = nn_pure.create_phenotype(c)
+            for t in xrange(20):
+                inputs = [random.uniform(-2, 2) for i in xrange(Config.input_nodes)]
+                self.assertEqual(net.pactivate(inputs), pure.pactivate(inputs))
+            net.flush()
+            pure.flush()
+            self.assertEqual(net.pactivate(inputs), pure.pactivate(inputs))
+
+    def test_feedforward_exp(self):
+        Config.nn_activation = 'exp'
+        self.check_feedforward()
+
+    def test_feedforward_tanh(self):
+        Config.nn_activation = 'tanh'
+        self.check_feedforward()
+
+    def test_recurrent_exp(self):
+        Config.nn_activation = 'exp'
+        self.check_recurrent()
+
+    def test_recurrent_tanh(self):
+        Config.nn_activation = 'tanh'
+        self.check_recurrent()
+
+if __name__ == '__main__':
+    unittest.main()
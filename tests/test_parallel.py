@@ -0,0 +1,153 @@
+# -*- coding: UTF-8 -*-
+""" The parallel evaluators must assign the same fitness as a serial
+    evaluation """
+import time
+import random
+import unittest
+import multiprocessing
+from neat import chromosome, parallel
+from neat.config import Config
+from neat.population import Population
+from helpers import load_config, evolved, eval_fitness, failing_fitness
+
+def slow_fitness(chromo):
+    # results come back in a different order than sent
+    time.sleep(random.uniform(0, 0.005))
+    return eval_fitness(chromo)
+
+class EvaluatorTest(unittest.TestCase):
+    def setUp(self):
+        load_config()
+        random.seed(18)
+        self.evaluator = None
+
+    def tearDown(self):
+        if self.evaluator is not None:
+            self.evaluator.stop()
+
+    def check(self, chromosomes):
+        for c in chromosomes:
+            self.assertEqual(c.fitness, eval_fitness(c))
+
+    def population(self, size):
+        return [evolved(chromosome.FFChromosome, random.randint(0, 20)) for i in xrange(size)]
+
+    def check_evaluate(self):
+        for k in xrange(3):
+            chromosomes = self.population(40)
+            self.evaluator.evaluate(chromosomes)
+            self.check(chromosomes)
+
+    def check_submit_and_collect(self):
+        chromosomes = self.population(30)
+        for c in chromosomes:
+            self.evaluator.submit(c)
+        collected = [self.evaluator.collect() for c in chromosomes]
+        self.assertEqual(sorted(c.id for c in collected), sorted(c.id for c in chromosomes))
+        self.check(chromosomes)
+
+    def check_errors(self, evaluate_error, collect_error):
+        chromosomes = self.population(30)
+        chromosomes[3].species_id = -1
+        self.assertRaises(evaluate_error, self.evaluator.evaluate, chromosomes)
+        # one error when collecting, the others are still evaluated
+        for c in chromosomes:
+            self.evaluator.submit(c)
+        collected = []
+        for c in chromosomes:
+            try:
+                collected.append(self.evaluator.collect())
+            except collect_error:
+                collected.append(None)
+        self.assertEqual(sum(c is None for c in collected), 1)
+        self.assertEqual(sorted(c.id for c in collected if c is not None),
+                         sorted(c.id for c in chromosomes if c is not chromosomes[3]))
+        # nothing is left in flight from the failed batches
+        self.check_evaluate()
+        self.check_submit_and_collect()
+
+class ThreadedEvaluatorTest(EvaluatorTest):
+    def test_evaluate(self):
+        self.evaluator = parallel.ThreadedEvaluator(3, slow_fitness)
+        self.check_evaluate()
+
+    def test_submit_and_collect(self):
+        self.evaluator = parallel.ThreadedEvaluator(3, slow_fitness)
+        self.check_submit_and_collect()
+
+    def test_errors(self):
+        # the exception of eval_function is raised again
+        self.evaluator = parallel.ThreadedEvaluator(3, failing_fitness)
+        self.check_errors(ValueError, ValueError)
+
+class ParallelEvaluatorTest(EvaluatorTest):
+    def test_evaluate(self):
+        # the workers evaluate copies: fitness is assigned by id
+        self.evaluator = parallel.ParallelEvaluator(2, slow_fitness, chunksize = 3)
+        self.check_evaluate()
+
+    def test_submit_and_collect(self):
+        self.evaluator = parallel.ParallelEvaluator(2, slow_fitness)
+        self.check_submit_and_collect()
+
+    def test_errors(self):
+        # collect raises a RuntimeError with the worker's traceback
+        self.evaluator = parallel.ParallelEvaluator(2, failing_fitness, chunksize = 3)
+        self.check_errors(ValueError, RuntimeError)
+        self.assertRaises(AssertionError, self.evaluator.collect) # none in flight
+
+    def test_stats(self):
+        self.evaluator = parallel.ParallelEvaluator(2, slow_fitness, chunksize = 3)
+        self.check_evaluate()
+        self.check_submit_and_collect()
+        stats = self.evaluator.stats
+        workers = set(p.pid for p in multiprocessing.active_children())
+        self.assertTrue(stats and set(stats) <= workers)
+        self.assertEqual(sum(n for n, seconds in stats.values()), 3*40 + 30)
+        self.assertTrue(all(seconds > 0 for n, seconds in stats.values()))
+        self.assertEqual(set(self.evaluator.throughput()), set(stats))
+
+class DeltaEvaluatorTest(EvaluatorTest):
+    def test_generations(self):
+        # most chromosomes are sent as deltas from their parents
+        Config.max_fitness_threshold = 2 # runs all generations
+        self.evaluator = parallel.DeltaEvaluator(2, eval_fitness)
+        pop = Population()
+        generations = []
+        def evaluate():
+            self.evaluator.evaluate(pop)
+            self.check(pop)
+            generations.append(len(pop))
+        pop.evaluate = evaluate
+        pop.epoch(40, report = False, checkpoint_interval = None)
+        self.assertEqual(generations, [Config.pop_size]*40)
+        self.assertTrue(self.evaluator.full_sent < 2*Config.pop_size)
+
+    def test_mutated_in_place(self):
+        # as elites mutated to fill up the population
+        self.evaluator = parallel.DeltaEvaluator(2, eval_fitness)
+        chromosomes = [evolved(chromosome.FFChromosome, random.randint(0, 20)) for i in xrange(40)]
+        self.evaluator.evaluate(chromosomes)
+        for k in xrange(5):
+            for c in random.sample(chromosomes, 10):
+                mutation = random.choice((c.mutate, c._mutate_add_node,
+                                          c._mutate_add_connection))
+                mutation()
+            self.evaluator.evaluate(chromosomes)
+            self.check(chromosomes)
+        self.assertEqual(self.evaluator.full_sent, len(chromosomes))
+
+    def test_error(self):
+        self.evaluator = parallel.DeltaEvaluator(2, failing_fitness, chunksize = 5)
+        chromosomes = [evolved(chromosome.FFChromosome, random.randint(0, 20)) for i in xrange(30)]
+        chromosomes[3].species_id = -1
+        self.assertRaises(RuntimeError, self.evaluator.evaluate, chromosomes)
+        # the workers are still in step with the coordinator
+        chromosomes[3].species_id = 1
+        for c in chromosomes[:10]:
+            c.mutate()
+        self.evaluator.evaluate(chromosomes)
+        self.check(chromosomes)
+
+if __name__ == '__main__':
+    unittest.main()
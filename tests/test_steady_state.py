@@ -0,0 +1,84 @@
+# -*- coding: UTF-8 -*-
+""" Population.steady_state must keep the population's size, its best
+    individual and its species in order while individuals come and go """
+import random
+import unittest
+from neat import parallel
+from neat.config import Config
+from neat.population import Population
+from helpers import load_config, eval_fitness
+
+def same_fitness(chromo):
+    return 1.0
+
+class CheckingEvaluator(object):
+    """ Checks the population every time an individual is collected,
+        i.e. after the previous one has joined it """
+    def __init__(self, test, evaluator):
+        self.test = test
+        self.evaluator = evaluator
+        self.num_workers = evaluator.num_workers
+        self.collected = 0
+        self.best = None
+
+    def submit(self, chromo):
+        self.evaluator.submit(chromo)
+
+    def collect(self):
+        self.test.check(self.collected, self.best)
+        chromo = self.evaluator.collect()
+        self.collected += 1
+        if self.best is None or chromo.fitness > self.best.fitness:
+            self.best = chromo
+        return chromo
+
+class SteadyStateTest(unittest.TestCase):
+    def setUp(self):
+        load_config()
+        random.seed(19)
+        Config.pop_size = 30
+        Config.max_fitness_threshold = 2 # runs all evaluations
+        self.population = Population()
+        self.evaluator = None
+
+    def tearDown(self):
+        self.evaluator.stop()
+
+    def check(self, evaluated, best):
+        population = list(self.population)
+        self.assertEqual(len(population), min(evaluated, Config.pop_size))
+        if best is not None: # the best individual so far is never retired
+            self.assertTrue(any(c is best for c in population))
+        # every individual is in its species, and only there
+        species = dict((s.id, s) for s in self.population._Population__species)
+        for c in population:
+            self.assertTrue(any(m is c for m in species[c.species_id]))
+        self.assertEqual(sum(len(s) for s in species.values()), len(population))
+
+    def test_steady_state(self):
+        self.evaluator = parallel.ThreadedEvaluator(2, eval_fitness)
+        checking = CheckingEvaluator(self, self.evaluator)
+        self.population.steady_state(checking, 300, report = False)
+        self.assertEqual(checking.collected, 300)
+        self.check(300, checking.best)
+        # a round of statistics every pop_size evaluations
+        best, average = self.population.stats
+        self.assertEqual(len(best), 300 // Config.pop_size)
+        self.assertTrue(all(b.fitness <= checking.best.fitness for b in best))
+
+    def test_ties(self):
+        # with ties, the oldest best individual is kept even when its
+        # species is the largest (the lowest shared fitness)
+        self.evaluator = parallel.ThreadedEvaluator(2, same_fitness)
+        checking = CheckingEvaluator(self, self.evaluator)
+        self.population.steady_state(checking, 300, report = False)
+        self.check(300, checking.best)
+
+    def test_in_flight(self):
+        self.evaluator = parallel.ThreadedEvaluator(2, eval_fitness)
+        self.assertRaises(ValueError, self.population.steady_state, self.evaluator, 10, 0)
+        self.assertRaises(ValueError, self.population.steady_state,
+                          self.evaluator, 10, Config.pop_size + 1)
+
+if __name__ == '__main__':
+    unittest.main()